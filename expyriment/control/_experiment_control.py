@@ -293,13 +293,8 @@ def end(goodbye_text=None, goodbye_delay=None, confirmation=False,
             else:
                 pre_quit_function()
 
-        # Delete open file handles and previously opened fonts
-        import expyriment.stimuli._textbox
-        import expyriment.stimuli._textline
-        for text_stim in [stimuli._textline, stimuli._textbox]:
-            for f in text_stim.open_filehandles:
-                f.close()
-            text_stim.fonts = {}
+        # Delete previously opened fonts and rendered text
+        stimuli._fonts.clear()
 
         pygame.quit()
         if system_exit:
@@ -326,6 +321,7 @@ def end(goodbye_text=None, goodbye_delay=None, confirmation=False,
             experiment._event_file_log("Experiment,resumed")
             return False
     experiment._event_file_log("Experiment,ended")
+    experiment.stop_prefetching()
     if goodbye_text is None:
         goodbye_text = defaults.goodbye_text
     if goodbye_delay is None:
@@ -365,13 +361,11 @@ def end(goodbye_text=None, goodbye_delay=None, confirmation=False,
 
     _internals.active_exp = design.Experiment("None")
 
-    # Delete open file handles and previously opened fonts
-    import expyriment.stimuli._textbox
-    import expyriment.stimuli._textline
-    for text_stim in [expyriment.stimuli._textline, expyriment.stimuli._textbox]:
-        for f in text_stim.open_filehandles:
-            f.close()
-        text_stim.fonts = {}
+    # Delete cached OpenGL textures
+    stimuli._visual._texture_cache.clear()
+
+    # Delete previously opened fonts and rendered text
+    stimuli._fonts.clear()
 
     pygame.quit()
     if system_exit:
@@ -57,7 +57,7 @@ def get_audiosystem_is_playing(channel=None):
     """
 
     if channel is None:
-        rtn = pygame.mixer.get_busy()
+        rtn = pygame.mixer.get_busy() or pygame.mixer.music.get_busy()
     else:
         rtn = channel.get_busy()
     if rtn == 0:
@@ -99,6 +99,7 @@ def wait_end_audiosystem(channel=None, callback_function=None,
             if isinstance(rtn_callback, CallbackQuitEvent):
                 if channel is None:
                     pygame.mixer.stop()
+                    pygame.mixer.music.stop()
                 else:
                     channel.stop()
                 return rtn_callback
@@ -107,6 +108,7 @@ def wait_end_audiosystem(channel=None, callback_function=None,
             if isinstance(rtn_callback, CallbackQuitEvent):
                 if channel is None:
                     pygame.mixer.stop()
+                    pygame.mixer.music.stop()
                 else:
                     channel.stop()
                 return rtn_callback
@@ -115,6 +117,7 @@ def wait_end_audiosystem(channel=None, callback_function=None,
                    _internals.active_exp.keyboard.process_control_keys():
                     if channel is None:
                         pygame.mixer.stop()
+                        pygame.mixer.music.stop()
                     else:
                         channel.stop()
                     break
@@ -12,6 +12,7 @@ __author__ = 'Florian Krause <florian@expyriment.org> \
 from .. import _internals
 
 from . import defaults, permute, randomise, randomize
+from ._prefetcher import Prefetcher
 from ._structure import Block, Experiment, Trial
 
 _internals.active_exp = Experiment("None")
@@ -0,0 +1,339 @@
+"""
+A prefetcher that preloads the stimuli of upcoming trials.
+
+This module contains a class implementing the prefetcher.
+
+"""
+
+__author__ = 'Florian Krause <florian@expyriment.org>, \
+Oliver Lindemann <oliver@expyriment.org>'
+
+
+from ..misc._timer import get_time
+from . import defaults
+
+
+def _memory_size(stimulus):
+    """Estimate the memory a preloaded stimulus occupies.
+
+    Returns a list of (key, nbytes) tuples, one for each part of the
+    stimulus in memory. Parts that are shared between stimuli (cached
+    textures and decoded sounds) have their cache key as key, all other
+    parts None.
+
+    """
+
+    parts = []
+    ogl_screen = getattr(stimulus, "_ogl_screen", None)
+    if ogl_screen is not None:
+        key = ogl_screen._cache_key
+        if key is not None:
+            key = ("texture", key)
+        parts.append((key, ogl_screen._winsize[0] * ogl_screen._winsize[1] *
+                      4))
+    surface = getattr(stimulus, "_surface", None)
+    if surface is not None:
+        parts.append((None, surface.get_width() * surface.get_height() *
+                      surface.get_bytesize()))
+    sound_array = getattr(stimulus, "_sound_array", None)
+    if sound_array is not None:
+        parts.append((("sound", stimulus._get_sound_key()),
+                      sound_array.nbytes))
+    return parts
+
+
+class Prefetcher:
+    """A class implementing a prefetcher for the stimuli of an experiment.
+
+    The prefetcher walks through the trials of all blocks of the experiment
+    in presentation order and keeps the stimuli of the next trials
+    preloaded. The current trial is determined by the stimuli that are
+    presented: presenting a stimulus of an upcoming trial makes this trial
+    the current one, and the stimuli of all previous trials (that have been
+    preloaded by the prefetcher) are unloaded.
+
+    Preloading is done during idle time of timed waits (e.g.
+    ``Clock.wait``), and only if the preload is expected to finish before
+    the end of the wait. Loops that wait for a response (e.g.
+    ``Keyboard.wait``) do not preload stimuli, unless in_response_loops is
+    True, since preloading would delay the detection of responses.
+
+    Stimuli are only preloaded as long as they fit into the memory budget
+    (max_bytes). Trials that are not completely preloaded when they become
+    the current trial are reported as prefetch misses in the event file;
+    their remaining stimuli are preloaded immediately (regardless of the
+    budget).
+
+    Notes
+    -----
+    The prefetcher is usually created with
+    ``Experiment.start_prefetching``. Blocks and trials that are added to
+    the experiment after starting the prefetcher are not considered.
+
+    """
+
+    def __init__(self, experiment, n_trials=None, max_bytes=None,
+                 in_response_loops=None):
+        """Create a prefetcher.
+
+        Parameters
+        ----------
+        experiment : design.Experiment
+            the experiment to prefetch the stimuli of
+        n_trials : int, optional
+            number of trials (including the current one) to keep preloaded
+            (default = design.defaults.prefetch_trials)
+        max_bytes : int, optional
+            memory budget in bytes for the stimuli preloaded by the
+            prefetcher (default = design.defaults.prefetch_max_bytes)
+        in_response_loops : bool, optional
+            also preload stimuli in loops that wait for a response
+            (default = design.defaults.prefetch_in_response_loops)
+
+        """
+
+        if n_trials is None:
+            n_trials = defaults.prefetch_trials
+        if max_bytes is None:
+            max_bytes = defaults.prefetch_max_bytes
+        if in_response_loops is None:
+            in_response_loops = defaults.prefetch_in_response_loops
+        self._experiment = experiment
+        self._n_trials = max(1, n_trials)
+        self._max_bytes = max_bytes
+        self._in_response_loops = in_response_loops
+        self._trials = [trial for block in experiment.blocks
+                        for trial in block.trials]
+        self._trial_indices = {}  # id(stimulus): indices of trials
+        for idx, trial in enumerate(self._trials):
+            for stim in trial.stimuli:
+                indices = self._trial_indices.setdefault(id(stim), [])
+                if not indices or indices[-1] != idx:
+                    indices.append(idx)
+        self._position = 0
+        self._started = False
+        self._preloaded = {}  # id(stimulus): (stimulus, parts)
+        self._shared = {}  # key of shared part: number of stimuli
+        self._sizes = {}  # id(stimulus): nbytes (when preloaded alone)
+        self._nbytes = 0
+        self._preload_time = defaults.prefetch_preload_time  # average in s
+        self._n_preloads = 0
+        self._n_hits = 0
+        self._n_misses = 0
+
+    @property
+    def n_trials(self):
+        """Getter for n_trials."""
+
+        return self._n_trials
+
+    @property
+    def max_bytes(self):
+        """Getter for max_bytes."""
+
+        return self._max_bytes
+
+    @property
+    def in_response_loops(self):
+        """Getter for in_response_loops."""
+
+        return self._in_response_loops
+
+    @property
+    def current_trial(self):
+        """Getter for current_trial."""
+
+        if self._started and self._position < len(self._trials):
+            return self._trials[self._position]
+
+    @property
+    def nbytes(self):
+        """Getter for nbytes (memory used by prefetched stimuli)."""
+
+        return self._nbytes
+
+    @property
+    def n_hits(self):
+        """Getter for n_hits (trials that were preloaded in time)."""
+
+        return self._n_hits
+
+    @property
+    def n_misses(self):
+        """Getter for n_misses (trials that were not preloaded in time)."""
+
+        return self._n_misses
+
+    def _next_stimulus(self):
+        """Return the next stimulus in the window that is not preloaded."""
+
+        end = min(self._position + self._n_trials, len(self._trials))
+        for trial in self._trials[self._position:end]:
+            for stim in trial.stimuli:
+                if not stim.is_preloaded:
+                    return stim
+
+    def _preload(self, stimulus):
+        """Preload a stimulus and keep track of its memory size.
+
+        Returns
+        -------
+        nbytes : int
+            the number of bytes that have been added to the memory used by
+            the prefetched stimuli
+
+        """
+
+        start = get_time()
+        stimulus.preload()
+        duration = get_time() - start
+        if self._n_preloads == 0:
+            self._preload_time = duration
+        else:
+            self._preload_time = 0.8 * self._preload_time + 0.2 * duration
+        self._n_preloads += 1
+        parts = _memory_size(stimulus)
+        self._sizes[id(stimulus)] = sum(n for _key, n in parts)
+        self._preloaded[id(stimulus)] = (stimulus, parts)
+        added = 0
+        for key, nbytes in parts:
+            if key is not None:
+                self._shared[key] = self._shared.get(key, 0) + 1
+                if self._shared[key] > 1:
+                    continue
+            added += nbytes
+        self._nbytes += added
+        return added
+
+    def _unload(self, key):
+        """Unload a prefetched stimulus and release its memory."""
+
+        stim, parts = self._preloaded.pop(key)
+        stim.unload()
+        for part_key, nbytes in parts:
+            if part_key is not None:
+                self._shared[part_key] -= 1
+                if self._shared[part_key] > 0:
+                    continue
+                del self._shared[part_key]
+            self._nbytes -= nbytes
+
+    def _fits_budget(self, stimulus):
+        """Check whether a stimulus is known not to exceed the budget."""
+
+        if self._max_bytes is None:
+            return True
+        nbytes = self._sizes.get(id(stimulus), 0)
+        return self._nbytes + nbytes <= self._max_bytes
+
+    def step(self, time_left=None):
+        """Preload the next stimulus of the upcoming trials.
+
+        This method is called repeatedly in all wait and event loops.
+
+        Parameters
+        ----------
+        time_left : float, optional
+            remaining idle time in seconds; no stimulus will be preloaded,
+            if preloading is expected to take longer. None indicates a loop
+            that waits for a response, in which stimuli are only preloaded
+            if in_response_loops is True (default = None)
+
+        Returns
+        -------
+        preloaded : bool
+            True if a stimulus has been preloaded
+
+        """
+
+        if time_left is None:
+            if not self._in_response_loops:
+                return False
+        elif time_left < 1.5 * self._preload_time:
+            return False
+        return self._preload_next()
+
+    def _preload_next(self):
+        """Preload the next stimulus (within the budget).
+
+        The size of a stimulus is only known after it has been preloaded
+        once. A stimulus that turns out to exceed the budget is unloaded
+        again, and its size is remembered.
+
+        """
+
+        stim = self._next_stimulus()
+        if stim is None or not self._fits_budget(stim):
+            return False
+        self._preload(stim)
+        if self._max_bytes is not None and self._nbytes > self._max_bytes:
+            self._unload(id(stim))
+            return False
+        return True
+
+    def fill(self):
+        """Preload all stimuli of the upcoming trials (within the budget).
+
+        Returns
+        -------
+        time : int
+            time it took to execute this method in ms
+
+        """
+
+        start = get_time()
+        while self._preload_next():
+            pass
+        return int((get_time() - start) * 1000)
+
+    def stimulus_presented(self, stimulus):
+        """Inform the prefetcher that a stimulus is about to be presented.
+
+        This method is called by the presentation methods of all stimuli.
+
+        Parameters
+        ----------
+        stimulus : expyriment stimulus
+            the stimulus that will be presented
+
+        """
+
+        indices = self._trial_indices.get(id(stimulus))
+        if indices is None:
+            return
+        idx = next((i for i in indices if i >= self._position), None)
+        if idx is None or (idx == self._position and self._started):
+            return
+        self._advance(idx)
+
+    def _advance(self, position):
+        """Make the trial at position the current trial."""
+
+        self._position = position
+        self._started = True
+        window = set(id(stim)
+                     for trial in self._trials[position:position +
+                                               self._n_trials]
+                     for stim in trial.stimuli)
+        for key in [k for k in self._preloaded if k not in window]:
+            self._unload(key)
+
+        trial = self._trials[position]
+        missing = [stim for stim in trial.stimuli if not stim.is_preloaded]
+        if missing:
+            self._n_misses += 1
+            self._experiment._event_file_log(
+                "Prefetcher,miss,{0}".format(trial.id), 1)
+            for stim in missing:
+                self._preload(stim)
+        else:
+            self._n_hits += 1
+
+    def stop(self):
+        """Unload all stimuli that have been preloaded by the prefetcher."""
+
+        for stim, _parts in self._preloaded.values():
+            stim.unload()
+        self._preloaded = {}
+        self._shared = {}
+        self._nbytes = 0
@@ -14,10 +14,10 @@ try:
     import locale
 except ImportError:
     locale = None  # Does not exist on Android
-import codecs
 import re
 import sys
-from types import FunctionType
+from itertools import chain
+from types import FunctionType, MappingProxyType
 
 try:
     import csv
@@ -26,17 +26,21 @@ except ImportError:
 
 from copy import deepcopy
 
+import numpy as np
+
 from .. import _internals
 from ..misc import (
     Clock,
-    bytes_to_unicode,
     constants,
     string_sort_array,
     unicode_to_bytes,
 )
 from . import defaults, permute
+from ._prefetcher import Prefetcher
+from ._trial_table import TrialFactors, TrialTable
 from .randomise import rand_int, shuffle_list
 
+_CSV_SPECIAL_CHARACTERS = re.compile('[,"\r\n]')
 _FACTOR_NOT_EXIST = "The factor '{0}' does not exist!\nUse has_factor(name) to check if a factor is defined."
 _BWS_FACTOR_NOT_EXIST = "The bws-factor '{0}' does not exist!\nUse has_bws_factor(name) to check if a bws-factor is defined."
 
@@ -107,6 +111,7 @@ class Experiment:
         self._events = None
         self._log_level = None  # will be set from initialise
         self._wait_callback_function = None
+        self._prefetcher = None
 
     @property
     def name(self):
@@ -670,7 +675,8 @@ class Experiment:
         else:
             return False
 
-    def shuffle_blocks(self, method=0, max_repetitions=None, n_segments=None):
+    def shuffle_blocks(self, method=0, max_repetitions=None, n_segments=None,
+                       min_distance=None, balance_transitions=False, rng=None):
         """Shuffle all blocks.
 
         The function returns False if no randomisation could be found that
@@ -696,42 +702,28 @@ class Experiment:
         n_segments : int, optional
             this parameter will be only considered for randomisation method 0;
             see documentation of `randomise.shuffle_list` (default = None)
+        min_distance : int, optional
+            see documentation of `randomise.shuffle_list` (default = None)
+        balance_transitions : bool, optional
+            see documentation of `randomise.shuffle_list` (default = False)
+        rng : numpy.random.Generator or int, optional
+            see documentation of `randomise.shuffle_list` (default = None)
 
         Returns
         -------
         succeeded : bool
             returns if randomisation was successful and fulfilled the specified
-            constrains (see max_repetitions)
+            constrains (see max_repetitions and min_distance)
 
         """
 
         if method == 1: # make segments
-            tmp = self._blocks
-            self._blocks = []
-            types_occurred = []
-            cnt = 0
-            n_segments = 1
-            while len(tmp) > 0:
-                is_new = True
-                tr_type = tmp[cnt].factors_as_text
-                for occ in types_occurred:
-                    if tr_type == occ:
-                        is_new = False
-                        break
-                if is_new:
-                    self._blocks.append(tmp.pop(cnt))
-                    types_occurred.append(tr_type)
-                    cnt = 0
-                else:
-                    cnt += 1
-                    if cnt >= len(tmp):
-                        types_occurred = []
-                        cnt = 0
-                        if len(tmp)>0:
-                            n_segments += 1
+            self._blocks, n_segments = _make_miniblocks(
+                self._blocks, [b._get_type_key() for b in self._blocks])
 
         rtn = shuffle_list(self._blocks, max_repetitions=max_repetitions,
-                           n_segments=n_segments)
+                           n_segments=n_segments, min_distance=min_distance,
+                           balance_transitions=balance_transitions, rng=rng)
         if rtn is False:
             print("Warning: Could not find an appropriate block " + \
                   "randomisation!")
@@ -870,44 +862,44 @@ type".format(permutation_type))
 
         """
 
-        rtn = "#exp: {0}\n".format(self.name)
-        if len(self.experiment_info) > 0:
-            for txt in self.experiment_info:
-                rtn = f"{rtn}#xpi: {txt}\n"
+        return "\n".join(self._design_lines())
+
+    def _design_lines(self):
+        """Generate the lines of the trial list as csv table.
+
+        See Also
+        --------
+        design_as_text
+
+        """
+
+        yield "#exp: {0}".format(self.name)
+        for txt in self.experiment_info:
+            yield "#xpi: {0}".format(txt)
         if len(self.bws_factor_names) > 0:
             for factor_name in self.bws_factor_names:
-                rtn = f"{rtn}#bws: {factor_name}="
-                for txt in self.get_bws_factor(factor_name):
-                    rtn = f"{rtn}{txt},"
-                rtn = rtn[:-1] + "\n"  # delete last comma
-            rtn += "#bws-rand: {0}\n".format(int(self.bws_factor_randomised))
+                yield "#bws: {0}={1}".format(factor_name, ",".join(
+                    map(str, self.get_bws_factor(factor_name))))
+            yield "#bws-rand: {0}".format(int(self.bws_factor_randomised))
         if len(self.data_variable_names) > 0:
-            rtn = f"{rtn}#dvn: "
-            for txt in self.data_variable_names:
-                rtn = f"{rtn}{txt},"
-            rtn = rtn[:-1] + "\n"
+            yield "#dvn: {0}".format(",".join(
+                map(str, self.data_variable_names)))
 
-        rtn = f"{rtn}block_cnt,block_id"
         bl_factors = self.block_list_factor_names
         factors = self.trial_factor_names
-        for f in bl_factors:
-            rtn = f"{rtn},block_{f}"
-        rtn = f"{rtn},trial_cnt,trial_id"
-        for f in factors:
-            rtn = f"{rtn},{f}"
+        yield _csv_line(["block_cnt", "block_id"] +
+                        ["block_{0}".format(f) for f in bl_factors] +
+                        ["trial_cnt", "trial_id"] + factors)
 
         for bl_cnt, bl in enumerate(self.blocks):
-            for tr_cnt, tr in enumerate(bl.trials):
-                rtn = f"{rtn}\n{bl_cnt},{bl.id}"
-                for f in bl_factors:
-                    factor = bl.get_factor(f, return_none_if_not_defined=True)
-                    rtn = f"{rtn},{factor}"
-                rtn = f"{rtn},{tr_cnt},{tr.id}"
-                for f in factors:
-                    factor = tr.get_factor(f, return_none_if_not_defined=True)
-                    rtn = f"{rtn},{factor}"
-
-        return rtn
+            block_columns = [bl_cnt, bl.id] + \
+                [bl.get_factor(f, return_none_if_not_defined=True)
+                 for f in bl_factors]
+            prefix = _csv_line(block_columns)
+            columns = [bl.get_trial_factor_values(f) for f in factors]
+            ids = [tr.id for tr in bl.trials]
+            for tr_cnt, row in enumerate(zip(ids, *columns)):
+                yield "{0},{1},{2}".format(prefix, tr_cnt, _csv_line(row))
 
     def save_design(self, filename):
         """Save the design as list of trials to a csv file.
@@ -933,7 +925,8 @@ type".format(permutation_type))
             except Exception:
                 locale_enc = "UTF-8"
             header = "# -*- coding: {0} -*-\n".format(locale_enc)
-            f.write(unicode_to_bytes(header + self.design_as_text))
+            f.write(unicode_to_bytes(header))
+            _write_lines(f, self._design_lines())
 
     def load_design(self, filename, encoding=None):
         """Load the design from a csv file containing list of trials.
@@ -972,89 +965,213 @@ type".format(permutation_type))
                         encoding = [None]
         else:
             encoding = [encoding]
-        with codecs.open(filename, 'rb', encoding[0], errors='replace') as fl:
+        rows = []
+        with open(filename, 'r', encoding=encoding[0], errors='replace',
+                  newline='') as fl:
             for ln in fl:
-                ln = bytes_to_unicode(ln)
-                if ln[0] == "#":
-                    if ln.startswith("#exp:"):
-                        self._name = ln[6:].strip()
-                    elif ln.startswith("#xpi:"):
-                        self.add_experiment_info(ln[6:].strip())
-                    elif ln.startswith("#dvn:"):
-                        for tmp in ln[6:].split(","):
-                            self.add_data_variable_names(tmp.strip())
-                    elif ln.startswith("#bws-rand:"):
-                        self.bws_factor_randomised = (ln[11] == "1")
-                    elif ln.startswith("#bws:"):
-                        tmp = ln[6:].split("=")
-                        print(tmp[1].strip().split(","))
-                        self.add_bws_factor(tmp[0], tmp[1].strip().split(","))
-
-                else:  # data line
-                    if len(block_factors) < 1:
-                        # read first no-comment line --> varnames
-                        for col, var in enumerate(ln.split(delimiter)):
-                            var = var.strip()
-                            if var.startswith("block_"):
-                                var = var.replace("block_", "")
-                                block_factors[col] = var
-                            elif var.startswith("trial_"):
-                                var = var.replace("trial_", "")
-                                trial_factors[col] = var
-                            else:
-                                trial_factors[col] = var
-
-                        if not("cnt" in list(block_factors.values()) and
-                               "id" in list(block_factors.values()) and
-                               "cnt" in list(trial_factors.values()) and
-                               "id" in list(trial_factors.values())):
-                            message = "Can't read design file. " + \
-                                "The file '{0}' ".format(filename) + \
-                                "does not contain an Expyriment trial list."
-                            raise OSError(message)
-                    else:
-                        block_cnt = None
-                        trial_cnt = None
-                        # read data
-                        for col, val in enumerate(ln.split(delimiter)):
-                            val = val.strip()
-                            # try to convert to number
-                            if val.find(".") >= 0:
-                                try:
-                                    val = float(val)
-                                except Exception:
-                                    pass
-                            else:
-                                try:
-                                    val = int(val)
-                                except Exception:
-                                    pass
-
-                            # set value to block or trial
-                            if col in block_factors:
-                                if block_factors[col] == "cnt":
-                                    block_cnt = val
-                                    while len(self.blocks) < block_cnt + 1:
-                                        self.add_block(Block())
-                                elif block_factors[col] == "id":
-                                    self.blocks[block_cnt]._id = val
-                                else:
-                                    self.blocks[block_cnt].set_factor(
-                                        block_factors[col], val)
-
-                            if col in trial_factors:
-                                if trial_factors[col] == "cnt":
-                                    trial_cnt = val
-                                    while len(self.blocks[block_cnt].trials)\
-                                            < trial_cnt + 1:
-                                        self.blocks[block_cnt].add_trial(
-                                            Trial())
-                                elif trial_factors[col] == "id":
-                                    self.blocks[block_cnt].trials[trial_cnt].\
-                                        _id = val
-                                else:
-                                    self.blocks[block_cnt].trials[trial_cnt].\
-                                        set_factor(trial_factors[col], val)
+                if ln.strip() == "":
+                    continue
+                if ln[0] != "#":
+                    # first data line; the csv reader reads the remaining
+                    # lines itself, since quoted values may span lines
+                    rows = [row for row in csv.reader(chain([ln], fl))
+                            if len(row) > 1 or
+                            (len(row) == 1 and row[0].strip() != "")]
+                    break
+                if ln.startswith("#exp:"):
+                    self._name = ln[6:].strip()
+                elif ln.startswith("#xpi:"):
+                    self.add_experiment_info(ln[6:].strip())
+                elif ln.startswith("#dvn:"):
+                    for tmp in ln[6:].split(","):
+                        self.add_data_variable_names(tmp.strip())
+                elif ln.startswith("#bws-rand:"):
+                    self.bws_factor_randomised = (ln[11] == "1")
+                elif ln.startswith("#bws:"):
+                    tmp = ln[6:].split("=")
+                    print(tmp[1].strip().split(","))
+                    self.add_bws_factor(tmp[0], tmp[1].strip().split(","))
+
+        if len(rows) == 0:
+            return
+
+        # first no-comment line --> varnames
+        for col, var in enumerate(rows[0]):
+            var = var.strip()
+            if var.startswith("block_"):
+                var = var.replace("block_", "")
+                block_factors[col] = var
+            elif var.startswith("trial_"):
+                var = var.replace("trial_", "")
+                trial_factors[col] = var
+            else:
+                trial_factors[col] = var
+
+        if not("cnt" in list(block_factors.values()) and
+               "id" in list(block_factors.values()) and
+               "cnt" in list(trial_factors.values()) and
+               "id" in list(trial_factors.values())):
+            message = "Can't read design file. " + \
+                "The file '{0}' ".format(filename) + \
+                "does not contain an Expyriment trial list."
+            raise OSError(message)
+
+        # read data column by column
+        columns = _get_columns(rows[1:], len(rows[0]))
+        for col in range(len(columns)):
+            columns[col] = _convert_column(columns[col])
+        block_cols = dict((var, col) for col, var in block_factors.items())
+        trial_cols = dict((var, col) for col, var in trial_factors.items())
+        block_cnts = columns[block_cols["cnt"]]
+        trial_cnts = columns[trial_cols["cnt"]]
+
+        # rows of each block
+        block_rows = {}
+        for row, block_cnt in enumerate(block_cnts):
+            block_rows.setdefault(block_cnt, []).append(row)
+        while len(self.blocks) < max(block_rows) + 1:
+            self.add_block(Block())
+
+        for block_cnt, indices in sorted(block_rows.items()):
+            block = self.blocks[block_cnt]
+            for var, col in block_cols.items():
+                # the last value of a block is used
+                val = next((columns[col][row] for row in reversed(indices)
+                            if columns[col][row] is not None), None)
+                if var == "cnt" or val is None:
+                    continue
+                elif var == "id":
+                    block._id = val
+                else:
+                    block.set_factor(var, val)
+
+            positions = [trial_cnts[row] for row in indices]
+            n_trials = max(positions) + 1
+            in_order = positions == list(range(n_trials)) and \
+                indices[-1] - indices[0] == n_trials - 1
+            trial_columns = {}
+            for var, col in trial_cols.items():
+                if var in ("cnt", "id"):
+                    continue
+                if in_order:
+                    trial_columns[var] = \
+                        columns[col][indices[0]:indices[-1] + 1]
+                else:
+                    trial_columns[var] = values = [None] * n_trials
+                    for row, pos in zip(indices, positions):
+                        values[pos] = columns[col][row]
+            first = len(block.trials)
+            block.add_trials_from_columns(trial_columns)
+            while len(block.trials) < first + n_trials:
+                block.add_trial(Trial())
+            for row, pos in zip(indices, positions):
+                val = columns[trial_cols["id"]][row]
+                if val is not None:
+                    block.trials[first + pos]._id = val
+
+    def preload_stimuli(self, n_processes=None):
+        """Preload all stimuli of all trials in all blocks.
+
+        Parameters
+        ----------
+        n_processes : int, optional
+            number of worker processes, in which the surfaces of visual
+            stimuli are created in parallel (default =
+            design.defaults.preload_processes). If 0, the number of CPUs
+            is used. OpenGL textures are always created in the main
+            process. The worker processes import the main script of the
+            experiment, which thus has to be protected by
+            ``if __name__ == "__main__":``.
+
+        Returns
+        -------
+        time : int
+            time it took to execute this method in ms
+
+        """
+
+        start = Clock.monotonic_time()
+        _preload_stimuli([stim for block in self._blocks
+                          for trial in block.trials
+                          for stim in trial.stimuli], n_processes)
+        return int((Clock.monotonic_time() - start) * 1000)
+
+    def unload_stimuli(self, keep_surface=False):
+        """Unload all stimuli of all trials in all blocks.
+
+        Parameters
+        ----------
+        keep_surface : bool, optional
+            keep the surface after unloading (default = False)
+
+        Returns
+        -------
+        time : int
+            time it took to execute this method in ms
+
+        """
+
+        start = Clock.monotonic_time()
+        for block in self._blocks:
+            block.unload_stimuli(keep_surface=keep_surface)
+        return int((Clock.monotonic_time() - start) * 1000)
+
+    @property
+    def prefetcher(self):
+        """Getter for prefetcher (None if stimuli are not prefetched)."""
+
+        return self._prefetcher
+
+    def start_prefetching(self, n_trials=None, max_bytes=None,
+                          in_response_loops=None):
+        """Start prefetching the stimuli of the experiment.
+
+        A prefetcher walks through the trials of all blocks in presentation
+        order and, during idle time in timed waits (e.g. ``Clock.wait``),
+        preloads the stimuli of the next trials. Presenting a stimulus of an
+        upcoming trial makes it the current trial, and the stimuli of
+        previous trials are unloaded again. Trials that are not preloaded in
+        time are logged as prefetch misses in the event file.
+
+        Parameters
+        ----------
+        n_trials : int, optional
+            number of trials (including the current one) to keep preloaded
+            (default = design.defaults.prefetch_trials)
+        max_bytes : int, optional
+            memory budget in bytes for the preloaded stimuli
+            (default = design.defaults.prefetch_max_bytes)
+        in_response_loops : bool, optional
+            also preload stimuli in loops that wait for a response (e.g.
+            ``Keyboard.wait``), which delays the detection of responses and
+            thus affects reaction times
+            (default = design.defaults.prefetch_in_response_loops)
+
+        Returns
+        -------
+        prefetcher : design.Prefetcher
+            the prefetcher
+
+        Notes
+        -----
+        Call ``prefetcher.fill()`` to preload the stimuli of the first trials
+        before the experiment starts. Stimuli that have been preloaded
+        manually are never unloaded by the prefetcher.
+
+        """
+
+        self.stop_prefetching()
+        self._prefetcher = Prefetcher(self, n_trials=n_trials,
+                                      max_bytes=max_bytes,
+                                      in_response_loops=in_response_loops)
+        return self._prefetcher
+
+    def stop_prefetching(self):
+        """Stop prefetching and unload all prefetched stimuli."""
+
+        if self._prefetcher is not None:
+            self._prefetcher.stop()
+            self._prefetcher = None
 
     def _event_file_log(self, log_text, log_level=1, log_event_tag=None):
         # log_level 1 = default, 2 = extensive, 0 or False = off
@@ -1093,9 +1210,10 @@ type".format(permutation_type))
 
         if self.is_initialised and self.events is not None:
             self.events.log("design,log,{0}".format(additional_comment))
-            for ln in self.design_as_text.splitlines():
-                self.events.write_comment(
-                    "design: {0}".format(ln).replace(":#", "-"))
+            for line in self._design_lines():
+                for ln in line.splitlines():
+                    self.events.write_comment(
+                        "design: {0}".format(ln).replace(":#", "-"))
             self.events.log("design,logged,{0}".format(
                 additional_comment))
 
@@ -1157,14 +1275,21 @@ type".format(permutation_type))
 
         self._wait_callback_function = None
 
-    def _execute_wait_callback(self):
+    def _execute_wait_callback(self, time_left=None):
         """Execute wait function.
 
         Returns the return value of the callback function or
         False if callback is not defines.
 
+        If stimuli are prefetched, the prefetcher will preload the next
+        stimulus beforehand (if the remaining waiting time in seconds,
+        time_left, allows for it). Loops that wait for a response do not
+        pass time_left.
+
         """
 
+        if self._prefetcher is not None:
+            self._prefetcher.step(time_left)
         if self._wait_callback_function is not None:
             return self._wait_callback_function()
         else:
@@ -1180,18 +1305,31 @@ type".format(permutation_type))
 
 
 class Block:
-    """A class implementing an experimental block."""
+    """A class implementing an experimental block.
+
+    The trial factors of a columnar block are held in a table with one
+    column (NumPy array) per factor and the trials of the block provide
+    views on the rows of this table. Factor queries, filtering and the
+    determination of trial repetitions are then done with array operations,
+    which is considerably faster for blocks with many trials. The factors of
+    the trials of a columnar block are ordered by the order in which they
+    have first been defined in the block.
+
+    """
 
     _trial_cnt_variable_name = "trial_cnt"  # variable names for csv in/output
     _trial_id_variable_name = "trial_id"
 
-    def __init__(self, name=None):
+    def __init__(self, name=None, columnar=None):
         """Create a block.
 
         Parameters
         ----------
         name : str, optional
             name of the block
+        columnar : bool, optional
+            hold the trial factors in a columnar table
+            (default = design.defaults.block_columnar)
 
         """
 
@@ -1199,11 +1337,18 @@ class Block:
             self._name = name
         else:
             self._name = defaults.block_name
+        if columnar is None:
+            columnar = defaults.block_columnar
 
         self._factors = {}
+        self._type_key = None
         self._trials = []
         self._trial_id_counter = 0
         self._id = None
+        if columnar:
+            self._table = TrialTable()
+        else:
+            self._table = None
 
     @property
     def name(self):
@@ -1223,6 +1368,32 @@ class Block:
 
         return self._trials
 
+    @property
+    def is_columnar(self):
+        """Getter for is_columnar."""
+
+        return self._table is not None
+
+    def _get_table_rows(self):
+        """Return the rows of all trials in the trial table.
+
+        None is returned, if the block is not columnar or if not all trials
+        are views on the trial table (e.g. trials that have been appended
+        directly to the trial list).
+
+        """
+
+        if self._table is None:
+            return None
+        rows = np.empty(len(self._trials), dtype=np.intp)
+        for i, trial in enumerate(self._trials):
+            factors = trial._factors
+            if not isinstance(factors, TrialFactors) or \
+                    factors._table is not self._table:
+                return None
+            rows[i] = factors._row
+        return rows
+
     def __str__(self):
         return self._get_summary(True)
 
@@ -1295,6 +1466,7 @@ class Block:
 
         if isinstance(value, (bytes, str, int, float)):
             self._factors[name] = value
+            self._type_key = None
         else:
             message = "Factor values or factor conditions must to be a " + \
                 "String or a Number (i.e. float or integer).\n " + \
@@ -1344,14 +1516,20 @@ class Block:
 
     @property
     def factor_dict(self):
-        """The dictionary with all factors of the block."""
+        """The dictionary with all factors of the block.
+
+        The dictionary is read-only; use `set_factor` and `clear_factors` to
+        change factors.
 
-        return self._factors
+        """
+
+        return MappingProxyType(self._factors)
 
     def clear_factors(self):
         """Clear all factors."""
 
         self._factors = {}
+        self._type_key = None
 
     @property
     def factor_names(self):
@@ -1381,7 +1559,21 @@ class Block:
 
         """
 
-        return (self.factor_dict == block.factor_dict)
+        return self._get_type_key() == block._get_type_key()
+
+    def _get_type_key(self):
+        """Return a hashable key of the factors of the block.
+
+        Blocks with identical factors have identical keys. The key is cached
+        and reset by `set_factor` and `clear_factors`, which are the only
+        ways to change the factors (`factor_dict` is read-only). Code that
+        changes `_factors` directly has to reset `_type_key`.
+
+        """
+
+        if self._type_key is None:
+            self._type_key = frozenset(self._factors.items())
+        return self._type_key
 
     def get_random_trial(self):
         """Returns a randomly selected trial.
@@ -1415,13 +1607,25 @@ class Block:
 
         """
 
+        if self._table is not None:
+            first = self._table.add_rows(copies)
+            for name, value in trial.factor_dict.items():
+                self._table.set_value(slice(first, first + copies), name,
+                                      value)
         for _x in range(0, copies):
+            if self._table is not None:
+                new = Trial()
+                new._factors = TrialFactors(self._table, first + _x)
+                new._type_key = trial._type_key
+                new._stimuli = trial._stimuli.copy()
+            else:
+                new = trial.copy()
             if random_position:
                 pos = rand_int(0, len(self._trials))
-                self._trials.insert(pos, trial.copy())
+                self._trials.insert(pos, new)
             else:
-                self._trials.append(trial.copy())
-            self._trials[-1]._id = self._trial_id_counter
+                self._trials.append(new)
+            new._id = self._trial_id_counter
             self._trial_id_counter += 1
 
         log_txt = "Block,trial added,{0}, {1}".format(self.name,
@@ -1450,6 +1654,8 @@ class Block:
 
         self._trials = []
         self._trial_id_counter = 0
+        if self._table is not None:
+            self._table = TrialTable()
 
         _internals.active_exp._event_file_log("Block,trials cleared", 2)
 
@@ -1473,17 +1679,13 @@ class Block:
 
         if len(self.trials) < 1:
             return []
-        rtn = self.trials[0].factor_names
+        rows = self._get_table_rows()
+        if rows is not None:
+            return self._table.get_names(rows)
+        rtn = {}
         for tr in self.trials:
-            for new_fac in tr.factor_names:
-                is_new = True
-                for old_fac in rtn:
-                    if old_fac == new_fac:
-                        is_new = False
-                        break
-                if is_new:
-                    rtn.append(new_fac)
-        return rtn
+            rtn.update(dict.fromkeys(tr.factor_dict))
+        return list(rtn)
 
     def get_trial_factor_values(self, name):
         """Return a list of the values of a certain factor for all trials.
@@ -1495,11 +1697,60 @@ class Block:
 
         """
 
+        rows = self._get_table_rows()
+        if rows is not None:
+            return self._table.get_values(name, rows)
         rtn = []
         for trial in self.trials:
             rtn.append(trial.get_factor(name, return_none_if_not_defined=True))
         return rtn
 
+    def filter_trials(self, **factors):
+        """Keep only trials with certain factor values.
+
+        Parameters
+        ----------
+        **factors
+            factor names and the values to keep; a value can also be a list
+            of values
+
+        Returns
+        -------
+        n_removed : int
+            number of removed trials
+
+        Examples
+        --------
+        >>> bl.filter_trials(target=["left", "right"], cue=300)
+
+        """
+
+        rows = self._get_table_rows()
+        if rows is not None:
+            mask = np.ones(len(rows), dtype=bool)
+            for name, values in factors.items():
+                if not isinstance(values, (list, tuple)):
+                    values = [values]
+                mask &= self._table.get_mask(name, rows, values)
+            trials = [tr for tr, keep in zip(self._trials, mask) if keep]
+        else:
+            trials = []
+            for tr in self._trials:
+                for name, values in factors.items():
+                    if not isinstance(values, (list, tuple)):
+                        values = [values]
+                    if not tr.has_factor(name) or \
+                            tr.get_factor(name) not in values:
+                        break
+                else:
+                    trials.append(tr)
+        n_removed = len(self._trials) - len(trials)
+        self._trials = trials
+
+        _internals.active_exp._event_file_log(
+            "Block,trials filtered,{0},{1}".format(self.id, n_removed), 2)
+        return n_removed
+
     @property
     def design_as_text(self):
         """Getter for design_as_text.
@@ -1511,16 +1762,24 @@ class Block:
 
         """
 
-        rtn = "{0},{1}".format(self._trial_cnt_variable_name,
-                               self._trial_id_variable_name)
+        return "\n".join(self._design_lines())
+
+    def _design_lines(self):
+        """Generate the lines of the list of trial factors as csv table.
+
+        See Also
+        --------
+        design_as_text
+
+        """
+
         factors = self.trial_factor_names
-        for f in factors:
-            rtn += ",{0}".format(f)
-        for cnt, tr in enumerate(self.trials):
-            rtn += "\n{0},{1}".format(cnt, tr.id)
-            for f in factors:
-                rtn += ",{0}".format(tr.get_factor(f, return_none_if_not_defined=True))
-        return rtn
+        yield _csv_line([self._trial_cnt_variable_name,
+                         self._trial_id_variable_name] + factors)
+        columns = [self.get_trial_factor_values(f) for f in factors]
+        ids = [tr.id for tr in self.trials]
+        for cnt, row in enumerate(zip(ids, *columns)):
+            yield "{0},{1}".format(cnt, _csv_line(row))
 
     def save_design(self, filename):
         """Save the list of trials to a csv file.
@@ -1539,7 +1798,8 @@ class Block:
             except Exception:
                 locale_enc = "UTF-8"
             header = "# -*- coding: {0} -*-\n".format(locale_enc)
-            f.write(unicode_to_bytes(header + self.design_as_text))
+            f.write(unicode_to_bytes(header))
+            _write_lines(f, self._design_lines())
 
     def read_design(self, filename):
         """Reads a list of trials from a csv file and clears the old block
@@ -1556,23 +1816,15 @@ class Block:
 
         """
 
-        tmp = Block()
-        tmp.add_trials_from_csv_file(filename)
-        fac_names = tmp.trial_factor_names
+        names, columns = _read_csv_columns(filename)
 
         self.clear_factors()
         self.clear_trials()
 
-        for tr in tmp.trials:
-            new = Trial()
-            for fac in fac_names:
-                if fac == self._trial_cnt_variable_name:
-                    pass
-                elif fac == self._trial_id_variable_name:
-                    new._id = int(tr.get_factor(fac, return_none_if_not_defined=True))
-                else:
-                    new.set_factor(fac, tr.get_factor(fac, return_none_if_not_defined=True))
-            self.add_trial(new)
+        self.add_trials_from_columns(
+            dict((name, column) for name, column in zip(names, columns)
+                 if name not in (self._trial_cnt_variable_name,
+                                 self._trial_id_variable_name)))
 
     def add_trials_from_csv_file(self, filename, encoding=None):
         """Read a list of trials from csv-file and append the new trials to the
@@ -1582,7 +1834,8 @@ class Block:
 
             The first row of the csv-file specifies the factor names. Each
             following row describes one trial. Each row must have the same
-            amount of columns.
+            amount of columns. Rows starting with "#" before the first row
+            are ignored.
 
         Notes
         ------
@@ -1599,33 +1852,8 @@ class Block:
 
         """
 
-        factor_names = []
-        if encoding is None:
-            with open(filename, 'r') as fl:
-                first_line = fl.readline()
-                encoding = re.findall(r"coding[:=]\s*([-\w.]+)", first_line)
-                if encoding == []:
-                    second_line = fl.readline()
-                    encoding = re.findall(r"coding[:=]\s*([-\w.]+)",
-                                          second_line)
-                    if encoding == []:
-                        encoding = ['utf-8']
-
-        else:
-            encoding = [encoding]
-
-        with codecs.open(filename, "rb", encoding[0], errors='replace') as f:
-            reader = csv.reader(f)
-            for r_cnt, row in enumerate(reader):
-                if r_cnt == 0:
-                    factor_names = [bytes_to_unicode(x) for x in row]
-                else:
-                    trial = Trial()
-                    for c_cnt in range(0, len(row)):
-                        trial.set_factor(bytes_to_unicode(factor_names[c_cnt]),
-                                         bytes_to_unicode(row[c_cnt]))
-                    self.add_trial(trial)
-
+        names, columns = _read_csv_columns(filename, encoding)
+        self.add_trials_from_columns(dict(zip(names, columns)))
 
     def add_trials_full_factorial(self, design_dict, copies=1):
         """Add trials of all combinations of a full factorial design.
@@ -1665,6 +1893,81 @@ class Block:
             cnt = _get_next_permutation(values=cnt, levels=levels)
 
 
+    def add_trials_from_columns(self, columns):
+        """Add trials defined by columns of factor values.
+
+        All trials are created at once. This is considerably faster than
+        adding the trials one by one, in particular for columnar blocks.
+
+        Parameters
+        ----------
+        columns : dict or numpy structured array
+            factor names and sequences (e.g. lists or NumPy arrays) of factor
+            values of equal length, or a NumPy structured array with one
+            field per factor; factors with the value None will not be defined
+            for the respective trial
+
+        Returns
+        -------
+        n_trials : int
+            number of added trials
+
+        Examples
+        --------
+        >>> bl = design.Block()
+        >>> bl.add_trials_from_columns({
+        >>>    "target": ["left", "right", "left"],
+        >>>    "cue": [-300, 300, 300]})
+
+        """
+
+        if getattr(getattr(columns, "dtype", None), "names", None):
+            columns = dict((name, columns[name])
+                           for name in columns.dtype.names)
+        values = {}
+        n_trials = 0
+        for name, column in columns.items():
+            if hasattr(column, "tolist"):
+                column = column.tolist()  # NumPy to Python types
+            else:
+                column = list(column)
+            if len(values) > 0 and len(column) != n_trials:
+                raise ValueError("All columns must have the same length!")
+            n_trials = len(column)
+            for type_ in set(map(type, column)):
+                if not issubclass(type_, (bytes, str, int, float,
+                                          type(None))):
+                    message = "Factor values or factor conditions must " + \
+                        "to be a string or a numeric (i.e. float or " + \
+                        "integer).\n {0} is not allowed.".format(type_)
+                    raise TypeError(message)
+            values[name] = column
+        if n_trials == 0:
+            return 0
+
+        if self._table is not None:
+            first = self._table.add_rows(n_trials)
+            for name, column in values.items():
+                self._table.set_column(name, column, first)
+            factors = (TrialFactors(self._table, row)
+                       for row in range(first, first + n_trials))
+        else:
+            names = list(values.keys())
+            factors = (dict((name, value)
+                            for name, value in zip(names, row)
+                            if value is not None)
+                       for row in zip(*values.values()))
+        for factor_dict in factors:
+            new = Trial()
+            new._factors = factor_dict
+            new._id = self._trial_id_counter
+            self._trial_id_counter += 1
+            self._trials.append(new)
+
+        _internals.active_exp._event_file_log(
+            "Block,trials added,{0},{1}".format(self.name, n_trials), 2)
+        return n_trials
+
     def order_trials(self, order):
         """Order the trials.
 
@@ -1709,9 +2012,11 @@ class Block:
 
         """
 
-        tmp = []
-        for t in self._trials:
-            tmp.append(t.factors_as_text)
+        rows = self._get_table_rows()
+        if rows is not None:
+            tmp = self._table.get_type_codes(rows)
+        else:
+            tmp = [t._get_type_key() for t in self._trials]
 
         max_reps = 0
         cnt = 0
@@ -1724,7 +2029,8 @@ class Block:
                 cnt = 0
         return max_reps
 
-    def shuffle_trials(self, method=0, max_repetitions=None, n_segments=None):
+    def shuffle_trials(self, method=0, max_repetitions=None, n_segments=None,
+                       min_distance=None, balance_transitions=False, rng=None):
         """Shuffle all trials.
 
         The function returns False if no randomisation could be found that
@@ -1750,42 +2056,32 @@ class Block:
         n_segments : int, optional
             this parameter will be only considered for randomisation method 0;
             see documentation of `randomise.shuffle_list` (default = None)
+        min_distance : int, optional
+            see documentation of `randomise.shuffle_list` (default = None)
+        balance_transitions : bool, optional
+            see documentation of `randomise.shuffle_list` (default = False)
+        rng : numpy.random.Generator or int, optional
+            see documentation of `randomise.shuffle_list` (default = None)
 
         Returns
         -------
         succeeded : bool
             returns if randomisation was successful and fulfilled the specified
-            constrains (see max_repetitions)
+            constrains (see max_repetitions and min_distance)
 
         """
 
         if method == 1: # make segments
-            tmp = self._trials
-            self._trials = []
-            types_occurred = []
-            cnt = 0
-            n_segments = 1
-            while len(tmp) > 0:
-                is_new = True
-                tr_type = tmp[cnt].factors_as_text
-                for occ in types_occurred:
-                    if tr_type == occ:
-                        is_new = False
-                        break
-                if is_new:
-                    self._trials.append(tmp.pop(cnt))
-                    types_occurred.append(tr_type)
-                    cnt = 0
-                else:
-                    cnt = cnt + 1
-                    if cnt >= len(tmp):
-                        types_occurred = []
-                        cnt = 0
-                        if len(tmp)>0:
-                            n_segments += 1
+            rows = self._get_table_rows()
+            if rows is not None:
+                keys = self._table.get_type_codes(rows).tolist()
+            else:
+                keys = [t._get_type_key() for t in self._trials]
+            self._trials, n_segments = _make_miniblocks(self._trials, keys)
 
         rtn = shuffle_list(self._trials, max_repetitions=max_repetitions,
-                           n_segments=n_segments)
+                           n_segments=n_segments, min_distance=min_distance,
+                           balance_transitions=balance_transitions, rng=rng)
         if rtn is False:
             print("Warning: Could not find an appropriate trial " + \
                   "randomisation!")
@@ -1794,13 +2090,7 @@ class Block:
     def sort_trials(self):
         """Sort the trials according to their indices from low to high."""
 
-        trials_new = []
-        id_list = sorted(x.id for x in self._trials)
-        for _id in id_list:
-            position = [i for i, x in enumerate(self._trials)
-                        if x.id == _id][0]
-            trials_new.append(self._trials[position])
-        self._trials = trials_new
+        self._trials = sorted(self._trials, key=lambda x: x.id)
 
     def find_trial(self, id):
         """Find the positions of a trial.
@@ -1824,17 +2114,75 @@ class Block:
     def copy(self):
         """Return a copy of the block."""
 
-        owntrials = []
-        triallist = []
-        for trial in self._trials:
-            owntrials.append(trial)
-            triallist.append(trial.copy())
+        owntrials = self._trials
+        owntable = self._table
+        ownrows = self._get_table_rows()
         self._trials = []
+        self._table = None
         rtn = deepcopy(self)
         self._trials = owntrials
-        rtn._trials = triallist
+        self._table = owntable
+        if ownrows is not None:
+            rtn._table = owntable.copy()
+            for trial, row in zip(owntrials, ownrows.tolist()):
+                new = Trial()
+                new._factors = TrialFactors(rtn._table, row)
+                new._type_key = trial._type_key
+                new._stimuli = trial._stimuli.copy()
+                new._id = trial._id
+                rtn._trials.append(new)
+        else:
+            rtn._trials = [trial.copy() for trial in owntrials]
+            if owntable is not None:
+                rtn._table = owntable.copy()
         return rtn
 
+    def preload_stimuli(self, n_processes=None):
+        """Preload all stimuli of all trials in block.
+
+        Parameters
+        ----------
+        n_processes : int, optional
+            number of worker processes, in which the surfaces of visual
+            stimuli are created in parallel (default =
+            design.defaults.preload_processes). If 0, the number of CPUs
+            is used. OpenGL textures are always created in the main
+            process. The worker processes import the main script of the
+            experiment, which thus has to be protected by
+            ``if __name__ == "__main__":``.
+
+        Returns
+        -------
+        time : int
+            time it took to execute this method in ms
+
+        """
+
+        start = Clock.monotonic_time()
+        _preload_stimuli([stim for trial in self._trials
+                          for stim in trial.stimuli], n_processes)
+        return int((Clock.monotonic_time() - start) * 1000)
+
+    def unload_stimuli(self, keep_surface=False):
+        """Unload all stimuli of all trials in block.
+
+        Parameters
+        ----------
+        keep_surface : bool, optional
+            keep the surface after unloading (default = False)
+
+        Returns
+        -------
+        time : int
+            time it took to execute this method in ms
+
+        """
+
+        start = Clock.monotonic_time()
+        for trial in self._trials:
+            trial.unload_stimuli(keep_surface=keep_surface)
+        return int((Clock.monotonic_time() - start) * 1000)
+
 
 class Trial:
     """A class implementing an experimental trial."""
@@ -1844,6 +2192,7 @@ class Trial:
 
         self._stimuli = []
         self._factors = {}
+        self._type_key = None
         self._id = None
 
     @property
@@ -1880,6 +2229,7 @@ class Trial:
 
         if isinstance(value, (bytes, str, int, float)):
             self._factors[name] = value
+            self._type_key = None
         else:
             message = "Factor values or factor conditions must to be a " + \
                 "string or a numeric (i.e. float or integer).\n " + \
@@ -1929,14 +2279,20 @@ class Trial:
 
     @property
     def factor_dict(self):
-        """The dictionary with all factors of the trial."""
+        """The dictionary with all factors of the trial.
+
+        The dictionary is read-only; use `set_factor` and `clear_factors` to
+        change factors.
+
+        """
 
-        return self._factors
+        return MappingProxyType(self._factors)
 
     def clear_factors(self):
         """Clear all factors."""
 
-        self._factors = {}
+        self._factors.clear()
+        self._type_key = None
 
     @property
     def factor_names(self):
@@ -1968,7 +2324,21 @@ class Trial:
 
         """
 
-        return (self.factor_dict == trial.factor_dict)
+        return self._get_type_key() == trial._get_type_key()
+
+    def _get_type_key(self):
+        """Return a hashable key of the factors of the trial.
+
+        Trials with identical factors have identical keys. The key is cached
+        and reset by `set_factor` and `clear_factors`, which are the only
+        ways to change the factors (`factor_dict` is read-only). Code that
+        changes `_factors` directly has to reset `_type_key`.
+
+        """
+
+        if self._type_key is None:
+            self._type_key = frozenset(self._factors.items())
+        return self._type_key
 
     def add_stimulus(self, stimulus):
         """Add a stimulus to the trial.
@@ -2109,11 +2479,23 @@ class Trial:
         self._stimuli = []
         rtn = deepcopy(self)
         self._stimuli = rtn._stimuli = stimlist
+        rtn._type_key = self._type_key
         return rtn
 
-    def preload_stimuli(self):
+    def preload_stimuli(self, n_processes=None):
         """Preload all stimuli in trial.
 
+        Parameters
+        ----------
+        n_processes : int, optional
+            number of worker processes, in which the surfaces of visual
+            stimuli are created in parallel (default =
+            design.defaults.preload_processes). If 0, the number of CPUs
+            is used. OpenGL textures are always created in the main
+            process. The worker processes import the main script of the
+            experiment, which thus has to be protected by
+            ``if __name__ == "__main__":``.
+
         Returns
         -------
         time : int
@@ -2122,8 +2504,7 @@ class Trial:
         """
 
         start = Clock.monotonic_time()
-        for stim in self._stimuli:
-            stim.preload()
+        _preload_stimuli(self._stimuli, n_processes)
         return int((Clock.monotonic_time() - start) * 1000)
 
     def unload_stimuli(self, keep_surface=False):
@@ -2147,6 +2528,138 @@ class Trial:
         return int((Clock.monotonic_time() - start) * 1000)
 
 
+def _detect_encoding(filename, default):
+    """helper function
+    return the encoding declared in the first two lines of a file
+    """
+
+    with open(filename, 'r') as fl:
+        for _x in range(2):
+            encoding = re.findall(r"coding[:=]\s*([-\w.]+)", fl.readline())
+            if encoding != []:
+                return encoding[0]
+    return default
+
+
+def _read_csv_columns(filename, encoding=None):
+    """helper function
+    read the columns of a csv file with a header row (rows before the header
+    starting with "#" are ignored); return the column names and the columns
+    as lists of strings (None for missing cells)
+    """
+
+    if encoding is None:
+        encoding = _detect_encoding(filename, 'utf-8')
+    with open(filename, "r", encoding=encoding, errors="replace",
+              newline="") as f:
+        rows = [row for row in csv.reader(f) if len(row) > 0]
+    n_comments = 0
+    while n_comments < len(rows) and rows[n_comments][0].startswith("#"):
+        n_comments += 1
+    rows = rows[n_comments:]
+    if len(rows) == 0:
+        return [], []
+    return rows[0], _get_columns(rows[1:], len(rows[0]), strip=False)
+
+
+def _csv_line(values):
+    """helper function
+    return the values (as text) as a line of a csv table; values are
+    quoted if necessary
+    """
+
+    values = list(map(str, values))
+    for cnt, val in enumerate(values):
+        if _CSV_SPECIAL_CHARACTERS.search(val):
+            values[cnt] = '"{0}"'.format(val.replace('"', '""'))
+    return ",".join(values)
+
+
+def _get_columns(rows, n_columns, strip=True):
+    """helper function
+    return the columns of rows of strings as lists (None for missing cells)
+    """
+
+    rows = [row if len(row) == n_columns else
+            (row + [None] * n_columns)[:n_columns] for row in rows]
+    columns = [list(column) for column in zip(*rows)]
+    if len(columns) == 0:
+        columns = [[] for _x in range(n_columns)]
+    if strip:
+        for column in columns:
+            if None in column:
+                column[:] = [None if v is None else v.strip()
+                             for v in column]
+            else:
+                column[:] = map(str.strip, column)
+    return columns
+
+
+def _convert_column(values):
+    """helper function
+    convert the values of a column of strings to numbers, as far as
+    possible (values with a "." to float, all others to int); each
+    distinct value is converted only once
+    """
+
+    converted = {}
+    for val in set(values):
+        converted[val] = val
+        if val is not None:
+            try:
+                converted[val] = float(val) if val.find(".") >= 0 \
+                    else int(val)
+            except Exception:
+                pass
+    return list(map(converted.__getitem__, values))
+
+
+def _write_lines(f, lines):
+    """helper function
+    write lines of text to a binary file, without a final line break
+    """
+
+    for cnt, line in enumerate(lines):
+        if cnt > 0:
+            f.write(b"\n")
+        f.write(unicode_to_bytes(line))
+
+
+def _make_miniblocks(items, keys):
+    """Return the items ordered in miniblocks and the number of miniblocks.
+
+    Each miniblock contains one item of each type (i.e. key); the n-th
+    miniblock contains the n-th item of each type in the original order.
+
+    """
+
+    counts = {}
+    ranks = []
+    for key in keys:
+        rank = counts.get(key, 0)
+        counts[key] = rank + 1
+        ranks.append(rank)
+    order = sorted(range(len(items)), key=ranks.__getitem__)
+    return [items[i] for i in order], max(1, max(counts.values(), default=0))
+
+
+def _preload_stimuli(stimuli, n_processes):
+    """helper function
+    preload stimuli and create the surfaces of visual stimuli in
+    n_processes worker processes beforehand
+    """
+
+    if n_processes is None:
+        n_processes = defaults.preload_processes
+    if n_processes < 1:
+        n_processes = os.cpu_count() or 1
+    if n_processes > 1:
+        from ..stimuli._visual import _prepare_surfaces
+        _prepare_surfaces(stimuli, n_processes)
+    for stim in stimuli:
+        stim.preload()
+
+
 def _get_next_permutation(values, levels):
     """helper function
     count the array of values up,
@@ -0,0 +1,403 @@
+"""
+Columnar storage of trial factors.
+
+This module contains a class implementing a table of trial factors, in which
+each factor is held in a column (NumPy array), and a mapping class that
+provides the factors of a single row (i.e. trial) of the table.
+
+"""
+
+__author__ = 'Florian Krause <florian@expyriment.org>, \
+Oliver Lindemann <oliver@expyriment.org>'
+
+from collections.abc import MutableMapping
+
+import numpy as np
+
+_INT64_MIN = np.iinfo(np.int64).min
+_INT64_MAX = np.iinfo(np.int64).max
+
+
+def _dtype_of(value):
+    """Return the dtype of a column for a factor value."""
+
+    if type(value) is int and _INT64_MIN <= value <= _INT64_MAX:
+        return np.dtype(np.int64)
+    elif type(value) is float:
+        return np.dtype(np.float64)
+    else:
+        return np.dtype(object)
+
+
+class TrialTable:
+    """A class implementing a columnar table of trial factors.
+
+    Each factor is held in a column (NumPy array) with a mask of the rows,
+    for which the factor is defined. Columns of integer and float factors
+    have an integer or float dtype; all other columns (and columns with
+    values of mixed types) hold Python objects. Values are always returned
+    as Python objects, i.e. the factors of a row are identical to the
+    factors that have been set.
+
+    Rows are never reordered or removed; the order of trials is defined by
+    the block that uses the table.
+
+    """
+
+    def __init__(self):
+        """Create a trial table."""
+
+        self._n_rows = 0
+        self._capacity = 0
+        self._columns = {}  # name: values
+        self._defined = {}  # name: mask of rows, for which value is defined
+
+    def __len__(self):
+        return self._n_rows
+
+    @property
+    def names(self):
+        """Getter for names (of all columns)."""
+
+        return list(self._columns.keys())
+
+    def _reserve(self, n_rows):
+        """Grow the capacity of all columns to at least n_rows."""
+
+        if n_rows <= self._capacity:
+            return
+        capacity = max(n_rows, 2 * self._capacity, 16)
+        for name, column in self._columns.items():
+            new = np.empty(capacity, dtype=column.dtype)
+            new[:self._capacity] = column
+            self._columns[name] = new
+            defined = np.zeros(capacity, dtype=bool)
+            defined[:self._capacity] = self._defined[name]
+            self._defined[name] = defined
+        self._capacity = capacity
+
+    def add_rows(self, n_rows=1):
+        """Add empty rows.
+
+        Parameters
+        ----------
+        n_rows : int, optional
+            number of rows to add (default = 1)
+
+        Returns
+        -------
+        first : int
+            index of the first new row
+
+        """
+
+        first = self._n_rows
+        self._reserve(first + n_rows)
+        self._n_rows += n_rows
+        return first
+
+    def _get_column(self, name, value):
+        """Return the column of a factor, which can hold the value."""
+
+        column = self._columns.get(name)
+        if column is None:
+            column = np.empty(self._capacity, dtype=_dtype_of(value))
+            self._columns[name] = column
+            self._defined[name] = np.zeros(self._capacity, dtype=bool)
+        elif column.dtype != object and _dtype_of(value) != column.dtype:
+            column = column.astype(object)
+            self._columns[name] = column
+        return column
+
+    def set_value(self, rows, name, value):
+        """Set the value of a factor.
+
+        Parameters
+        ----------
+        rows : int, slice or numpy.ndarray
+            the row(s)
+        name : str
+            factor name
+        value : str or numeric
+            factor value
+
+        """
+
+        column = self._get_column(name, value)
+        column[rows] = value
+        self._defined[name][rows] = True
+
+    def set_column(self, name, values, first=0):
+        """Set the values of a factor for consecutive rows.
+
+        Parameters
+        ----------
+        name : str
+            factor name
+        values : list
+            factor values (None, if the factor is not defined for a row)
+        first : int, optional
+            the first row (default = 0)
+
+        """
+
+        values = list(values)
+        last = first + len(values)
+        defined = np.fromiter((v is not None for v in values), dtype=bool,
+                              count=len(values))
+        dtypes = set(_dtype_of(v) for v in values if v is not None)
+        if len(dtypes) == 0:
+            if name in self._defined:
+                self.unset_column(name, first, last)
+            return
+        elif len(dtypes) == 1:
+            dtype = dtypes.pop()
+        else:
+            dtype = np.dtype(object)
+        column = self._columns.get(name)
+        if column is None:
+            column = np.empty(self._capacity, dtype=dtype)
+            self._columns[name] = column
+            self._defined[name] = np.zeros(self._capacity, dtype=bool)
+        elif column.dtype != object and dtype != column.dtype:
+            column = column.astype(object)
+            self._columns[name] = column
+        if column.dtype != object and not defined.all():
+            values = [0 if v is None else v for v in values]
+        column[first:last] = values
+        self._defined[name][first:last] = defined
+
+    def unset_column(self, name, first, last):
+        """Remove the values of a factor from consecutive rows."""
+
+        self._defined[name][first:last] = False
+        if self._columns[name].dtype == object:
+            self._columns[name][first:last] = None
+
+    def get_value(self, row, name):
+        """Return the value of a factor.
+
+        Parameters
+        ----------
+        row : int
+            the row
+        name : str
+            factor name
+
+        Returns
+        -------
+        value : str or numeric
+
+        Raises
+        ------
+        KeyError
+            if the factor is not defined for the row
+
+        """
+
+        defined = self._defined.get(name)
+        if defined is None or not defined[row]:
+            raise KeyError(name)
+        value = self._columns[name][row]
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    def is_defined(self, row, name):
+        defined = self._defined.get(name)
+        return defined is not None and bool(defined[row])
+
+    def unset_value(self, row, name):
+        """Remove the value of a factor from a row."""
+
+        if not self.is_defined(row, name):
+            raise KeyError(name)
+        self._defined[name][row] = False
+        if self._columns[name].dtype == object:
+            self._columns[name][row] = None
+
+    def get_row_names(self, row):
+        """Return the names of all factors defined for a row."""
+
+        return [name for name, defined in self._defined.items()
+                if defined[row]]
+
+    def clear_row(self, row):
+        """Remove all factors of a row."""
+
+        for name in self.get_row_names(row):
+            self.unset_value(row, name)
+
+    def get_names(self, rows):
+        """Return the names of all factors defined for some rows.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            the rows
+
+        Returns
+        -------
+        names : list of str
+
+        """
+
+        return [name for name, defined in self._defined.items()
+                if defined[rows].any()]
+
+    def get_values(self, name, rows):
+        """Return the values of a factor for some rows.
+
+        Parameters
+        ----------
+        name : str
+            factor name
+        rows : numpy.ndarray
+            the rows
+
+        Returns
+        -------
+        values : list
+            values as Python objects (None, if the factor is not defined)
+
+        """
+
+        if name not in self._columns:
+            return [None] * len(rows)
+        values = self._columns[name][rows]
+        defined = self._defined[name][rows]
+        if not defined.all():
+            values = values.astype(object)
+            values[~defined] = None
+        return values.tolist()
+
+    def get_mask(self, name, rows, values):
+        """Return a mask of the rows, in which a factor has one of the values.
+
+        Parameters
+        ----------
+        name : str
+            factor name
+        rows : numpy.ndarray
+            the rows
+        values : list
+            the factor values
+
+        Returns
+        -------
+        mask : numpy.ndarray
+
+        """
+
+        if name not in self._columns:
+            return np.zeros(len(rows), dtype=bool)
+        column = self._columns[name][rows]
+        # compare as Python objects (e.g. np.int64(2) == 2 and True == 1)
+        values = [v.item() if isinstance(v, np.generic) else v
+                  for v in values]
+        if column.dtype == object:
+            values = set(values)
+            mask = np.fromiter((v in values for v in column), dtype=bool,
+                               count=len(column))
+        else:
+            values = [v for v in values if isinstance(v, (int, float))]
+            mask = np.isin(column, values)
+        return mask & self._defined[name][rows]
+
+    def get_type_codes(self, rows):
+        """Return integer codes of the combination of all factors of rows.
+
+        Rows with identical factors (as defined by the comparison of their
+        factor dictionaries) have identical codes.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            the rows
+
+        Returns
+        -------
+        codes : numpy.ndarray
+            codes in the range from 0 to the number of different
+            combinations minus 1
+
+        """
+
+        codes = np.zeros(len(rows), dtype=np.int64)
+        for name, column in self._columns.items():
+            defined = self._defined[name][rows]
+            if not defined.any():
+                continue
+            values = column[rows]
+            if values.dtype == object:
+                levels = {}
+                column_codes = np.fromiter(
+                    (levels.setdefault(v, len(levels)) for v in values),
+                    dtype=np.int64, count=len(values))
+            else:
+                _levels, column_codes = np.unique(values, return_inverse=True)
+                column_codes = column_codes.reshape(-1)
+            column_codes = np.where(defined, column_codes + 1, 0)
+            combined = codes * (column_codes.max() + 1) + column_codes
+            _levels, codes = np.unique(combined, return_inverse=True)
+            codes = codes.reshape(-1)
+        return codes
+
+    def copy(self):
+        """Return a copy of the table."""
+
+        rtn = TrialTable()
+        rtn._n_rows = self._n_rows
+        rtn._capacity = self._n_rows
+        for name, column in self._columns.items():
+            rtn._columns[name] = column[:self._n_rows].copy()
+            rtn._defined[name] = self._defined[name][:self._n_rows].copy()
+        return rtn
+
+
+class TrialFactors(MutableMapping):
+    """The factors of a single row of a trial table.
+
+    This mapping is used as factor dictionary of the trials of a block with
+    a trial table. A copy (or deep copy) of the mapping is a dictionary.
+
+    """
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, name):
+        return self._table.get_value(self._row, name)
+
+    def __setitem__(self, name, value):
+        self._table.set_value(self._row, name, value)
+
+    def __delitem__(self, name):
+        self._table.unset_value(self._row, name)
+
+    def __iter__(self):
+        return iter(self._table.get_row_names(self._row))
+
+    def __len__(self):
+        return len(self._table.get_row_names(self._row))
+
+    def __contains__(self, name):
+        return self._table.is_defined(self._row, name)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return dict(self)
+
+    def copy(self):
+        return dict(self)
+
+    def clear(self):
+        self._table.clear_row(self._row)
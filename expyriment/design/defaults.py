@@ -23,10 +23,20 @@ experiment_foreground_colour = (150, 150, 150)
 experiment_text_font = "FreeSans"
 experiment_text_size = 20
 experiment_filename_suffix = None
+preload_processes = 1  # number of worker processes to create the surfaces
+#                        of stimuli when preloading (0 = number of CPUs)
+
+# Prefetcher
+prefetch_trials = 5
+prefetch_max_bytes = None  # None = no memory budget
+prefetch_in_response_loops = False  # also prefetch while waiting for input
+prefetch_preload_time = 0.1  # assumed duration of a preload in s, until the
+#                              first preload has been measured
 
 # Block
 block_name = 'unnamed'
-max_shuffle_time = 5000
+block_columnar = False  # hold trial factors in a columnar table
+max_shuffle_time = 5000  # ms, time limit for constrained shuffling
 
 # trial_list
 trial_list_directory = 'trials'
@@ -10,6 +10,7 @@ __author__ = 'Florian Krause <florian@expyriment.org>,\
 
 from ._randomise import (
                          coin_flip,
+                         constrained_order,
                          make_multiplied_shuffled_list,
                          rand_element,
                          rand_int,
@@ -11,6 +11,11 @@ __author__ = 'Florian Krause <florian@expyriment.org>,\
 import random as _random
 from copy import copy as _copy
 
+import numpy as _np
+
+from ...misc._timer import get_time
+from .. import defaults
+
 _random.seed()
 
 
@@ -124,20 +129,322 @@ def rand_norm(a, b, mu=None, sigma=None):
     return r
 
 
-def _compare_items(a, b):
-    """Helper function for `shuffle_list` to compare two elements of a list"""
+def _get_rng(rng):
+    """Helper function to return the random number generator to use (the
+    global random state of this module, if rng is None)"""
+    if rng is None or rng is _random:
+        return _random
+    return _np.random.default_rng(rng)
+
+
+def _get_type_codes(list_):
+    """Helper function for `shuffle_list` to return integer codes of the
+    elements of a list (identical elements have identical codes)"""
     from .._structure import (  # needs to be imported here because of circular dependency
         Block,
         Trial,
     )
-    if (isinstance(a, Trial) and isinstance(b, Trial)) or\
-       (isinstance(a, Block) and isinstance(b, Block)):
-        return a.compare(b)
-    else:
-        return a == b
+    codes = []
+    keys = {}
+    unhashable = []  # (element, code)
+    for item in list_:
+        if isinstance(item, (Trial, Block)):
+            # trials and blocks are identical, if their factors are identical
+            # (see `compare` method)
+            key = (isinstance(item, Trial), item._get_type_key())
+        else:
+            key = item
+        try:
+            code = keys.get(key)
+        except TypeError:  # unhashable element
+            code = next((c for other, c in unhashable if other == item), None)
+            if code is None:
+                code = len(keys) + len(unhashable)
+                unhashable.append((item, code))
+        else:
+            if code is None:
+                code = len(keys) + len(unhashable)
+                keys[key] = code
+        codes.append(code)
+    return codes
+
+
+def _get_segments(n_items, n_segments):
+    """Helper function to return start and end of the segments of a list"""
+    if n_segments is None or n_segments < 2:
+        return [(0, n_items)]
+    l = 1 + (n_items - 1) // int(n_segments)
+    return [(l * x, min((x + 1) * l, n_items)) for x in range(n_segments)
+            if l * x < n_items]
+
+
+class _SequenceBuilder:
+    """Helper class for `constrained_order` that builds a sequence of type
+    codes item by item and backtracks, if the constraints cannot be fulfilled
+    anymore"""
+
+    def __init__(self, n_types, max_run, min_distance, balance_transitions,
+                 rng):
+        self._max_run = max_run
+        self._min_distance = min_distance
+        self._balance = balance_transitions
+        self._rng = rng
+        self.sequence = []
+        self._runs = []  # length of the run at each position
+        self._last = [None] * n_types  # last position of each type
+        self._previous_last = []
+        self._transitions = {}  # type: {next type: count}
+
+    def _start_segment(self, counts):
+        """Set the numbers of items per type that will be added next"""
+        self._counts = list(counts)
+        self._remaining = sum(self._counts)
+        self._max_count = max(self._counts)
+        self._n_with_count = [0] * (self._max_count + 1)
+        self._pool = []  # remaining items (types) in arbitrary order
+        self._positions = []  # type: positions in pool
+        for t, c in enumerate(self._counts):
+            self._n_with_count[c] += 1
+            self._positions.append(set(range(len(self._pool),
+                                             len(self._pool) + c)))
+            self._pool.extend([t] * c)
+
+    def _allowed(self, t):
+        """Return if an item of type t can be appended to the sequence"""
+        p = len(self.sequence)
+        if self._max_run is not None and p > 0 and \
+                self.sequence[-1] == t and self._runs[-1] >= self._max_run:
+            return False
+        if self._min_distance is not None and self._last[t] is not None and \
+                p - self._last[t] < self._min_distance:
+            return False
+        return True
+
+    def _feasible(self, t=None):
+        """Return if the remaining items can (still) fulfill the constraints
+        after appending an item of type t (necessary conditions only)"""
+        remaining = self._remaining
+        c_max = self._max_count
+        if c_max == 0:
+            return True
+        if self._max_run is not None:
+            r = self._max_run
+            if c_max > r * (remaining - c_max + 1):
+                return False
+            if t is not None:
+                c = self._counts[t]
+                if c > (r - self._runs[-1]) + r * (remaining - c):
+                    return False
+        if self._min_distance is not None:
+            d = self._min_distance
+            if (c_max - 1) * d + self._n_with_count[c_max] > remaining:
+                return False
+            if t is not None and self._counts[t] * d > remaining:
+                return False
+        return True
+
+    def _push(self, t):
+        """Append an item of type t"""
+        seq = self.sequence
+        p = len(seq)
+        if p > 0 and seq[-1] == t:
+            self._runs.append(self._runs[-1] + 1)
+        else:
+            self._runs.append(1)
+        if self._balance and p > 0:
+            transitions = self._transitions.setdefault(seq[-1], {})
+            transitions[t] = transitions.get(t, 0) + 1
+        seq.append(t)
+        self._previous_last.append(self._last[t])
+        self._last[t] = p
+        # counts
+        c = self._counts[t]
+        self._counts[t] = c - 1
+        self._n_with_count[c] -= 1
+        self._n_with_count[c - 1] += 1
+        if c == self._max_count and self._n_with_count[c] == 0:
+            self._max_count -= 1
+        self._remaining -= 1
+        # pool
+        i = self._positions[t].pop()
+        j = len(self._pool) - 1
+        if i != j:
+            u = self._pool[j]
+            self._pool[i] = u
+            self._positions[u].discard(j)
+            self._positions[u].add(i)
+        self._pool.pop()
+
+    def _pop(self):
+        """Remove the last item"""
+        seq = self.sequence
+        t = seq.pop()
+        self._runs.pop()
+        self._last[t] = self._previous_last.pop()
+        if self._balance and len(seq) > 0:
+            self._transitions[seq[-1]][t] -= 1
+        c = self._counts[t]
+        self._counts[t] = c + 1
+        self._n_with_count[c] -= 1
+        self._n_with_count[c + 1] += 1
+        if c + 1 > self._max_count:
+            self._max_count = c + 1
+        self._remaining += 1
+        self._positions[t].add(len(self._pool))
+        self._pool.append(t)
+
+    def _candidates(self):
+        """Generate the types of the next item in order of preference"""
+        rng = self._rng
+        if self._balance and len(self.sequence) > 0:
+            transitions = self._transitions.get(self.sequence[-1], {})
+        else:
+            transitions = {}
+        # draw a few random items from the pool first, which is cheap and
+        # chooses types in proportion to their remaining number
+        tried = set()
+        for _ in range(min(len(self._pool), 4)):
+            t = self._pool[int(rng.random() * len(self._pool))]
+            if t not in tried and transitions.get(t, 0) == 0:
+                tried.add(t)
+                yield t
+        # weighted random order of all remaining types (with least frequent
+        # transitions first)
+        keys = {t: rng.random() ** (1.0 / c)
+                for t, c in enumerate(self._counts)
+                if c > 0 and t not in tried}
+        for t in sorted(keys, key=lambda t: (transitions.get(t, 0),
+                                             -keys[t])):
+            yield t
+
+    def extend(self, counts, max_backtracks):
+        """Append a segment with the given numbers of items per type.
+
+        Returns False (and leaves the sequence unchanged), if no solution has
+        been found with at most max_backtracks backtracking steps.
+
+        """
+
+        self._start_segment(counts)
+        if not self._feasible():
+            return False
+        start = len(self.sequence)
+        end = start + self._remaining
+        stack = [self._candidates()]
+        backtracks = 0
+        while len(self.sequence) < end:
+            for t in stack[-1]:
+                if self._allowed(t):
+                    self._push(t)
+                    if self._feasible(t):
+                        break
+                    self._pop()
+            else:
+                # no candidate left for this position
+                stack.pop()
+                backtracks += 1
+                if len(stack) == 0 or backtracks > max_backtracks:
+                    while len(self.sequence) > start:
+                        self._pop()
+                    return False
+                self._pop()
+                continue
+            stack.append(self._candidates())
+        return True
+
+
+def constrained_order(codes, max_repetitions=-1, min_distance=None,
+                      balance_transitions=False, n_segments=0, rng=None):
+    """Return a randomised order of items that fulfills constraints on
+    the sequence of item types.
 
+    Parameters
+    ----------
+    codes : list of int
+        type codes of the items (items with identical codes are of the same
+        type)
+    max_repetitions : int, optional
+        maximum number of allowed immediate repetitions of one item type;
+        -1 = no constraint (default = -1)
+    min_distance : int, optional
+        minimum distance between two items of the same type, e.g., 2 = at
+        least one item of another type in between; default = None
+    balance_transitions : bool, optional
+        balance the first-order transitions between item types, i.e., prefer
+        the transitions that occurred least often so far (default = False)
+    n_segments : int, optional
+        see documentation of `shuffle_list` (default = 0)
+    rng : numpy.random.Generator or int, optional
+        random number generator or seed (default = None, i.e., the random
+        state of this module, see `random.seed`)
 
-def shuffle_list(list_, max_repetitions=-1, n_segments=0):
+    Returns
+    -------
+    order : list of int or None
+        indices of the items in randomised order; None, if no order could be
+        found that fulfills the constraints within
+        `design.defaults.max_shuffle_time` ms
+
+    Notes
+    -----
+    The order is built item by item: the type of each next item is chosen
+    randomly (in proportion to the number of remaining items of each type)
+    among the types that keep the constraints satisfiable; if no type is
+    left, the last choices are revised (backtracking). Items of the same
+    type are assigned in random order.
+
+    """
+
+    rng = _get_rng(rng)
+    if max_repetitions is None or max_repetitions < 0:
+        max_run = None
+    else:
+        max_run = max_repetitions + 1
+    if min_distance is not None and min_distance < 2:
+        min_distance = None
+
+    types = {}
+    codes = [types.setdefault(c, len(types)) for c in codes]
+    segments = _get_segments(len(codes), n_segments)
+    segment_counts = []
+    for a, b in segments:
+        counts = [0] * len(types)
+        for t in codes[a:b]:
+            counts[t] += 1
+        segment_counts.append(counts)
+        builder = _SequenceBuilder(len(types), max_run, min_distance,
+                                   False, rng)
+        builder._start_segment(counts)
+        if not builder._feasible():
+            return None
+
+    deadline = get_time() + defaults.max_shuffle_time / 1000.0
+    max_backtracks = 2 * len(codes) + 100
+    while True:
+        builder = _SequenceBuilder(len(types), max_run, min_distance,
+                                   balance_transitions, rng)
+        for counts in segment_counts:
+            if not builder.extend(counts, max_backtracks):
+                break
+        else:
+            break
+        if get_time() > deadline:
+            return None
+
+    order = []
+    for a, b in segments:
+        items = {}  # type: indices
+        for i in range(a, b):
+            items.setdefault(codes[i], []).append(i)
+        for indices in items.values():
+            rng.shuffle(indices)
+        for t in builder.sequence[a:b]:
+            order.append(items[t].pop())
+    return order
+
+
+def shuffle_list(list_, max_repetitions=-1, n_segments=0, min_distance=None,
+                 balance_transitions=False, rng=None):
     """Shuffle any list of objects. In place randomisation of the list.
 
     Parameters
@@ -146,20 +453,28 @@ def shuffle_list(list_, max_repetitions=-1, n_segments=0):
         the list to shuffle; if not a list, TypeError is raised
     max_repetitions : int, optional
         maximum number of allowed repetitions of one identical items; if no
-        solution can be found (i.e., Python's recursion limit is reached), the
-        function returns `False` and the list will be randomised without
-        constrains (see Notes); default = -1
+        solution can be found (see `constrained_order`), the function
+        returns `False` and the list will be randomised without constrains
+        (see Notes); default = -1
     n_segments : int, optional
         randomise list per segment, i.e., list will be divided into n equal
         sized segments and the order of elements within each segment will be
         randomised; if n_segments is < 2, this parameter has no effect;
         default = 0
+    min_distance : int, optional
+        minimum distance between two identical items, e.g., 2 = at least one
+        other item in between; default = None
+    balance_transitions : bool, optional
+        balance the transitions between different items (default = False)
+    rng : numpy.random.Generator or int, optional
+        random number generator or seed (default = None, i.e., the random
+        state of this module, see `random.seed`)
 
     Returns
     -------
     success : bool
         returns if randomisation was successful and fulfilled the specified
-        constrains (see max_repetitions)
+        constrains (see max_repetitions, min_distance)
 
     Notes
     -----
@@ -167,6 +482,10 @@ def shuffle_list(list_, max_repetitions=-1, n_segments=0):
     ignored to determine repetitions, because trial or block comparisons are
     based on the `compare`method (see documentation of `Trial` or `Block`).
 
+    See Also
+    --------
+    constrained_order
+
     """
 
     if not isinstance(list_, list):
@@ -176,34 +495,25 @@ def shuffle_list(list_, max_repetitions=-1, n_segments=0):
         n_segments = 0
     if max_repetitions is None:
         max_repetitions = -1
-
-    if n_segments > 1:
-        l = 1 + (len(list_) - 1) // int(n_segments)
-        for x in range(n_segments):
-            t = (x + 1) * l
-            if t > len(list_):
-                t = len(list_)
-            a = list_[l * x:t]
-            _random.shuffle(a)
-            list_[l * x:t] = a
-    else:
-        _random.shuffle(list_)
-
-    if max_repetitions >= 0:
-        # check constrains and remix
-        reps = 0
-        for i in range(len(list_)-1):
-            if _compare_items(list_[i], list_[i+1]):
-                reps += 1
-                if reps > max_repetitions:
-                    try:
-                        return shuffle_list(list_=list_,
-                                max_repetitions=max_repetitions,
-                                n_segments=n_segments)
-                    except Exception:  # maximum recursion depth reached
-                        return False
-            else:
-                reps = 0
+    rng = _get_rng(rng)
+
+    if max_repetitions >= 0 or (min_distance is not None and
+                                min_distance > 1) or balance_transitions:
+        order = constrained_order(_get_type_codes(list_),
+                                  max_repetitions=max_repetitions,
+                                  min_distance=min_distance,
+                                  balance_transitions=balance_transitions,
+                                  n_segments=n_segments, rng=rng)
+        if order is not None:
+            list_[:] = [list_[i] for i in order]
+            return True
+        shuffle_list(list_, n_segments=n_segments, rng=rng)
+        return False
+
+    for a, b in _get_segments(len(list_), n_segments):
+        segment = list_[a:b]
+        rng.shuffle(segment)
+        list_[a:b] = segment
     return True
 
 
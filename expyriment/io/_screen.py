@@ -245,6 +245,80 @@ machine!")
         if self._logging:
             _internals.active_exp._event_file_log("Screen,updated", 2)
 
+    def present_stimuli(self, stimuli, clear=True, update=True,
+                        log_event_tag=None):
+        """Present several visual stimuli on the screen in one pass.
+
+        This is a faster alternative to calling ``present(clear=False,
+        update=False)`` on each stimulus. In OpenGL mode, all stimuli are
+        drawn with a single set up of the OpenGL state, and identical
+        textures (see ``stimuli.defaults.visual_texture_cache``) are only
+        bound once. Stimuli are drawn in the given order (i.e. later stimuli
+        are drawn on top of earlier ones).
+
+        Parameters
+        ----------
+        stimuli : list
+            the visual stimuli to present
+        clear : bool, optional
+            if True the screen will be cleared automatically
+            (default = True)
+        update : bool, optional
+            if False the screen will be not be updated automatically
+            (default = True)
+        log_event_tag : numeral or string, optional
+            if log_event_tag is defined and if logging is switched on,
+            a summary of the inter-event-intervalls are appended at the end
+            of the event file
+
+        Returns
+        -------
+        time : int
+            the time it took to execute this method
+
+        Notes
+        -----
+        Stimuli that are not preloaded will be preloaded (and unloaded again
+        afterwards), which can take some time. Always preload your stimuli
+        when a timing accurate presentation is needed!
+
+        """
+
+        from ..misc._timer import get_time
+        from ..stimuli._visual import _LaminaPanelSurface
+
+        start = get_time()
+        stimuli = list(stimuli)
+        preloaded = []
+        for stim in stimuli:
+            if _internals.active_exp.prefetcher is not None:
+                _internals.active_exp.prefetcher.stimulus_presented(stim)
+            if not stim.is_preloaded:
+                preloaded.append((stim, stim.has_surface))
+                stim.preload(inhibit_ogl_compress=True)
+
+        if clear:
+            self.clear()
+        if self._opengl:
+            _LaminaPanelSurface.display_batch(
+                [stim._ogl_screen for stim in stimuli])
+        else:
+            screen_size = self._surface.get_size()
+            self._surface.blits(
+                [(stim._get_surface(), stim._screen_rect(screen_size))
+                 for stim in stimuli], doreturn=False)
+        if update:
+            self.update()
+        if self._logging:
+            _internals.active_exp._event_file_log(
+                "Screen,stimuli presented,{0}".format(
+                    ";".join(str(stim.id) for stim in stimuli)),
+                1, log_event_tag=log_event_tag)
+
+        for stim, keep_surface in preloaded:
+            stim.unload(keep_surface=keep_surface)
+        return int((get_time() - start) * 1000)
+
     def update_stimuli(self, stimuli):
         """Update only some stimuli on the screen.
 
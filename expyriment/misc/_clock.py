@@ -122,14 +122,16 @@ class Clock :
         start = get_time()
         if low_performance or isinstance(callback_function, FunctionType) or \
            (process_control_events or \
-             _internals.active_exp.is_callback_registered):
+             _internals.active_exp.is_callback_registered or \
+             _internals.active_exp.prefetcher is not None):
             while (get_time() < start + waiting_time / 1000):
                 if isinstance(callback_function, FunctionType):
                     rtn_callback = callback_function()
                     if isinstance(rtn_callback, _internals.CallbackQuitEvent):
                         return rtn_callback
                 if _internals.active_exp.is_initialised:
-                    rtn_callback = _internals.active_exp._execute_wait_callback()
+                    rtn_callback = _internals.active_exp._execute_wait_callback(
+                        start + waiting_time / 1000 - get_time())
                     if isinstance(rtn_callback, _internals.CallbackQuitEvent):
                         return rtn_callback
                     if process_control_events:
@@ -15,6 +15,7 @@ from ._basic_shapes import (vertices_cross, vertices_frame,
                             vertices_triangle)
 from ._geometry import (XYPoint, cartesian_to_polar, coordinates_to_position,
                         lines_intersect, lines_intersection_point,
-                        points_to_vertices, polar_to_cartesian,
-                        position_to_coordinates, position_to_visual_angle,
-                        tuples_to_points, visual_angle_to_position)
+                        points_inside_polygon, points_to_vertices,
+                        polar_to_cartesian, position_to_coordinates,
+                        position_to_visual_angle, tuples_to_points,
+                        visual_angle_to_position)
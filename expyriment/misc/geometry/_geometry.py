@@ -10,6 +10,8 @@ Oliver Lindemann <oliver@expyriment.org>'
 
 import math as _math
 
+import numpy as _np
+
 from ... import _internals
 
 
@@ -19,8 +21,9 @@ def coordinates_to_position(coordinates, surface_size=None):
 
     Parameters
     ----------
-    coordinates : (int, int)
-        coordinates (x,y) to convert
+    coordinates : (int, int) or numpy.ndarray
+        coordinates (x,y) to convert or array of shape (..., 2) with
+        several coordinates
     surface_size: (int, int), optional
         size of the surface one which position is defined
         if None (default), the position will be calculated relative
@@ -28,13 +31,22 @@ def coordinates_to_position(coordinates, surface_size=None):
 
     Returns
     -------
-    position : [int, int]
+    position : [int, int] or numpy.ndarray
+        position or, if coordinates is an array, array of positions
 
     """
 
     if surface_size is None:
         surface_size = _internals.active_exp.screen.surface.get_size()
 
+    if isinstance(coordinates, _np.ndarray):
+        rtn = _np.stack((coordinates[..., 0] - surface_size[0] // 2,
+                         - coordinates[..., 1] + surface_size[1] // 2),
+                        axis=-1)
+        rtn += (int(surface_size[0] % 2 == 0),
+                -int(surface_size[1] % 2 == 0))
+        return rtn
+
     rtn = [coordinates[0] - surface_size[0] // 2,
             - coordinates[1] + surface_size[1] // 2]
     if (surface_size[0] % 2) == 0: #even
@@ -50,8 +62,9 @@ def position_to_coordinates(position, surface_size=None):
 
     Parameters
     ----------
-    position : (int, int)
-        position (x,y) to convert
+    position : (int, int) or numpy.ndarray
+        position (x,y) to convert or array of shape (..., 2) with several
+        positions
     surface_size: (int, int), optional
         size of the surface one which coordinates should be calculated
         if None (default), the coordinates will be calculated relative
@@ -59,13 +72,22 @@ def position_to_coordinates(position, surface_size=None):
 
     Returns
     -------
-    coordinates : [int, int]
+    coordinates : [int, int] or numpy.ndarray
+        coordinates or, if position is an array, array of coordinates
 
     """
 
     if surface_size is None:
         surface_size = _internals.active_exp.screen.surface.get_size()
 
+    if isinstance(position, _np.ndarray):
+        rtn = _np.stack((position[..., 0] + surface_size[0] // 2,
+                         - position[..., 1] + surface_size[1] // 2),
+                        axis=-1)
+        rtn -= (int(surface_size[0] % 2 == 0),
+                int(surface_size[1] % 2 == 0))
+        return rtn
+
     rtn = [position[0] + surface_size[0] // 2,
             - position[1] + surface_size[1] // 2]
     if (surface_size[0] % 2) == 0: #even
@@ -79,8 +101,9 @@ def position_to_visual_angle(position, viewing_distance, monitor_size):
 
     Parameters
     ----------
-    position : (int, int)
-        position (x,y) to convert
+    position : (int, int) or numpy.ndarray
+        position (x,y) to convert or array of shape (..., 2) with several
+        positions
     viewing_distance : numeric
         viewing distance in cm
     monitor_size : numeric
@@ -88,12 +111,17 @@ def position_to_visual_angle(position, viewing_distance, monitor_size):
 
     Returns
     -------
-    angle : (float, float)
-        visual angle for x & y dimension
+    angle : (float, float) or numpy.ndarray
+        visual angle for x & y dimension or, if position is an array, array
+        of visual angles
 
     """
 
     screen_size = _internals.active_exp.screen.surface.get_size()
+    if isinstance(position, _np.ndarray):
+        cm = position * (_np.asarray(monitor_size, dtype=float) /
+                         _np.asarray(screen_size, dtype=float))
+        return _np.degrees(2.0 * _np.arctan((cm / 2) / viewing_distance))
     cm = (position[0] * monitor_size[0] / float(screen_size[0]),
           position[1] * monitor_size[1] / float(screen_size[1]))
 
@@ -107,8 +135,9 @@ def visual_angle_to_position(visual_angle, viewing_distance, monitor_size):
 
     Parameters
     ----------
-    visual_angle : (numeric, numeric)
-        position in visual angle (x,y) to convert
+    visual_angle : (numeric, numeric) or numpy.ndarray
+        position in visual angle (x,y) to convert or array of shape
+        (..., 2) with several positions in visual angle
     viewing_distance : numeric
         viewing distance in cm
     monitor_size : (numeric, numeric)
@@ -116,12 +145,16 @@ def visual_angle_to_position(visual_angle, viewing_distance, monitor_size):
 
     Returns
     -------
-    position : (float, float)
-        position (x,y)
+    position : (float, float) or numpy.ndarray
+        position (x,y) or, if visual_angle is an array, array of positions
 
     """
 
     screen_size = _internals.active_exp.screen.surface.get_size()
+    if isinstance(visual_angle, _np.ndarray):
+        cm = _np.tan(visual_angle * _math.pi / 360) * viewing_distance * 2
+        return cm * (_np.asarray(screen_size, dtype=float) /
+                     _np.asarray(monitor_size, dtype=float))
     angle = (visual_angle[0] * _math.pi / 360,
              visual_angle[1] * _math.pi / 360) # angle / 180 / 2
     cm = (_math.tan(angle[0]) * viewing_distance * 2,
@@ -158,27 +191,86 @@ def lines_intersect(pa, pb, pc, pd):
 
     Parameters
     ----------
-    pa : misc.geometry.XYPoint
+    pa : misc.geometry.XYPoint or numpy.ndarray
         point 1 of line 1
-    pb : misc.geometry.XYPoint
+    pb : misc.geometry.XYPoint or numpy.ndarray
         point 2 of line 1
-    pc : misc.geometry.XYPoint
+    pc : misc.geometry.XYPoint or numpy.ndarray
         point 1 of line 2
-    pb : misc.geometry.XYPoint
+    pb : misc.geometry.XYPoint or numpy.ndarray
         point 2 of line 2
 
     Returns
     -------
-    check : bool
+    check : bool or numpy.ndarray
         True if lines intersect
 
+    Notes
+    -----
+    If the points are given as arrays of shape (..., 2), many pairs of line
+    segments are tested at once (with broadcasting) and a boolean array is
+    returned.
+
     """
 
+    if any(isinstance(p, _np.ndarray) for p in (pa, pb, pc, pd)):
+        pa, pb, pc, pd = (_np.asarray(p.tuple if isinstance(p, XYPoint)
+                                      else p) for p in (pa, pb, pc, pd))
+
+        def ccw(pa, pb, pc):
+            return (pc[..., 1] - pa[..., 1]) * (pb[..., 0] - pa[..., 0]) > \
+                   (pb[..., 1] - pa[..., 1]) * (pc[..., 0] - pa[..., 0])
+
+        return (ccw(pa, pc, pd) != ccw(pb, pc, pd)) & \
+               (ccw(pa, pb, pc) != ccw(pa, pb, pd))
+
     def ccw(pa, pb, pc):
         return (pc._y - pa._y) * (pb._x - pa._x) > (pb._y - pa._y) * (pc._x - pa._x)
 
     return ccw(pa, pc, pd) != ccw(pb, pc, pd) and ccw(pa, pb, pc) != ccw(pa, pb, pd)
 
+
+def points_inside_polygon(points, polygon):
+    """Return for several points if they are inside a given polygon.
+
+    This is the vectorised version of ``XYPoint.is_inside_polygon``.
+
+    Parameters
+    ----------
+    points : numpy.ndarray
+        array of shape (..., 2) with the points (x, y)
+    polygon : list or numpy.ndarray
+        polygon as list of points (XYPoints or tuples (x, y)) or as array
+        of shape (n, 2)
+
+    Returns
+    -------
+    check : numpy.ndarray
+        boolean array (of shape points.shape[:-1])
+
+    """
+
+    if not isinstance(polygon, _np.ndarray):
+        polygon = _np.array([p.tuple if isinstance(p, XYPoint) else p
+                             for p in polygon])
+    points = _np.asarray(points)
+    x = points[..., 0]
+    y = points[..., 1]
+    inside = _np.zeros(x.shape, dtype=bool)
+    n = len(polygon)
+    for i in range(n):
+        x1, y1 = polygon[i - 1]
+        x2, y2 = polygon[i]
+        if y1 == y2:
+            continue  # horizontal edges are never crossed
+        crossing = (y > min(y1, y2)) & (y <= max(y1, y2)) & \
+                   (x <= max(x1, x2))
+        if x1 != x2:
+            xinters = (y - y1) * (x2 - x1) // (y2 - y1) + x1
+            crossing &= x <= xinters
+        inside ^= crossing
+    return inside
+
 def lines_intersection_point(pa, pb, pc, pd):
     """Returns the intersection point of two lines (a-b) and (c-d)
 
@@ -224,18 +316,26 @@ def cartesian_to_polar(xy, radians=False):
 
     Parameters
     ----------
-    xy : (float, float)
-        cartesian coordinate (x,y)
+    xy : (float, float) or numpy.ndarray
+        cartesian coordinate (x,y) or array of shape (..., 2) with several
+        cartesian coordinates
     radians : boolean
         use radians instead of degrees for the angle
 
     Returns
     ----------
-    polar : (float, float)
-        polar coordinate (radial, angle[degrees])
+    polar : (float, float) or numpy.ndarray
+        polar coordinate (radial, angle[degrees]) or, if xy is an array,
+        array of polar coordinates
 
     """
 
+    if isinstance(xy, _np.ndarray):
+        ang = _np.arctan2(xy[..., 1], xy[..., 0])
+        if not radians:
+            ang = _np.degrees(ang)
+        return _np.stack((_np.hypot(xy[..., 0], xy[..., 1]), ang), axis=-1)
+
     ang = _math.atan2(xy[1], xy[0])
     radial =_math.hypot(xy[0], xy[1])
     if radians:
@@ -250,18 +350,27 @@ def polar_to_cartesian(polar, radians=False):
 
     Parameters
     ----------
-    polar : (float, float)
-        polar coordinate (radial, angle[degrees])
+    polar : (float, float) or numpy.ndarray
+        polar coordinate (radial, angle[degrees]) or array of shape (..., 2)
+        with several polar coordinates
     radians : boolean
         use radians instead of degrees for the angle
 
     Returns
     ----------
-    xy : (float, float)
-        cartesian coordinate (x,y)
+    xy : (float, float) or numpy.ndarray
+        cartesian coordinate (x,y) or, if polar is an array, array of
+        cartesian coordinates
 
     """
 
+    if isinstance(polar, _np.ndarray):
+        a = polar[..., 1]
+        if not radians:
+            a = _np.radians(a)
+        return _np.stack((polar[..., 0] * _np.cos(a),
+                          polar[..., 0] * _np.sin(a)), axis=-1)
+
     if radians:
         a = polar[1]
     else:
@@ -411,6 +520,10 @@ class XYPoint:
         -------
         check : bool
 
+        See Also
+        --------
+        misc.geometry.points_inside_polygon
+
 """
 
         n = len(point_list)
@@ -9,6 +9,8 @@ __author__ = 'Florian Krause <florian@expyriment.org>, \
 Oliver Lindemann <oliver@expyriment.org>'
 
 import os
+import wave
+import weakref
 from types import FunctionType
 
 import pygame
@@ -17,12 +19,41 @@ from .. import _internals
 from .._internals import CallbackQuitEvent, low_performance_sleep
 from ..misc import MediaTime
 from ..misc._timer import get_time
+from . import defaults
 from ._stimulus import Stimulus
 
+_sounds = weakref.WeakValueDictionary()  # sound key: decoded sound
+_stream_owner = None  # audio stimulus currently streamed by mixer.music
+
+
+def _get_wave_length(filename):
+    """Return the length of a WAV file in seconds (or None)."""
+
+    try:
+        w = wave.open(filename, 'rb')
+    except (wave.Error, EOFError):
+        return None
+    try:
+        return w.getnframes() / float(w.getframerate())
+    finally:
+        w.close()
+
 
 class Audio(Stimulus):
     """A class implementing a general auditory stimulus.
 
+    Decoded sounds are shared between all audio stimuli (and their copies)
+    of the same file, as long as at least one of them is preloaded.
+
+    In streaming mode, the audio file is not decoded into memory, but
+    streamed from disk in chunks while playing (via pygame.mixer.music).
+    Memory use and start-up latency are independent of the length of the
+    file, which makes this mode suitable for long recordings. Only one
+    audio stimulus can be streamed at a time; playing a streamed stimulus
+    stops the one that is currently streamed. The ``maxtime`` argument of
+    ``play()`` is not supported in streaming mode and the length of the
+    audio is only known for WAV files.
+
     See Also
     --------
     expyriment.control.start_audiosystem
@@ -32,19 +63,26 @@ class Audio(Stimulus):
 
     """
 
-    def __init__(self, filename):
+    def __init__(self, filename, streaming=None):
         """Create an audio stimulus.
 
         Parameters
         ----------
         filename : str
             filename (incl. path) of the audio file
+        streaming : bool, optional
+            stream the audio file from disk instead of decoding it into
+            memory (default = stimuli.defaults.audio_streaming)
 
         """
 
         Stimulus.__init__(self, filename)
         self._filename = filename
+        if streaming is None:
+            streaming = defaults.audio_streaming
+        self._streaming = streaming
         self._file = None
+        self._sound = None
         self._is_preloaded = False
         self._channel = None
         self._is_paused = False
@@ -66,9 +104,27 @@ class Audio(Stimulus):
     @property
     def is_playing(self):
         """Property to check if audio is playing."""
+        if self._is_preloaded and self._streaming and not self._is_paused:
+            return _stream_owner is self and pygame.mixer.music.get_busy()
         if self._is_preloaded and self._channel and not self._is_paused:
             return self._channel.get_busy()
 
+    @property
+    def streaming(self):
+        """Getter for streaming."""
+
+        return self._streaming
+
+    @streaming.setter
+    def streaming(self, value):
+        """Setter for streaming."""
+
+        if self._is_preloaded:
+            raise AttributeError(Audio._getter_exception_message.format(
+                "streaming"))
+        else:
+            self._streaming = value
+
     @property
     def filename(self):
         """Getter for filename."""
@@ -89,7 +145,7 @@ class Audio(Stimulus):
     def length(self):
         """Property to get the length of the audio."""
 
-        if self._is_preloaded:
+        if self._is_preloaded and self._length is not None:
             return MediaTime(self._length)
 
     @property
@@ -104,6 +160,13 @@ class Audio(Stimulus):
             else:
                 return MediaTime(self._start_position)
 
+    def _get_log_name(self):
+        if isinstance(self._filename, str):
+            import sys
+            return self._filename.encode(sys.getfilesystemencoding())
+        else:
+            return self._filename
+
     def copy(self):
         """Copy the stimulus.
 
@@ -131,6 +194,21 @@ class Audio(Stimulus):
                 self.play()
         return rtn
 
+    def _get_sound_key(self):
+        """Return the key of the decoded sound in the shared cache."""
+
+        path = os.path.abspath(self._filename)
+        return (path, os.path.getmtime(path), pygame.mixer.get_init())
+
+    def _load_sound(self):
+        """Decode the sound."""
+
+        # Due to a bug in handling file names introduced in PyGame 1.9.2,
+        # we pass a file handle to PyGame. See also:
+        # https://github.com/expyriment/expyriment/issues/81
+        with open(self._filename, 'rb') as f:
+            return pygame.mixer.Sound(f)
+
     def preload(self):
         """Preload stimulus to memory.
 
@@ -142,14 +220,22 @@ class Audio(Stimulus):
         """
 
         start = get_time()
-        if not self._is_preloaded:
-            # Due to a bug in handling file names introduced in PyGame 1.9.2,
-            # we pass a file handle to PyGame. See also:
-            # https://github.com/expyriment/expyriment/issues/81
-            with open(self._filename, 'rb') as f:
-                self._file = pygame.mixer.Sound(f)
-            self._length = self._file.get_length()
-            self._sound_array = pygame.sndarray.array(self._file)
+        if not self._is_preloaded and self._streaming:
+            self._length = _get_wave_length(self.filename)
+            self._sound_array = None
+            self._is_preloaded = True
+        elif not self._is_preloaded:
+            key = self._get_sound_key()
+            sound = _sounds.get(key)
+            if sound is None:
+                sound = self._load_sound()
+                _sounds[key] = sound
+            self._sound = sound
+            self._file = sound
+            self._length = sound.get_length()
+            # view on the samples of the sound (no copy)
+            self._sound_array = pygame.sndarray.samples(sound)
+            self._sound_array.flags.writeable = False
             self._is_preloaded = True
 
         return int((get_time() - start) * 1000)
@@ -171,6 +257,7 @@ class Audio(Stimulus):
         if self._is_preloaded:
             self.stop()
             self._file = None
+            self._sound = None
             self._sound_array = None
             self._is_preloaded = False
 
@@ -187,7 +274,8 @@ class Audio(Stimulus):
         loops : int, optional
             how often to repeat (-1 = forever) (default = 0)
         maxtime : int
-            stop after given amount of milliseconds (default = 0)
+            stop after given amount of milliseconds (default = 0); not
+            supported in streaming mode
         fade_ms : int, optional
             fade in time in milliseconds (default = 0)
         log_event_tag : numeral or string, optional
@@ -207,6 +295,8 @@ class Audio(Stimulus):
 
         """
 
+        if _internals.active_exp.prefetcher is not None:
+            _internals.active_exp.prefetcher.stimulus_presented(self)
         if not self._is_preloaded:
             self.preload()
 
@@ -216,7 +306,16 @@ class Audio(Stimulus):
         if self.is_playing:
             return self._channel
 
-        self._channel = self._file.play(loops, maxtime, fade_ms)
+        if self._streaming:
+            global _stream_owner
+            if _stream_owner is not None and _stream_owner is not self:
+                _stream_owner.stop()
+            pygame.mixer.music.load(self.filename)
+            pygame.mixer.music.play(loops, self._start_position, fade_ms)
+            _stream_owner = self
+            self._channel = None
+        else:
+            self._channel = self._file.play(loops, maxtime, fade_ms)
         self._start_time = get_time() - self._start_position
 
         _internals.active_exp.keyboard.quit_control.register_functions(
@@ -225,25 +324,25 @@ class Audio(Stimulus):
                 quit_denied_function=self.pause)
 
         if self._logging:
-            if isinstance(self._filename, str):
-                import sys
-                filename = self._filename.encode(sys.getfilesystemencoding())
-            else:
-                filename = self._filename
-
             _internals.active_exp._event_file_log(
-                "Stimulus,played,{0}".format(filename), 1,
+                "Stimulus,played,{0}".format(self._get_log_name()), 1,
                                  log_event_tag=log_event_tag)
         return self._channel
 
     def pause(self):
         if self._is_preloaded:
             if self.is_playing:
-                self._channel.pause()
+                if self._streaming:
+                    pygame.mixer.music.pause()
+                else:
+                    self._channel.pause()
                 self._paused_time = get_time() - self._start_time
                 self._is_paused = True
             elif self._is_paused:
-                self._channel.unpause()
+                if self._streaming:
+                    pygame.mixer.music.unpause()
+                else:
+                    self._channel.unpause()
                 self._start_time = get_time() - self._paused_time
                 self._paused_time = 0
                 self._is_paused = False
@@ -251,9 +350,14 @@ class Audio(Stimulus):
     def stop(self):
         """Stop the audio stimulus"""
 
+        global _stream_owner
+
         if self._is_preloaded:
-            self._file.stop()
+            self._stop_channel()
             self._channel = None
+            if _stream_owner is self:
+                pygame.mixer.music.unload()
+                _stream_owner = None
             self.seek(0)
             self._start_position = 0
             self._start_time = 0
@@ -265,6 +369,16 @@ class Audio(Stimulus):
                 quit_confirmed_function=self.stop,
                 quit_denied_function=self.pause)
 
+    def _stop_channel(self):
+        """Stop the channel, if it (still) plays this stimulus."""
+
+        if self._streaming:
+            if _stream_owner is self:
+                pygame.mixer.music.stop()
+        elif self._channel is not None and \
+                self._channel.get_sound() is self._file:
+            self._channel.stop()
+
     def seek(self, time):
         """Seek playback position to specified time.
 
@@ -292,22 +406,35 @@ class Audio(Stimulus):
             time = MediaTime.convert_to_seconds(time)
             if time < 0:
                 time = 0
-            elif time > self._length:
+            elif self._length is not None and time > self._length:
                 time = self._length
 
         if self.is_playing:
             was_playing = True
         else:
             was_playing = False
-        self._file.stop()
+        self._stop_channel()
         self._start_time = 0
         self._paused_time = 0
         self._is_paused = False
 
+        if self._streaming:
+            if was_playing:
+                pygame.mixer.music.play(0, time)
+                self._start_time = get_time() - time
+            else:
+                self._start_position = time
+            return
+
         sample_rate = len(self._sound_array) / self._length
         samples_to_skip = int(time * sample_rate)
-        sliced_array = self._sound_array[samples_to_skip:]
-        self._file = pygame.sndarray.make_sound(sliced_array)
+        if samples_to_skip <= 0:
+            self._file = self._sound
+        else:
+            # PyGame copies the buffer, such that only the remaining samples
+            # are held twice until playback is stopped or rewound
+            self._file = pygame.mixer.Sound(
+                buffer=self._sound_array[samples_to_skip:])
 
         if was_playing:
             self._channel.play(self._file)
@@ -0,0 +1,173 @@
+"""
+Font registry and text rendering cache.
+
+This module contains a registry of loaded fonts and a cache of rendered
+text, which are shared by all text stimuli.
+
+"""
+
+__author__ = 'Florian Krause <florian@expyriment.org>, \
+Oliver Lindemann <oliver@expyriment.org>'
+
+import io
+import os
+from collections import OrderedDict
+
+import pygame
+
+from . import defaults
+
+_font_files = {}  # path: content of font file
+_fonts = OrderedDict()  # (path, size, bold, italic, underline): font
+_rendered = OrderedDict()  # (font key, text, antialias, colours): surface
+_rendered_nbytes = 0
+
+
+def _load_font_file(path):
+    """Return the content of a font file (read only once)."""
+
+    if path not in _font_files:
+        with open(path, 'rb') as f:
+            _font_files[path] = f.read()
+    return _font_files[path]
+
+
+def check_font(path):
+    """Check if a font can be loaded.
+
+    Parameters
+    ----------
+    path : str
+        path to the font file
+
+    Returns
+    -------
+    ok : bool
+
+    """
+
+    try:
+        get_font(path, 10)
+    except Exception:
+        _font_files.pop(path, None)
+        return False
+    return True
+
+
+def get_font(path, size, bold=False, italic=False, underline=False):
+    """Return a (shared) font object.
+
+    Fonts are loaded from memory, the font file is only read once. The
+    least recently used fonts are removed from the registry, if it holds
+    more than stimuli.defaults.text_font_cache_size fonts.
+
+    Parameters
+    ----------
+    path : str
+        path to the font file (or name of the font)
+    size : int
+        text size
+    bold : bool, optional
+    italic : bool, optional
+    underline : bool, optional
+
+    Returns
+    -------
+    font : pygame.font.Font object
+        the font, which must not be modified
+
+    """
+
+    key = (path, size, bool(bold), bool(italic), bool(underline))
+    font = _fonts.get(key)
+    if font is not None:
+        _fonts.move_to_end(key)
+        return font
+
+    pygame.font.init()
+    if os.path.isfile(path):
+        # Due to a bug in handling file names in PyGame 1.9.2, we do not
+        # pass a file name to PyGame. See also:
+        # https://github.com/expyriment/expyriment/issues/81
+        font = pygame.font.Font(io.BytesIO(_load_font_file(path)), size)
+    else:
+        font = pygame.font.Font(path, size)
+    font.set_bold(bold)
+    font.set_italic(italic)
+    font.set_underline(underline)
+    _fonts[key] = font
+    while len(_fonts) > max(1, defaults.text_font_cache_size):
+        _fonts.popitem(last=False)
+    return font
+
+
+def render_text(text, path, size, bold=False, italic=False,
+                underline=False, antialias=True, colour=(0, 0, 0),
+                background_colour=None):
+    """Render a single line of text.
+
+    Rendered text is cached, such that rendering the same text in the same
+    style again does not require the font renderer. The least recently used
+    surfaces are removed from the cache, if it exceeds
+    stimuli.defaults.text_render_cache_budget bytes.
+
+    Parameters
+    ----------
+    text : str
+        text to render
+    path : str
+        path to the font file (or name of the font)
+    size : int
+        text size
+    bold : bool, optional
+    italic : bool, optional
+    underline : bool, optional
+    antialias : bool, optional
+    colour : (int, int, int), optional
+    background_colour : (int, int, int), optional
+
+    Returns
+    -------
+    surface : pygame.Surface
+        the rendered text, which must not be modified (copy or convert it
+        before drawing on it)
+
+    """
+
+    global _rendered_nbytes
+
+    font_key = (path, size, bool(bold), bool(italic), bool(underline))
+    key = (font_key, text, bool(antialias), tuple(colour),
+           None if background_colour is None else tuple(background_colour))
+    surface = _rendered.get(key)
+    if surface is not None:
+        _rendered.move_to_end(key)
+        return surface
+
+    font = get_font(path, size, bold, italic, underline)
+    if background_colour is not None:
+        surface = font.render(text, antialias, colour, background_colour)
+    else:
+        surface = font.render(text, antialias, colour)
+    budget = defaults.text_render_cache_budget
+    nbytes = surface.get_width() * surface.get_height() * \
+        surface.get_bytesize()
+    if budget is None or nbytes <= budget:
+        _rendered[key] = surface
+        _rendered_nbytes += nbytes
+        while budget is not None and _rendered_nbytes > budget:
+            _key, old = _rendered.popitem(last=False)
+            _rendered_nbytes -= old.get_width() * old.get_height() * \
+                old.get_bytesize()
+    return surface
+
+
+def clear():
+    """Remove all fonts and rendered text from the caches."""
+
+    global _rendered_nbytes
+
+    _font_files.clear()
+    _fonts.clear()
+    _rendered.clear()
+    _rendered_nbytes = 0
@@ -10,36 +10,47 @@ Oliver Lindemann <oliver@expyriment.org>'
 
 import copy
 
+import numpy as np
 import pygame
 
 from .. import _internals
 from ..misc._timer import get_time
-from ..misc.geometry import XYPoint, lines_intersect
+from ..misc.geometry import XYPoint, lines_intersect, points_inside_polygon
 from . import defaults
 from ._visual import Visual
 
 
 def _get_shape_rect(points):
     # helper function
-    """ return bouncing rect as pygame.Rect rect (top, left, width, height) around the points."""
-
-    t = 0
-    l = 0
-    r = 0
-    b = 0
-
-    for p in points:
-        if p.x < l:
-            l = p.x
-        elif p.x > r:
-            r = p.x
-        if p.y > t:
-            t = p.y
-        elif p.y < b:
-            b = p.y
+    """ return bouncing rect as pygame.Rect rect (top, left, width, height) around the points (array of shape (n, 2))."""
+
+    l = min(0, points[:, 0].min().item())
+    r = max(0, points[:, 0].max().item())
+    t = max(0, points[:, 1].max().item())
+    b = min(0, points[:, 1].min().item())
 
     return pygame.Rect(l, t, r - l, t - b)
 
+def _polygons_overlap(points1, points2):
+    # helper function
+    """ return True if the polygons (arrays of shape (n, 2)) overlap."""
+
+    # bounding boxes do not overlap
+    if (points1.min(axis=0) > points2.max(axis=0)).any() or \
+            (points2.min(axis=0) > points1.max(axis=0)).any():
+        return False
+
+    # polygons overlap if
+    # (a) a point of one polygon is inside the other polygon
+    # (b) OR edges intersect
+    if points_inside_polygon(points1, points2).any() or \
+            points_inside_polygon(points2, points1).any():
+        return True
+    ends1 = np.roll(points1, -1, axis=0)
+    ends2 = np.roll(points2, -1, axis=0)
+    return bool(lines_intersect(points1[:, np.newaxis], ends1[:, np.newaxis],
+                                points2[np.newaxis], ends2[np.newaxis]).any())
+
 class Shape(Visual):
     """A class implementing a shape."""
 
@@ -152,7 +163,7 @@ class Shape(Visual):
         self._debug_contour_colour = debug_contour_colour
 
         self._vertices = []
-        self._xy_points = []
+        self._points = np.zeros((1, 2), dtype=int)
         self._rect = pygame.Rect(0, 0, 0, 0)
         self._native_rotation = 0
         self._native_scaling = [1, 1]
@@ -296,10 +307,7 @@ class Shape(Visual):
 
         """
 
-        rtn = []
-        for p in self.xy_points:
-            rtn.append(p.tuple)
-        return rtn
+        return [tuple(p) for p in self._points.tolist()]
 
     @property
     def points_on_screen(self):
@@ -320,10 +328,7 @@ class Shape(Visual):
 
         """
 
-        rtn = []
-        for p in self.xy_points_on_screen:
-            rtn.append(p.tuple)
-        return rtn
+        return [tuple(p) for p in self.get_points_array(True).tolist()]
 
     @property
     def scaling(self):
@@ -358,7 +363,7 @@ class Shape(Visual):
 
         """
 
-        return self._xy_points
+        return [XYPoint(x, y) for x, y in self._points.tolist()]
 
     @property
     def xy_points_on_screen(self):
@@ -378,11 +383,31 @@ class Shape(Visual):
 
         """
 
-        rtn = []
-        pos = XYPoint(xy=self.position)
-        for p in copy.deepcopy(self.xy_points):
-            rtn.append(p.move(pos))
-        return rtn
+        return [XYPoint(x, y)
+                for x, y in self.get_points_array(True).tolist()]
+
+    def get_points_array(self, on_screen=False):
+        """Return the points of the shape as an array.
+
+        Like the point representation, the array takes into account all
+        native transformations (rotation, scaling, flipping).
+
+        Parameters
+        ----------
+        on_screen : bool, optional
+            take into account the position on screen (default = False)
+
+        Returns
+        -------
+        points : numpy.ndarray
+            array of shape (n, 2) with the points (x, y) of the polygon in
+            Expyriment coordinates
+
+        """
+
+        if on_screen:
+            return self._points + np.asarray(self.position)
+        return self._points.copy()
 
     def add_vertex(self, xy):
         """ Add a vertex to the shape.
@@ -438,7 +463,7 @@ class Shape(Visual):
                 "erase_vertices"))
 
         self._vertices = []
-        self._xy_points = []
+        self._points = np.zeros((1, 2), dtype=int)
         self._rect = pygame.Rect(0, 0, 0, 0)
         self._native_rotation = 0
         self._native_scaling = [1, 1]
@@ -490,28 +515,27 @@ class Shape(Visual):
 
         """
 
-        # shape and other shape do not overlap if
-        # (a) no point of shape is inside other shape
-        # (b) AND no point of other shape is inside shape
-        # (c) AND lines do not intersect
-
-        s1 = self.xy_points_on_screen
-        s2 = other.xy_points_on_screen
-        #(a) & (b)
-        for p in s1:
-            if p.is_inside_polygon(s2):
-                return True
-        for p in s2:
-            if p.is_inside_polygon(s1):
-                return True
-        #(c)
-        for from1 in range(0, len(s1) - 1):
-            for to1 in range(from1 + 1, len(s1)):
-                for from2 in range(0, len(s2) - 1):
-                    for to2 in range(0, len(s2)):
-                        if lines_intersect(s1[from1], s1[to1], s2[from2], s2[to2]):
-                            return True
-        return False
+        return _polygons_overlap(self.get_points_array(True),
+                                 other.get_points_array(True))
+
+    def overlapping_with_shapes(self, others):
+        """Return for several other shapes if shape overlaps with them.
+
+        Parameters
+        ----------
+        others : list of stimuli.Shape
+            the other shape objects
+
+        Returns
+        -------
+        val : list of bool
+            True for each other shape that is overlapping
+
+        """
+
+        points = self.get_points_array(True)
+        return [_polygons_overlap(points, other.get_points_array(True))
+                for other in others]
 
     def native_rotate(self, degree):
         """Rotate the shape.
@@ -616,28 +640,30 @@ class Shape(Visual):
         Converts vertex to points, centers points, rotates, calculates rect
         """
 
-        xy_p = [XYPoint(0, 0)]
-        for v in self._vertices:
-            # Copying and scaling and flipping of vertices
-            v = (v[0] * self._native_scaling[0],
-                 v[1] * self._native_scaling[1])
-            # Converts tmp_vtx to points in xy-coordinates
-            xy_p.append(XYPoint(x = v[0] + xy_p[-1].x,
-                                y = v[1] + xy_p[-1].y))
+        if len(self._vertices) > 0:
+            # Scaling and flipping of vertices and conversion to points in
+            # xy-coordinates
+            vertices = np.array(self._vertices) * self._native_scaling
+            xy_p = np.concatenate((np.zeros((1, 2), dtype=vertices.dtype),
+                                   np.cumsum(vertices, axis=0)))
+        else:
+            xy_p = np.zeros((1, 2), dtype=int)
 
         # center points
         r = _get_shape_rect(xy_p)
         cntr = (r.left + (r.width // 2), r.top - (r.height // 2))
-        m = XYPoint(x=-1*cntr[0], y=-1*cntr[1])
-        for x in range(0, len(xy_p)): # Center points
-            xy_p[x].move(m)
+        xy_p = xy_p - cntr
 
         if self._native_rotation != 0:
-            for x in range(0, len(xy_p)):
-                xy_p[x].rotate(self._native_rotation,
-                               self._native_rotation_centre)
-
-        self._xy_points = xy_p
+            centre = self._native_rotation_centre
+            dx = xy_p[:, 0] - centre[0]
+            dy = xy_p[:, 1] - centre[1]
+            radial = np.hypot(dx, dy)
+            ang = np.arctan2(dy, dx) - np.radians(self._native_rotation)
+            xy_p = np.column_stack((radial * np.cos(ang) + centre[0],
+                                    radial * np.sin(ang) + centre[1]))
+
+        self._points = xy_p
         self._rect = _get_shape_rect(xy_p)
 
     def _create_surface(self):
@@ -660,9 +686,10 @@ class Shape(Visual):
                                         pygame.SRCALPHA).convert_alpha()
 
         # plot create polygon area
-        poly = []
-        for p in self.xy_points: # Convert points_in_pygame_coordinates
-            poly.append(self.convert_expyriment_xy_to_surface_xy(p.tuple))
+        # Convert points_in_pygame_coordinates
+        poly = np.column_stack(
+            ((self._points[:, 0] - self._rect.left).astype(int),
+             -1 * (self._points[:, 1] - self._rect.top).astype(int))).tolist()
 
         pygame.draw.polygon(surface, self.colour, poly, 0)
 
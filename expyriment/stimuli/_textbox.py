@@ -8,19 +8,205 @@ This module contains a class implementing a text box stimulus.
 __author__ = 'Florian Krause <florian@expyriment.org>, \
 Oliver Lindemann <oliver@expyriment.org>'
 
-import os
 import re
+from collections import namedtuple
 
 import pygame
 
 from .. import _internals
 from ..misc import bytes_to_unicode, find_font
-from . import defaults
+from . import _fonts, defaults
 from ._visual import Visual
 
-# Keep track of open file handles and previously loaded font objects
-open_filehandles = []
-fonts = {}
+_WrappedParagraph = namedtuple("_WrappedParagraph",
+                               ["words", "checkpoints", "closed", "lines"])
+
+
+class _TextLayout:
+    """Word wrapping and rendering of text with retained results.
+
+    The measured sizes of text, the wrapped lines of each paragraph and (for
+    mutable stimuli) the rendered surface are kept, such that only the parts
+    of a text that have been changed need to be wrapped and rendered again.
+
+    """
+
+    _max_sizes = 10000  # maximal number of cached text sizes
+
+    def __init__(self):
+        self._reset()
+
+    def __getstate__(self):
+        return {}  # caches are neither copied nor pickled
+
+    def __setstate__(self, state):
+        self._reset()
+
+    def _reset(self):
+        self._font = None
+        self._width = None
+        self._do_not_trim_words = None
+        self._sizes = {}
+        self._paragraphs = {}  # text: _WrappedParagraph
+        self._last_paragraphs = []
+        self._surface = None
+        self._surface_key = None
+        self._surface_lines = []  # (line, y, height)
+
+    def _size(self, text):
+        size = self._sizes.get(text)
+        if size is None:
+            if len(self._sizes) >= _TextLayout._max_sizes:
+                self._sizes.clear()
+            size = self._font.size(text)
+            self._sizes[text] = size
+        return size
+
+    def wrap(self, string, font, width, do_not_trim_words):
+        """Wrap a text into lines that fit into width.
+
+        Only paragraphs that have changed are wrapped again. Changed
+        paragraphs are wrapped starting from the first changed word.
+
+        """
+
+        if font is not self._font or width != self._width or \
+                do_not_trim_words != self._do_not_trim_words:
+            self._reset()
+            self._font = font
+            self._width = width
+            self._do_not_trim_words = do_not_trim_words
+
+        paragraphs = {}
+        last_paragraphs = []
+        lines = []
+        for idx, text in enumerate(string.splitlines()):
+            wrapped = self._paragraphs.get(text)
+            if wrapped is None:
+                if idx < len(self._last_paragraphs):
+                    previous = self._last_paragraphs[idx]
+                else:
+                    previous = None
+                wrapped = self._wrap_paragraph(text, previous)
+            paragraphs[text] = wrapped
+            last_paragraphs.append(wrapped)
+            lines.extend(wrapped.lines)
+        self._paragraphs = paragraphs
+        self._last_paragraphs = last_paragraphs
+        return lines
+
+    def _wrap_paragraph(self, text, previous):
+        if self._size(text)[0] <= self._width:
+            return _WrappedParagraph(None, None, None, [text])
+
+        words = text.split(' ')
+        start = 0
+        if previous is not None and previous.words is not None:
+            for old, new in zip(previous.words, words):
+                if old != new:
+                    break
+                start += 1
+            start = min(start, len(previous.words) - 1)
+        if start > 0:
+            n_closed, accumulated_line = previous.checkpoints[start]
+            closed = previous.closed[:n_closed]
+            checkpoints = previous.checkpoints[:start]
+        else:
+            closed = []
+            checkpoints = []
+            accumulated_line = ""
+
+        for word in words[start:]:
+            checkpoints.append((len(closed), accumulated_line))
+            if not self._do_not_trim_words:
+                while self._size(word)[0] >= self._width:
+                    word = word[:-2] + '~'
+            elif self._size(word)[0] >= self._width:
+                raise Exception("The word " + word +
+                                " is too long to fit in the rect passed.")
+
+            if len(accumulated_line) > 0:
+                test_line = accumulated_line + " " + word
+            else:
+                test_line = word
+
+            # Build the line if the words fit.
+            if self._size(test_line)[0] < self._width:
+                accumulated_line = test_line
+            else:
+                if len(accumulated_line) > 0:
+                    closed.append(accumulated_line)
+                accumulated_line = word
+
+        return _WrappedParagraph(words, checkpoints, closed,
+                                 closed + [accumulated_line])
+
+    def render(self, lines, size, text_colour, background_colour,
+               justification, render_line, retain=False):
+        """Render wrapped lines onto the retained surface.
+
+        Only lines that have changed are rendered again. If retain is True,
+        the surface is kept for the next call and a copy of it is returned.
+        Otherwise, the surface itself is returned and no longer retained.
+
+        """
+
+        if justification not in (0, 1, 2):
+            raise Exception("Invalid justification argument: " +
+                            str(justification))
+        new_lines = []
+        accumulated_height = 0
+        for line in lines:
+            height = self._size(line)[1]
+            # Changed from >= which led to crashes sometimes!
+            if accumulated_height + height > size[1]:
+                raise Exception(
+                    "Once word-wrapped," +
+                    "the text string was too tall to fit in the rect.")
+            new_lines.append((line, accumulated_height, height))
+            accumulated_height += height
+
+        if background_colour is not None:
+            background_colour = tuple(background_colour)
+        key = (tuple(size), tuple(text_colour), background_colour,
+               justification)
+        if self._surface is None or key != self._surface_key:
+            self._surface = pygame.surface.Surface(
+                size, pygame.SRCALPHA).convert_alpha()
+            if background_colour is not None:
+                self._surface.fill(background_colour)
+            self._surface_key = key
+            self._surface_lines = []
+        if background_colour is not None:
+            clear_colour = background_colour
+        else:
+            clear_colour = (0, 0, 0, 0)
+
+        old_lines = self._surface_lines
+        for idx, old in enumerate(old_lines):
+            if idx >= len(new_lines) or new_lines[idx] != old:
+                self._surface.fill(clear_colour,
+                                   pygame.Rect(0, old[1], size[0], old[2]))
+        for idx, (line, y, _height) in enumerate(new_lines):
+            if idx < len(old_lines) and old_lines[idx] == new_lines[idx]:
+                continue
+            if line != "":
+                tempsurface = render_line(line)
+                if justification == 0:
+                    x = 0
+                elif justification == 1:
+                    x = (size[0] - tempsurface.get_width()) // 2
+                else:
+                    x = size[0] - tempsurface.get_width()
+                self._surface.blit(tempsurface, (x, y))
+        if retain:
+            self._surface_lines = new_lines
+            return self._surface.copy()
+        surface = self._surface
+        self._surface = None
+        self._surface_key = None
+        self._surface_lines = []
+        return surface
 
 
 class TextBox(Visual):
@@ -101,10 +287,7 @@ class TextBox(Visual):
         if text_font is None:
             text_font = "FreeSans"
         self._text_font = find_font(text_font)
-        try:
-            with open(self.text_font, 'rb') as f:
-                pygame.font.Font(f, 10)
-        except Exception:
+        if not _fonts.check_font(self._text_font):
             raise OSError("Font '{0}' not found!".format(text_font))
         if text_bold is not None:
             self._text_bold = text_bold
@@ -138,6 +321,7 @@ class TextBox(Visual):
             self._do_not_trim_words = do_not_trim_words
         else:
             self._do_not_trim_words = defaults.textbox_do_not_trim_words
+        self._layout = _TextLayout()
 
 
     _getter_exception_message = "Cannot set {0} if surface exists!"
@@ -152,11 +336,13 @@ class TextBox(Visual):
     def text(self, value):
         """Setter for text."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextBox._getter_exception_message.format(
                 "text"))
         else:
             self._text = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_font(self):
@@ -168,11 +354,13 @@ class TextBox(Visual):
     def text_font(self, value):
         """Setter for text_font."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextBox._getter_exception_message.format(
                 "text_font"))
         else:
             self._text_font = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_size(self):
@@ -184,11 +372,13 @@ class TextBox(Visual):
     def text_size(self, value):
         """Setter for text_size."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextBox._getter_exception_message.format(
                 "text_size"))
         else:
             self._text_size = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_bold(self):
@@ -200,11 +390,13 @@ class TextBox(Visual):
     def text_bold(self, value):
         """Setter for text_bold."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextBox._getter_exception_message.format(
                 "text_bold"))
         else:
             self._text_bold = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_italic(self):
@@ -216,11 +408,13 @@ class TextBox(Visual):
     def text_italic(self, value):
         """Setter for text_italic."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextBox._getter_exception_message.format(
                 "text_italic"))
         else:
             self._text_italic = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_underline(self):
@@ -232,11 +426,13 @@ class TextBox(Visual):
     def text_underline(self, value):
         """Setter for text_underline."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextBox._getter_exception_message.format(
                 "text_underline"))
         else:
             self._text_underline = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_justification(self):
@@ -248,11 +444,13 @@ class TextBox(Visual):
     def text_justification(self, value):
         """Setter for text_justification."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextBox._getter_exception_message.format(
                 "text_justification"))
         else:
             self._text_justification = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_colour(self):
@@ -264,11 +462,13 @@ class TextBox(Visual):
     def text_colour(self, value):
         """Setter for text_colour."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextBox._getter_exception_message.format(
                 "text_colour"))
         else:
             self._text_colour = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def background_colour(self):
@@ -280,11 +480,13 @@ class TextBox(Visual):
     def background_colour(self, value):
         """Setter for background_colour."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextBox._getter_exception_message.format(
                 "background_colour"))
         else:
             self._background_colour = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def size(self):
@@ -295,33 +497,22 @@ class TextBox(Visual):
     def size(self, value):
         """Setter for size."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextBox._getter_exception_message.format(
                 "size"))
         else:
             self._size = value
+            if self._mutable:
+                self._rerender(in_place=False)
 
     def _create_surface(self):
         """Create the surface of the stimulus."""
 
         rect = pygame.Rect((0, 0), self.size)
 
-        if os.path.isfile(self._text_font):
-            # We preserve previously created fonts, so that we don't open the
-            # same font over and over again.
-            if (self._text_font, self._text_size) in fonts:
-                _font = fonts[(self._text_font, self._text_size)]
-            else:
-                f = open(self._text_font, 'rb')
-                open_filehandles.append(f)
-                _font = pygame.font.Font(f, self._text_size)
-                fonts[(self._text_font, self._text_size)] = _font
-        else:
-            _font = pygame.font.Font(self._text_font, self._text_size)
-
-        _font.set_bold(self.text_bold)
-        _font.set_italic(self.text_italic)
-        _font.set_underline(self.text_underline)
+        _font = _fonts.get_font(self._text_font, self._text_size,
+                                self.text_bold, self.text_italic,
+                                self.text_underline)
 
         if not isinstance(self.text, str):
             # Pygame wants latin-1 encoding here for character strings
@@ -333,6 +524,21 @@ class TextBox(Visual):
                                     self.background_colour,
                                     self.text_justification)
 
+    def _render_line(self, line, font, text_colour):
+        """Render a line of text.
+
+        The cache of rendered text is used, if font is the font of the text
+        box.
+
+        """
+
+        font_key = (self._text_font, self._text_size, self.text_bold,
+                    self.text_italic, self.text_underline)
+        if font is _fonts.get_font(*font_key):
+            return _fonts.render_text(line, *font_key, antialias=True,
+                                      colour=text_colour)
+        return font.render(line, 1, text_colour)
+
     # The following code is taken from the word-wrapped text display module by
     # David Clark (http://www.pygame.org/pcr/text_rect/index.php).
     def render_textrect(self, string, font, rect, text_colour,
@@ -360,69 +566,12 @@ class TextBox(Visual):
 
         """
 
-        final_lines = []
-        requested_lines = string.splitlines()
-
-        # Create a series of lines that will fit on the provided
-        # rect.
-        for requested_line in requested_lines:
-            if font.size(requested_line)[0] > rect.width:
-                # Start a new line
-                accumulated_line = ""
-                for word in requested_line.split(' '):
-                    if not self._do_not_trim_words:
-                        while font.size(word)[0] >= rect.width:
-                            word = word[:-2] + '~'
-                    elif font.size(word)[0] >= rect.width:
-                            raise Exception("The word " + word +
-                                " is too long to fit in the rect passed.")
-
-                    if len(accumulated_line) > 0:
-                        test_line = accumulated_line + " " + word
-                    else:
-                        test_line = word
-
-                    # Build the line if the words fit.
-                    if font.size(test_line)[0] < rect.width:
-                        accumulated_line = test_line
-                    else:
-                        if len(accumulated_line) > 0:
-                            final_lines.append(accumulated_line)
-                        accumulated_line = word
-
-                final_lines.append(accumulated_line)
-            else:
-                final_lines.append(requested_line)
-
-        # Let's try to write the text out on the surface.
-        surface = pygame.surface.Surface(rect.size,
-                                         pygame.SRCALPHA).convert_alpha()
-        if background_colour is not None:
-            surface.fill(background_colour)
-        accumulated_height = 0
-        for line in final_lines:
-            # Changed from >= which led to crashes sometimes!
-            if accumulated_height + font.size(line)[1] > rect.height:
-                raise Exception(
-                    "Once word-wrapped," +
-                    "the text string was too tall to fit in the rect.")
-            if line != "":
-                tempsurface = font.render(line, 1, text_colour)
-                if justification == 0:
-                    surface.blit(tempsurface, (0, accumulated_height))
-                elif justification == 1:
-                    surface.blit(tempsurface,
-                                 ((rect.width - tempsurface.get_width()) // 2,
-                                  accumulated_height))
-                elif justification == 2:
-                    surface.blit(tempsurface,
-                                 (rect.width - tempsurface.get_width(),
-                                  accumulated_height))
-                else:
-                    raise Exception("Invalid justification argument: " +
-                                    str(justification))
-            accumulated_height += font.size(line)[1]
-        return surface
+        lines = self._layout.wrap(string, font, rect.width,
+                                  self._do_not_trim_words)
+        return self._layout.render(
+            lines, rect.size, text_colour, background_colour, justification,
+            lambda line: self._render_line(line, font, text_colour),
+            retain=self._mutable)
 
     def format_block(self, block):
         """Format the given block of text.
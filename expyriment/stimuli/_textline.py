@@ -8,19 +8,13 @@ This module contains a class implementing a text line stimulus.
 __author__ = 'Florian Krause <florian@expyriment.org>, \
 Oliver Lindemann <oliver@expyriment.org>'
 
-import os
-
 import pygame
 
 from .. import _internals
 from ..misc import bytes_to_unicode, find_font
-from . import defaults
+from . import _fonts, defaults
 from ._visual import Visual
 
-# Keep track of open file handles and previously loaded font objects
-open_filehandles = []
-fonts = {}
-
 
 class TextLine(Visual):
     """A class implementing a single text line."""
@@ -84,10 +78,7 @@ class TextLine(Visual):
         if text_font is None:
             text_font = "FreeSans"
         self._text_font = find_font(text_font)
-        try:
-            with open(self._text_font, 'rb') as f:
-                pygame.font.Font(f, 10)
-        except Exception:
+        if not _fonts.check_font(self._text_font):
             raise OSError("Font '{0}' not found!".format(text_font))
         if text_bold is not None:
             self._text_bold = text_bold
@@ -125,11 +116,13 @@ class TextLine(Visual):
     def text(self, value):
         """Setter for text."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextLine._getter_exception_message.format(
                 "text"))
         else:
             self._text = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_font(self):
@@ -141,11 +134,13 @@ class TextLine(Visual):
     def text_font(self, value):
         """Setter for text_font."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextLine._getter_exception_message.format(
                 "text_font"))
         else:
             self._text_font = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_size(self):
@@ -157,11 +152,13 @@ class TextLine(Visual):
     def text_size(self, value):
         """Setter for text_size."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextLine._getter_exception_message.format(
                 "text_size"))
         else:
             self._text_size = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_bold(self):
@@ -173,11 +170,13 @@ class TextLine(Visual):
     def text_bold(self, value):
         """Setter for text_bold."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextLine._getter_exception_message.format(
                 "text_bold"))
         else:
             self._text_bold = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_italic(self):
@@ -189,11 +188,13 @@ class TextLine(Visual):
     def text_italic(self, value):
         """Setter for text_italic."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextLine._getter_exception_message.format(
                 "text_italic"))
         else:
             self._text_italic = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_underline(self):
@@ -205,11 +206,13 @@ class TextLine(Visual):
     def text_underline(self, value):
         """Setter for text_underline."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextLine._getter_exception_message.format(
                 "text_underline"))
         else:
             self._text_underline = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_colour(self):
@@ -221,11 +224,13 @@ class TextLine(Visual):
     def text_colour(self, value):
         """Setter for text_colour."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextLine._getter_exception_message.format(
                 "text_colour"))
         else:
             self._text_colour = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def background_colour(self):
@@ -237,45 +242,31 @@ class TextLine(Visual):
     def background_colour(self, value):
         """Setter for background_colour."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextLine._getter_exception_message.format(
                 "background_colour"))
         else:
             self._background_colour = value
+            if self._mutable:
+                self._rerender()
 
     def _create_surface(self):
         """Create the surface of the stimulus."""
 
-        # Due to a bug in handling file names in PyGame 1.9.2, we pass a file
-        # handle to PyGame. See also:
-        # https://github.com/expyriment/expyriment/issues/81
-        if os.path.isfile(self._text_font):
-            # We preserve previously created fonts, so that we don't open the
-            # same font over and over again.
-            if (self._text_font, self._text_size) in fonts:
-                _font = fonts[(self._text_font, self._text_size)]
-            else:
-                f = open(self._text_font, 'rb')
-                open_filehandles.append(f)
-                _font = pygame.font.Font(f, self._text_size)
-                fonts[(self._text_font, self._text_size)] = _font
-        else:
-            _font = pygame.font.Font(self._text_font, self._text_size)
-
-        _font.set_bold(self.text_bold)
-        _font.set_italic(self.text_italic)
-        _font.set_underline(self.text_underline)
         if not isinstance(self.text, str):
             # Pygame wants latin-1 encoding here for character strings
             _text = bytes_to_unicode(self.text).encode('latin-1')
         else:
             _text = self.text
         if self.background_colour:
-            surface = _font.render(_text, True, self.text_colour,
-                                   self.background_colour)
+            background_colour = self.background_colour
         else:
-            surface = _font.render(_text, True, self.text_colour)
-        surface = surface.convert_alpha()
+            background_colour = None
+        surface = _fonts.render_text(_text, self._text_font, self._text_size,
+                                     self.text_bold, self.text_italic,
+                                     self.text_underline, True,
+                                     self.text_colour, background_colour)
+        surface = surface.convert_alpha()  # copy of the cached surface
 
         if self._max_width is not None and self._max_width > 0 and surface.get_size()[0] > self._max_width:
             # trim too long text lines
@@ -13,7 +13,7 @@ import pygame
 
 from .. import _internals
 from ..misc import find_font
-from . import defaults
+from . import _fonts, defaults
 from ._stimulus import Stimulus
 from ._textbox import TextBox
 from ._textline import TextLine
@@ -84,10 +84,7 @@ class TextScreen(Visual):
         if heading_font is None:
             heading_font = "FreeSans"
         self._heading_font = find_font(heading_font)
-        try:
-            with open(self._heading_font, 'rb') as f:
-                pygame.font.Font(f, 10)
-        except Exception:
+        if not _fonts.check_font(self._heading_font):
             raise OSError("Font '{0}' not found!".format(heading_font))
         if heading_size is None:
             heading_size = defaults.textscreen_heading_size
@@ -122,10 +119,7 @@ class TextScreen(Visual):
             self._text_font = find_font(text_font)
         else:
             self._text_font = find_font(_internals.active_exp.text_font)
-        try:
-            with open(self._text_font, 'rb') as f:
-                pygame.font.Font(f, 10)
-        except Exception:
+        if not _fonts.check_font(self._text_font):
             raise OSError("Font '{0}' not found!".format(text_font))
         if text_size is None:
             self._text_size = defaults.textscreen_text_size
@@ -190,11 +184,13 @@ class TextScreen(Visual):
     def heading(self, value):
         """Setter for heading."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "heading"))
         else:
             self._heading = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text(self):
@@ -206,11 +202,13 @@ class TextScreen(Visual):
     def text(self, value):
         """Setter for text."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "text"))
         else:
             self._text = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_font(self):
@@ -222,11 +220,13 @@ class TextScreen(Visual):
     def text_font(self, value):
         """Setter for text_font."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "text_font"))
         else:
             self._text_font = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_size(self):
@@ -238,11 +238,13 @@ class TextScreen(Visual):
     def text_size(self, value):
         """Setter for text_size."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "text_size"))
         else:
             self._text_size = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_bold(self):
@@ -254,11 +256,13 @@ class TextScreen(Visual):
     def text_bold(self, value):
         """Setter for text_bold."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "text_bold"))
         else:
             self._text_bold = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_italic(self):
@@ -270,11 +274,13 @@ class TextScreen(Visual):
     def text_italic(self, value):
         """Setter for text_italic."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "text_italic"))
         else:
             self._text_italic = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_underline(self):
@@ -286,11 +292,13 @@ class TextScreen(Visual):
     def text_underline(self, value):
         """Setter for text_underline."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "text_underline"))
         else:
             self._text_underline = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def text_colour(self):
@@ -302,11 +310,13 @@ class TextScreen(Visual):
     def text_colour(self, value):
         """Setter for text_colour."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "text_colour"))
         else:
             self._text_colour = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def heading_font(self):
@@ -318,11 +328,13 @@ class TextScreen(Visual):
     def heading_font(self, value):
         """Setter for heading_font."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "heading_font"))
         else:
             self._heading_font = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def heading_size(self):
@@ -334,11 +346,13 @@ class TextScreen(Visual):
     def heading_size(self, value):
         """Setter for heading_size."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "heading_size"))
         else:
             self._heading_size = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def heading_bold(self):
@@ -350,11 +364,13 @@ class TextScreen(Visual):
     def heading_bold(self, value):
         """Setter for heading_bold."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "heading_bold"))
         else:
             self._heading_bold = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def heading_italic(self):
@@ -366,11 +382,13 @@ class TextScreen(Visual):
     def heading_italic(self, value):
         """Setter for heading_italic."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "heading_italic"))
         else:
             self._heading_italic = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def heading_underline(self):
@@ -382,11 +400,13 @@ class TextScreen(Visual):
     def heading_underline(self, value):
         """Setter for heading_underline."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "heading_underline"))
         else:
             self._heading_underline = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def heading_colour(self):
@@ -398,11 +418,13 @@ class TextScreen(Visual):
     def heading_colour(self, value):
         """Setter for heading_colour."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "heading_colour"))
         else:
             self._heading_colour = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def background_colour(self):
@@ -414,11 +436,13 @@ class TextScreen(Visual):
     def background_colour(self, value):
         """Setter for background_colour."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "background_colour"))
         else:
             self._background_colour = value
+            if self._mutable:
+                self._rerender()
 
     @property
     def size(self):
@@ -430,11 +454,13 @@ class TextScreen(Visual):
     def size(self, value):
         """Setter for size."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "size"))
         else:
             self._size = value
+            if self._mutable:
+                self._rerender(in_place=False)
 
     @property
     def text_justification(self):
@@ -446,11 +472,13 @@ class TextScreen(Visual):
     def text_justification(self, value):
         """Setter for text_justification."""
 
-        if self.has_surface:
+        if self.has_surface and not self._mutable:
             raise AttributeError(TextScreen._getter_exception_message.format(
                 "text_justification"))
         else:
             self._text_justification = value
+            if self._mutable:
+                self._rerender()
 
     def _create_surface(self):
         """Create the surface of the stimulus."""
@@ -476,8 +504,9 @@ class TextScreen(Visual):
                       size=(self.size[0], self.size[1] - self.size[1] // 5),
                       text_justification=self.text_justification)
         Stimulus._id_counter -= 1
-        surface.blit(header._get_surface(),
-                     (self.size[0] // 2 - header.surface_size[0] // 2,
+        header_surface = header._get_surface()
+        surface.blit(header_surface,
+                     (self.size[0] // 2 - header_surface.get_width() // 2,
                       0))
         surface.blit(box._get_surface(),
                      (self.size[0] // 2 - box.size[0] // 2, self.size[1] // 5))
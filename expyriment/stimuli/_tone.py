@@ -8,39 +8,126 @@ This module contains a class implementing a tone stimulus.
 __author__ = 'Florian Krause <florian@expyriment.org>, \
 Oliver Lindemann <oliver@expyriment.org>'
 
-import itertools
-import math
 import os
-import shutil
-import struct
 import tempfile
 import wave
+from collections import OrderedDict
+
+import numpy as np
+import pygame
 
 from . import defaults
 from ._audio import Audio
+from ._stimulus import Stimulus
+
+_buffers = OrderedDict()  # (frequencies, duration, amplitude, ramp,
+                          #  samplerate, size, channels): samples
+
+
+def _synthesise(frequencies, duration, amplitude, ramp, samplerate, size,
+                channels):
+    """Return the (shared) samples of a sine tone or chord.
+
+    Parameters
+    ----------
+    frequencies : tuple of float
+        frequencies of the sine tones
+    duration : float
+        duration in seconds
+    amplitude : float
+        amplitude (0 to 1)
+    ramp : float
+        duration of the on and off ramps in seconds
+    samplerate : int
+        sample rate
+    size : int
+        sample size in bits (pygame.mixer convention: negative values are
+        signed integers, positive values unsigned integers and 32 is float);
+        24-bit samples are stored in 32-bit integers
+    channels : int
+        number of channels
+
+    Returns
+    -------
+    samples : numpy.ndarray
+        the samples, which must not be modified; one-dimensional for one
+        channel, otherwise with shape (n_samples, channels)
+
+    """
+
+    key = (frequencies, duration, amplitude, ramp, samplerate, size,
+           channels)
+    samples = _buffers.get(key)
+    if samples is not None:
+        _buffers.move_to_end(key)
+        return samples
+
+    n_samples = int(duration * samplerate)
+    phase = np.arange(n_samples) * (2.0 * np.pi / samplerate)
+    signal = np.zeros(n_samples)
+    for frequency in frequencies:
+        signal += np.sin(phase * frequency)
+    signal *= float(amplitude) / len(frequencies)
+    n_ramp = min(int(ramp * samplerate), n_samples // 2)
+    if n_ramp > 0:
+        envelope = np.sin(np.linspace(0, np.pi / 2, n_ramp)) ** 2
+        signal[:n_ramp] *= envelope
+        signal[n_samples - n_ramp:] *= envelope[::-1]
+
+    if size == 32:
+        samples = signal.astype(np.float32)
+    else:
+        bits = abs(size)
+        max_amplitude = float(2 ** (bits - 1) - 1)
+        samples = (signal * max_amplitude).astype(np.int64)
+        if size > 0:
+            samples += 2 ** (bits - 1)
+        samples = samples.astype("{0}{1}".format("u" if size > 0 else "i",
+                                                 4 if bits == 24 else
+                                                 bits // 8))
+    if channels > 1:
+        samples = np.repeat(samples[:, np.newaxis], channels, axis=1)
+    samples.flags.writeable = False
+
+    _buffers[key] = samples
+    while len(_buffers) > max(1, defaults.tone_cache_size):
+        _buffers.popitem(last=False)
+    return samples
 
 
 class Tone(Audio):
-    """A class implementing a tone stimulus."""
+    """A class implementing a tone stimulus.
+
+    The samples of the tone are synthesised in memory at the sample rate,
+    sample size and number of channels of the audio system. Samples are
+    cached (see stimuli.defaults.tone_cache_size), such that tones with the
+    same parameters are synthesised only once.
+
+    """
 
     _getter_exception_message = "Cannot set {0} if preloaded!"
 
     def __init__(self, duration, frequency=None, samplerate=None,
-                 bitdepth=None, amplitude=None):
+                 bitdepth=None, amplitude=None, ramp=None):
         """Create a Tone.
 
         Parameters
         ----------
         duration : str
             duration of the file in ms
-        frequency : int, optional
-            frequency of the sine tone
+        frequency : int or list of int, optional
+            frequency of the sine tone; a list of frequencies creates a
+            chord of sine tones with equal amplitudes
         samplerate : int, optional
-            samplerate of the sine tone
+            samplerate of the sine tone when saved to a file (playback uses
+            the samplerate of the audio system)
         bitdepth : int, optional
-            bitdeth of the sine tone
+            bitdeth of the sine tone when saved to a file (playback uses
+            the bitdepth of the audio system)
         amplitude : int, optional
-            amplitude of the sine tone
+            amplitude of the sine tone (or of the sum of all sine tones)
+        ramp : int, optional
+            duration of the raised-cosine on and off ramps in ms
 
         """
 
@@ -53,13 +140,68 @@ class Tone(Audio):
         self._samplerate = samplerate
         if bitdepth is None:
             bitdepth = defaults.tone_bitdepth
+        self._check_bitdepth(bitdepth)
         self._bitdepth = bitdepth
         if amplitude is None:
             amplitude = defaults.tone_amplitude
         self._amplitude = amplitude
-        filename = self._create_sine_wave()
-        Audio.__init__(self, filename)
+        if ramp is None:
+            ramp = defaults.tone_ramp
+        self._ramp = ramp / 1000.0
+        Stimulus.__init__(self, self._get_log_name())
+        self._filename = None
+        self._streaming = False
+        self._file = None
+        self._sound = None
+        self._is_preloaded = False
+        self._channel = None
+        self._is_paused = False
+        self._start_position = 0
+        self._start_time = 0
+        self._paused_time = 0
+
+    def __del__(self):
+        """Remove the temporary file when the object is deconstructed."""
+
+        try:
+            self._remove_file()
+        except Exception:
+            pass
 
+    @staticmethod
+    def _check_bitdepth(bitdepth):
+        if bitdepth not in (8, 16, 24, 32):
+            raise ValueError(
+                "Tone bitdepth must be 8, 16, 24 or 32, not {0}!".format(
+                    bitdepth))
+
+    def _remove_file(self):
+        """Remove the temporary file of the tone (if it has been saved)."""
+
+        if self._filename is not None:
+            filename = self._filename
+            self._filename = None
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    @property
+    def filename(self):
+        """Getter for filename.
+
+        The sine tone is saved to a temporary file on first access.
+
+        """
+
+        if self._filename is None:
+            fid, filename = tempfile.mkstemp(
+                dir=defaults.tempdir, prefix=self._get_log_name() + "_",
+                suffix=".wav")
+            os.close(fid)
+            self.save(filename)
+            self._filename = filename
+        return self._filename
 
     @property
     def duration(self):
@@ -76,7 +218,7 @@ class Tone(Audio):
                 "duration"))
         else:
             self._duration = value / 1000.0
-            self._filename = self._create_sine_wave()
+            self._remove_file()
 
     @property
     def frequency(self):
@@ -93,7 +235,7 @@ class Tone(Audio):
                 "frequency"))
         else:
             self._frequency = value
-            self._filename = self._create_sine_wave()
+            self._remove_file()
 
     @property
     def samplerate(self):
@@ -110,7 +252,7 @@ class Tone(Audio):
                 "samplerate"))
         else:
             self._samplerate = value
-            self._filename = self._create_sine_wave()
+            self._remove_file()
 
     @property
     def bitdepth(self):
@@ -126,8 +268,9 @@ class Tone(Audio):
             raise AttributeError(Audio._getter_exception_message.format(
                 "bitdepth"))
         else:
+            self._check_bitdepth(value)
             self._bitdepth = value
-            self._filename = self._create_sine_wave()
+            self._remove_file()
 
     @property
     def amplitude(self):
@@ -144,44 +287,48 @@ class Tone(Audio):
                 "amplitude"))
         else:
             self._amplitude = value
-            self._filename = self._create_sine_wave()
-
-    def _grouper(self, n, iterable, fillvalue=None):
-        """Write in chunks."""
-
-        args = [iter(iterable)] * n
-        return itertools.zip_longest(fillvalue=fillvalue, *args)
-
-    def _create_sine_wave(self):
-        """Create the sine wave."""
-
-        period = int(self._samplerate / self._frequency)
-        lookup_table = [float(self._amplitude) * \
-                        math.sin(2.0 * math.pi * float(self._frequency) * \
-                                 (float(i % period) / float(self._samplerate))) \
-                        for i in range(period)]
-        sine = (lookup_table[i % period] for i in itertools.count(0))
-        channels = ((sine,),)
-        n_samples = int(self._duration * self._samplerate)
-        samples = itertools.islice(zip(
-            *(map(sum, zip(*channel)) \
-              for channel in channels)), n_samples)
-        fid, filename = tempfile.mkstemp(dir=defaults.tempdir,
-                        prefix="freq{0}_dur{1}_".format(self.frequency,
-                                                       self.duration),
-                        suffix=".wav")
-        os.close(fid)
-        w = wave.open(filename, 'w')
-        w.setparams((1, self._bitdepth // 8, self._samplerate, n_samples, 'NONE',
-                     'not compressed'))
-        max_amplitude = float(int((2 ** (self._bitdepth)) / 2) - 1)
-        for chunk in self._grouper(2048, samples):
-            frames = b''.join(b''.join(struct.pack(
-                b'h', int(max_amplitude * sample)) for sample in channels) \
-                for channels in chunk if channels is not None)
-            w.writeframesraw(frames)
-        w.close()
-        return filename
+            self._remove_file()
+
+    @property
+    def ramp(self):
+        """Getter for ramp."""
+
+        return self._ramp * 1000.0
+
+    @ramp.setter
+    def ramp(self, value):
+        """Setter for ramp."""
+
+        if self.is_preloaded:
+            raise AttributeError(Audio._getter_exception_message.format(
+                "ramp"))
+        else:
+            self._ramp = value / 1000.0
+            self._remove_file()
+
+    def _get_log_name(self):
+        return "freq{0}_dur{1}".format(self._frequency, self.duration)
+
+    def _get_frequencies(self):
+        try:
+            return tuple(float(f) for f in self._frequency)
+        except TypeError:
+            return (float(self._frequency),)
+
+    def _get_samples(self, samplerate, size, channels):
+        """Return the (cached) samples of the tone."""
+
+        return _synthesise(self._get_frequencies(), self._duration,
+                           float(self._amplitude), self._ramp, samplerate,
+                           size, channels)
+
+    def _get_sound_key(self):
+        return ("Tone", self._get_frequencies(), self._duration,
+                float(self._amplitude), self._ramp, pygame.mixer.get_init())
+
+    def _load_sound(self):
+        return pygame.sndarray.make_sound(
+            self._get_samples(*pygame.mixer.get_init()))
 
     def save(self, filename):
         """Save the sine tone to a file.
@@ -193,7 +340,18 @@ class Tone(Audio):
 
         """
 
-        shutil.copy(self._filename, filename)
+        size = self._bitdepth if self._bitdepth == 8 else -self._bitdepth
+        samples = self._get_samples(self._samplerate, size, 1)
+        w = wave.open(filename, 'w')
+        w.setparams((1, self._bitdepth // 8, self._samplerate, len(samples),
+                     'NONE', 'not compressed'))
+        if self._bitdepth == 24:
+            # little-endian int32 without the most significant byte
+            data = samples.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3]
+        else:
+            data = samples.astype(samples.dtype.newbyteorder("<"))
+        w.writeframes(data.tobytes())
+        w.close()
 
 
     @staticmethod
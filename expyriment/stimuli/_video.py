@@ -10,9 +10,15 @@ Oliver Lindemann <oliver@expyriment.org>'
 
 import atexit
 import contextlib
+import hashlib
+import json
 import os
+import tempfile
+import threading
+from collections import OrderedDict
 from types import FunctionType
 
+import numpy as np
 import pygame
 
 from .. import _internals
@@ -32,6 +38,326 @@ def suppress_output():
             yield
 
 
+_video_info_cache = None
+_max_video_infos = 1000  # maximal number of files in the video info cache
+_sounddevice_device_ids = {}
+
+
+def _get_video_info(filename):
+    """Return the metadata of a video file.
+
+    The metadata (currently only the size, taking the rotation of the video
+    into account) is probed only once per file (identified by path,
+    modification time and size) and is stored in the Expyriment settings
+    folder. Entries of outdated versions of a file are removed, and only the
+    most recently probed files are kept (see _max_video_infos).
+
+    Parameters
+    ----------
+    filename : str
+        filename (incl. path) of the video file
+
+    Returns
+    -------
+    info : dict
+        the metadata of the video file
+
+    """
+
+    global _video_info_cache
+    cache_file = os.path.join(_internals.get_settings_folder(),
+                              "video_info_cache.json")
+    if _video_info_cache is None:
+        try:
+            with open(cache_file) as f:
+                _video_info_cache = json.load(f)
+        except Exception:
+            _video_info_cache = {}
+
+    stat = os.stat(filename)
+    path = os.path.abspath(filename)
+    key = "{0}|{1}|{2}".format(path, stat.st_mtime, stat.st_size)
+    if key not in _video_info_cache:
+        from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+        with suppress_output():  # fix for verbose moviepy 2.1.2
+            infos = ffmpeg_parse_infos(filename)
+        size = list(infos["video_size"])
+        if abs(infos.get("video_rotation", 0)) % 180 == 90:
+            size = size[::-1]
+        for old_key in [k for k in _video_info_cache
+                        if k.rsplit("|", 2)[0] == path]:
+            del _video_info_cache[old_key]
+        while len(_video_info_cache) >= _max_video_infos:
+            del _video_info_cache[next(iter(_video_info_cache))]
+        _video_info_cache[key] = {"size": size}
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(cache_file, "w") as f:
+                json.dump(_video_info_cache, f)
+        except Exception:
+            pass
+    return _video_info_cache[key]
+
+
+def _get_sounddevice_device_id(device_name):
+    """Return the sounddevice output device id for a Pygame device name.
+
+    The device id is only searched for once per process.
+
+    Parameters
+    ----------
+    device_name : str
+        the name of the audio device (as used by Pygame)
+
+    Returns
+    -------
+    device_id : int or None
+        the device id (None if no matching device was found)
+
+    """
+
+    import sounddevice as _sounddevice
+    key = (device_name, _sounddevice.default.hostapi)
+    if key not in _sounddevice_device_ids:
+        device_id = None
+        # get devices that sounddevice knows
+        devices = _sounddevice.query_devices()
+        # only consider devices of default audio api
+        devices = [x for x in devices \
+                   if x["hostapi"] == _sounddevice.default.hostapi]
+        # only consider output devices
+        devices = [x for x in devices \
+                   if x["max_output_channels"] > 0]
+        # find device that best corresponds to the one Pygame uses
+        for device in devices:
+            tmp = sorted([device["name"], device_name], key=len)
+            # allow for a mismatch of up to 1 character
+            # (":" vs. "," on Linux)
+            if len([x for c,x in enumerate(tmp[0]) \
+                    if tmp[1][c] != x]) <= 1:
+                device_id = device["index"]
+        _sounddevice_device_ids[key] = device_id
+    return _sounddevice_device_ids[key]
+
+
+class _FrameQueue:
+    """A bounded queue of video frames that are decoded ahead of time.
+
+    Frames are decoded by a background thread and handed out by
+    ``get_frame``, which replaces the ``get_frame`` method of the clip the
+    decoder renders from.
+
+    """
+
+    def __init__(self, clip, size):
+        """Create a frame queue and start decoding.
+
+        Parameters
+        ----------
+        clip : moviepy.VideoClip
+            the clip to decode frames from
+        size : int
+            the number of frames to decode ahead
+
+        """
+
+        self._get_frame = clip.get_frame
+        self._fps = clip.fps
+        self._duration = clip.duration
+        self._size = size
+        self._frames = OrderedDict()
+        self._next_frame = 0
+        self._decoding = None
+        self._requested = -1
+        self._generation = 0
+        self._running = True
+        self._condition = threading.Condition()
+        self.decode_time = 0.0
+        self.n_decoded = 0
+        self.late_frames = 0
+        self._thread = threading.Thread(target=self._decode)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def depth(self):
+        """Getter for the number of frames that are decoded ahead."""
+
+        with self._condition:
+            return len(self._frames)
+
+    def _can_decode(self):
+        """Check whether the next frame can be decoded (or to stop)."""
+
+        if not self._running:
+            return True
+        return len(self._frames) < self._size and \
+            (self._next_frame / self._fps < self._duration or
+             self._next_frame <= self._requested)
+
+    def _decode(self):
+        """Decode frames until the queue is full (background thread)."""
+
+        while True:
+            with self._condition:
+                self._condition.wait_for(self._can_decode)
+                if not self._running:
+                    return
+                frame_no = self._next_frame
+                generation = self._generation
+                self._next_frame += 1
+                self._decoding = frame_no
+            start = get_time()
+            frame = self._get_frame(frame_no / self._fps)
+            decode_time = get_time() - start
+            with self._condition:
+                self.decode_time += decode_time
+                self.n_decoded += 1
+                self._decoding = None
+                if generation == self._generation:
+                    self._frames[frame_no] = frame
+                self._condition.notify_all()
+
+    def get_frame(self, t):
+        """Get the frame for a certain time.
+
+        Blocks until the frame is decoded, if it is not available yet.
+
+        Parameters
+        ----------
+        t : float
+            the time of the frame (in seconds)
+
+        """
+
+        frame_no = int(t * self._fps + 0.00001)
+        with self._condition:
+            if not self._running:
+                return self._get_frame(t)
+            self._requested = frame_no
+            for n in [n for n in self._frames if n < frame_no]:
+                del self._frames[n]
+            if frame_no not in self._frames:
+                self.late_frames += 1
+                if frame_no not in (self._decoding, self._next_frame):
+                    # Seeking; restart decoding at requested frame
+                    self._generation += 1
+                    self._frames.clear()
+                    self._next_frame = frame_no
+                self._condition.notify_all()
+                self._condition.wait_for(
+                    lambda: frame_no in self._frames or not self._running)
+                if not self._running:
+                    return self._get_frame(t)
+            frame = self._frames.pop(frame_no)
+            self._condition.notify_all()
+            return frame
+
+    def stop(self):
+        """Stop decoding."""
+
+        with self._condition:
+            self._running = False
+            self._frames.clear()
+            self._condition.notify_all()
+
+
+class _FrameCache:
+    """Video frames that are decoded once and memory-mapped from a file.
+
+    The frames are stored at their final resolution and orientation in a
+    (NumPy) file, which is reused by all later preloads of the same video
+    file with the same resizing.
+
+    """
+
+    _file_digests = {}
+
+    def __init__(self, clip, filename, directory, target_resolution,
+                 mirrored):
+        """Load (and if needed create) the frame cache of a video clip.
+
+        Parameters
+        ----------
+        clip : moviepy.VideoClip
+            the (resized and mirrored) clip to decode frames from
+        filename : str
+            the filename of the video file
+        directory : str
+            the directory to store the frame cache in
+        target_resolution : (int, int)
+            the target resolution the clip has been resized to
+        mirrored : bool
+            whether the clip has been mirrored
+
+        """
+
+        resolution = ["auto" if x is None else x for x in target_resolution]
+        cache_file = os.path.join(directory, "{0}_{1}x{2}{3}.npy".format(
+            _FrameCache.file_digest(filename), resolution[0], resolution[1],
+            "_mirrored" if mirrored else ""))
+        if not os.path.isfile(cache_file):
+            os.makedirs(directory, exist_ok=True)
+            _FrameCache._decode(clip, cache_file)
+        self._frames = np.load(cache_file, mmap_mode="r")
+        self._fps = clip.fps
+
+    @staticmethod
+    def file_digest(filename):
+        """Return the secure hash (sha1) of a file.
+
+        Hashes are remembered for each path, modification time and size.
+
+        """
+
+        stat = os.stat(filename)
+        key = (os.path.abspath(filename), stat.st_mtime, stat.st_size)
+        if key not in _FrameCache._file_digests:
+            sha = hashlib.sha1()
+            with open(filename, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha.update(chunk)
+            _FrameCache._file_digests[key] = sha.hexdigest()
+        return _FrameCache._file_digests[key]
+
+    @staticmethod
+    def _decode(clip, cache_file):
+        """Decode all frames of a clip into a cache file."""
+
+        n_frames = max(1, int(clip.duration * clip.fps))
+        tmp_file = cache_file + ".part"
+        frames = None
+        for n in range(n_frames):
+            frame = clip.get_frame(n / clip.fps)
+            if frames is None:
+                frames = np.lib.format.open_memmap(
+                    tmp_file, mode="w+", dtype=np.uint8,
+                    shape=(n_frames,) + frame.shape)
+            frames[n] = frame
+        frames.flush()
+        del frames
+        os.replace(tmp_file, cache_file)
+
+    @property
+    def n_frames(self):
+        """Getter for the number of cached frames."""
+
+        return len(self._frames)
+
+    def get_frame(self, t):
+        """Get the frame for a certain time.
+
+        Parameters
+        ----------
+        t : float
+            the time of the frame (in seconds)
+
+        """
+
+        frame_no = int(t * self._fps + 0.00001)
+        return self._frames[max(0, min(frame_no, len(self._frames) - 1))]
+
+
 class Video(_visual.Stimulus):
     """A class implementing a general video stimulus.
 
@@ -68,7 +394,7 @@ class Video(_visual.Stimulus):
             pass
 
     def __init__(self, filename, resizing=None, audio_backend=None,
-                 position=None):
+                 position=None, read_ahead=None, frame_cache=None):
         """Create a video stimulus.
 
         Parameters
@@ -103,6 +429,17 @@ class Video(_visual.Stimulus):
             audio backend to use (one of "pygame" or "sounddevice")
         position : (int, int), optional
             position of the stimulus
+        read_ahead : int, optional
+            number of frames to decode ahead in a background thread
+            (0 = decode each frame only when it is due)
+        frame_cache : bool or str, optional
+            Determines whether all frames should be decoded once upon
+            preloading and then be read from a memory-mapped file (useful for
+            short videos that are played repeatedly).
+                `False` - No frame cache
+                `True`  - Frame cache in the temporary folder of the session
+                          (or of the system, if the former does not exist)
+                str     - Frame cache in the given (persistent) folder
 
         """
 
@@ -119,6 +456,11 @@ class Video(_visual.Stimulus):
         self._audio_started = False
         self._start_position = 0
         self._pause_position = 0
+        self._ogl_screens = []
+        self._ogl_screen_index = 0
+        self._frame_queue = None
+        self._frame_cache_frames = None
+        self._frame_condition = None
 
         if audio_backend is not None:
             self._audio_backend = audio_backend
@@ -132,6 +474,14 @@ class Video(_visual.Stimulus):
             self._position = position
         else:
             self._position = defaults.video_position
+        if read_ahead is not None:
+            self._read_ahead = read_ahead
+        else:
+            self._read_ahead = defaults.video_read_ahead
+        if frame_cache is not None:
+            self._frame_cache = frame_cache
+        else:
+            self._frame_cache = defaults.video_frame_cache
 
         if not(os.path.isfile(self._filename)):
             raise OSError("The video file {0} does not exists".format(
@@ -235,6 +585,34 @@ class Video(_visual.Stimulus):
         else:
             self._position = value
 
+    @property
+    def read_ahead(self):
+        """Getter for read_ahead."""
+
+        return self._read_ahead
+
+    @read_ahead.setter
+    def read_ahead(self, value):
+        if self._is_preloaded:
+            raise AttributeError(Video._getter_exception_message.format(
+                "read_ahead"))
+        else:
+            self._read_ahead = value
+
+    @property
+    def frame_cache(self):
+        """Getter for frame_cache."""
+
+        return self._frame_cache
+
+    @frame_cache.setter
+    def frame_cache(self, value):
+        if self._is_preloaded:
+            raise AttributeError(Video._getter_exception_message.format(
+                "frame_cache"))
+        else:
+            self._frame_cache = value
+
     @property
     def size(self):
         """Getter for size."""
@@ -296,6 +674,28 @@ class Video(_visual.Stimulus):
         if self._is_preloaded:
             return MediaTime(self._file.duration)
 
+    @property
+    def frame_queue_depth(self):
+        """Property to get the number of frames currently decoded ahead."""
+
+        if self._frame_queue is not None:
+            return self._frame_queue.depth
+
+    @property
+    def frame_decode_time(self):
+        """Property to get the average decoding time per frame (in ms)."""
+
+        if self._frame_queue is not None and self._frame_queue.n_decoded > 0:
+            return self._frame_queue.decode_time * 1000 / \
+                self._frame_queue.n_decoded
+
+    @property
+    def late_frames(self):
+        """Property to get the number of frames not decoded ahead in time."""
+
+        if self._frame_queue is not None:
+            return self._frame_queue.late_frames
+
     @property
     def n_frames(self):
         """Property to get the number of frames of the video."""
@@ -372,23 +772,7 @@ class Video(_visual.Stimulus):
                 import sounddevice as _sounddevice
                 default_device = control_defaults.audiosystem_device
                 if default_device is not None:
-                    device_id = None
-                    # get devices that sounddevice knows
-                    devices = _sounddevice.query_devices()
-                    # only consider devices of default audio api
-                    devices = [x for x in devices \
-                               if x["hostapi"] == _sounddevice.default.hostapi]
-                    # only consider output devices
-                    devices = [x for x in devices \
-                               if x["max_output_channels"] > 0]
-                    # find device that best corresponds to the one Pygame uses
-                    for device in devices:
-                        tmp = sorted([device["name"], default_device], key=len)
-                        # allow for a mismatch of up to 1 character
-                        # (":" vs. "," on Linux)
-                        if len([x for c,x in enumerate(tmp[0]) \
-                                if tmp[1][c] != x]) <= 1:
-                            device_id = device["index"]
+                    device_id = _get_sounddevice_device_id(default_device)
                     if device_id is not None:
                         _sounddevice.default.device = None, device_id
 
@@ -401,9 +785,7 @@ class Video(_visual.Stimulus):
                 if self._resizing is False:
                     target_res = (None, None)
                 elif isinstance(self._resizing, (int, float, bool)):
-                    with suppress_output():  # fix for verbose moviepy 2.1.2
-                        video_size = Decoder(mediafile=self._filename,
-                                             play_audio=False).clip.size
+                    video_size = _get_video_info(self._filename)["size"]
                     if self._resizing is True:
                         x_diff = video_size[0] - screen_size[0]
                         y_diff = video_size[1] - screen_size[1]
@@ -423,9 +805,8 @@ class Video(_visual.Stimulus):
                 if (self._resizing[0] is None and self._resizing[1] is None) \
                 or any(isinstance(x, float) for x in self._resizing) \
                         or False in self._resizing:
-                        with suppress_output():  # fix for verbose moviepy 2.1.2
-                            video_size = Decoder(mediafile=self._filename,
-                                                 play_audio=False).clip.size
+                        video_size = _get_video_info(
+                            self._filename)["size"]
                 if self._resizing[0] is None and self._resizing[1] is None:
                     x_diff = video_size[0] - screen_size[0]
                     y_diff = video_size[1] - screen_size[1]
@@ -468,8 +849,36 @@ class Video(_visual.Stimulus):
                 else:
                     import moviepy.video.fx.all as vfx
                     self._file.clip = vfx.mirror_y(self._file.clip)
+            if self._frame_cache is True:
+                frame_cache_dir = defaults.tempdir
+                if frame_cache_dir is None:  # session folder not created
+                    frame_cache_dir = tempfile.gettempdir()
+            elif self._frame_cache:
+                frame_cache_dir = self._frame_cache
+            else:
+                frame_cache_dir = None
+            if frame_cache_dir is not None:
+                self._frame_cache_frames = _FrameCache(
+                    self._file.clip, self._filename, frame_cache_dir,
+                    target_res, bool(_internals.active_exp._screen.opengl))
+                self._file.clip.get_frame = \
+                    self._frame_cache_frames.get_frame
+                # Frames are not decoded anymore; stop ffmpeg video reader
+                reader = getattr(self._file.clip, "reader", None)
+                if reader is not None:
+                    try:
+                        reader.close()
+                    except Exception:
+                        pass
+            elif self._read_ahead > 0:
+                self._frame_queue = _FrameQueue(self._file.clip,
+                                                self._read_ahead)
+                self._file.clip.get_frame = self._frame_queue.get_frame
+            self._frame_condition = threading.Condition()
 
             size = self._file.clip.size
+            if _internals.active_exp._screen.opengl:
+                self._create_ogl_screens(size)
 
             screen_size = _internals.active_exp.screen.surface.get_size()
             self._pos = [screen_size[0] // 2 - size[0] // 2 +
@@ -499,9 +908,15 @@ class Video(_visual.Stimulus):
         start = get_time()
         if self._is_preloaded:
             self.stop()
+            if self._frame_queue is not None:
+                self._frame_queue.stop()
+                self._frame_queue = None
+            self._frame_cache_frames = None
+            self._frame_condition = None
             del self._file
             self._file = None
             self._surface = None
+            self._ogl_screens = []
             self._is_preloaded = False
 
         return int((get_time() - start) * 1000)
@@ -546,6 +961,8 @@ class Video(_visual.Stimulus):
                 self._audio_started = False
             self.pause()
         elif not self.is_playing:
+            if _internals.active_exp.prefetcher is not None:
+                _internals.active_exp.prefetcher.stimulus_presented(self)
             if not self._is_preloaded:
                 self.preload()
             if self._logging:
@@ -787,13 +1204,54 @@ class Video(_visual.Stimulus):
                     MediaTime.convert_to_seconds(duration)
             self.seek(pos)
 
+    def _create_ogl_screens(self, size):
+        """Create the OpenGL textures that video frames are streamed into.
+
+        Frames are uploaded in place (alternating between the textures when
+        more than one is used), instead of creating a new texture per frame.
+
+        Parameters
+        ----------
+        size : (int, int)
+            the size of the video frames
+
+        """
+
+        blank = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        self._ogl_screens = [
+            _visual._LaminaPanelSurface(blank, quadDims=(1,1,1,1),
+                                        position=self._position)
+            for _ in range(max(1, defaults.video_texture_buffers))]
+        self._ogl_screen_index = 0
+
     def _update_surface(self, frame):
         """Update surface with newly available video frame."""
 
         if not self._surface_locked and self.frame is not None and \
                 self.frame > self._frame:
-            self._surface = frame
-            self._new_frame_available = True
+            with self._frame_condition:
+                self._surface = frame
+                self._new_frame_available = True
+                self._frame_condition.notify_all()
+
+    def _wait_for_new_frame(self, timeout):
+        """Block until a new video frame is available to render.
+
+        Parameters
+        ----------
+        timeout : float
+            maximal time to wait (in seconds)
+
+        Returns
+        -------
+        available : bool
+            whether a new frame is available
+
+        """
+
+        with self._frame_condition:
+            return self._frame_condition.wait_for(
+                lambda: self._new_frame_available, timeout)
 
     def present(self, log_event_tag=None):
         """Present next available frame.
@@ -833,12 +1291,10 @@ class Video(_visual.Stimulus):
         if not self.is_playing:
             self.play(log_event_tag)
 
-        while True:
-            if self.new_frame_available:
+        while self.is_playing and self._frame < self.n_frames:
+            if self._wait_for_new_frame(timeout=1.0 / self.fps):
                 self.update()
                 break
-            elif self._frame >= self.n_frames:
-                break
 
         return (Clock.monotonic_time() - start) * 1000
 
@@ -883,11 +1339,20 @@ class Video(_visual.Stimulus):
             self._surface_locked = False
             self._new_frame_available = False
         else:
-            ogl_screen = _visual._LaminaPanelSurface(
-                self._surface, quadDims=(1,1,1,1), position=self._position)
+            if self._new_frame_available:
+                size = (self._surface.shape[1], self._surface.shape[0])
+                if not self._ogl_screens or \
+                        tuple(self._ogl_screens[0]._winsize) != size:
+                    self._create_ogl_screens(size)
+                else:
+                    self._ogl_screen_index = (self._ogl_screen_index + 1) % \
+                        len(self._ogl_screens)
+                self._ogl_screens[self._ogl_screen_index].update(
+                    self._surface)
             self._surface_locked = False
             self._new_frame_available = False
-            ogl_screen.display()
+            if self._ogl_screens:
+                self._ogl_screens[self._ogl_screen_index].display()
         _internals.active_exp._screen.update(blocking)
 
     def _wait(self, time=None, callback_function=None,
@@ -939,7 +1404,8 @@ class Video(_visual.Stimulus):
             if _internals.skip_wait_methods:
                 return None
 
-            if self.new_frame_available:
+            # Short timeout, to keep processing callbacks and control events
+            if self._wait_for_new_frame(timeout=0.001):
                 self.update()
 
             if isinstance(callback_function, FunctionType):
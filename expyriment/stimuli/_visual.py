@@ -6,11 +6,17 @@ __author__ = 'Florian Krause <florian@expyriment.org>, \
 Oliver Lindemann <oliver@expyriment.org>'
 
 import copy
+import hashlib
 import itertools
+import multiprocessing
 import os
+import pickle
 import random
+import sys
 import tempfile
 from abc import ABC
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 import pygame
 
@@ -33,6 +39,23 @@ from ._stimulus import Stimulus
 
 random.seed()
 
+_TextureData = namedtuple("_TextureData", ["data", "internal_format",
+                                           "pixel_format", "width", "height",
+                                           "alignment", "row_length",
+                                           "flipped"])
+_upload_fences = {}  # texture: OpenGL sync object of pending upload
+
+
+def _discard_upload_fence(txtr):
+    """Delete the sync object of a pending upload of a deleted texture."""
+
+    fence = _upload_fences.pop(txtr, None)
+    if fence is not None:
+        try:
+            ogl.glDeleteSync(fence)
+        except Exception:
+            pass
+
 
 class _LaminaPanelSurface:
     """A class implementing an OpenGL surface."""
@@ -41,7 +64,7 @@ class _LaminaPanelSurface:
     # (https://pypi.org/project/Lamina/) with some modifications to fit it
     # into expyriment (e.g. positioning)
     def __init__(self, surface, quadDims=(-1, 1, 1, 1),
-                 position=(0, 0)):
+                 position=(0, 0), texture_cache=None):
         """initialise new instance.
 
         Parameters
@@ -50,27 +73,25 @@ class _LaminaPanelSurface:
             surface to convert
         quadDims : (int,int), optional
         position : (int,int), optional
+        texture_cache : _TextureCache, optional
+            cache to share the texture with other surfaces of identical
+            content (default = None)
 
         """
 
         if isinstance(surface, pygame.Surface):
-            # Fix for uneven surface sizes
-            surface_size = surface.get_size()
-            if surface_size[0] % 2 == 1:
-                rect = pygame.Rect((0, 0), surface_size)
-                s = pygame.surface.Surface((surface_size[0] + 1, surface_size[1]), pygame.SRCALPHA).convert_alpha()
-                s.blit(surface, rect)
-                surface = s
-            surface_size = surface.get_size()
-            if surface_size[1] % 2 == 1:
-                rect = pygame.Rect((0, 0), surface_size)
-                s = pygame.surface.Surface((surface_size[0], surface_size[1] + 1), pygame.SRCALPHA).convert_alpha()
-                s.blit(surface, rect)
-                surface = s
+            surface = _LaminaPanelSurface._pad_surface(surface)
             self._winsize = surface.get_size()
         else:
             self._winsize = (len(surface[0]), len(surface))
-        self._txtr = Visual._load_texture(surface)
+        self._texture_cache = texture_cache
+        self._cache_key = None
+        texture_data = Visual._texture_data(surface)
+        self._flipped = texture_data.flipped
+        if texture_cache is not None:
+            self._cache_key, self._txtr = texture_cache.acquire(texture_data)
+        else:
+            self._txtr = Visual._upload_texture(texture_data)
         self._position = position
         left, top, width, height = quadDims
         right, bottom = left + width, top - height
@@ -79,15 +100,88 @@ class _LaminaPanelSurface:
                      (right, bottom, 0), (left, bottom, 0))
         self.refresh_position()
 
+    @staticmethod
+    def _pad_surface(surface):
+        """Fix for uneven surface sizes."""
+
+        surface_size = surface.get_size()
+        if surface_size[0] % 2 == 1:
+            rect = pygame.Rect((0, 0), surface_size)
+            s = pygame.surface.Surface((surface_size[0] + 1, surface_size[1]), pygame.SRCALPHA).convert_alpha()
+            s.blit(surface, rect)
+            surface = s
+        surface_size = surface.get_size()
+        if surface_size[1] % 2 == 1:
+            rect = pygame.Rect((0, 0), surface_size)
+            s = pygame.surface.Surface((surface_size[0], surface_size[1] + 1), pygame.SRCALPHA).convert_alpha()
+            s.blit(surface, rect)
+            surface = s
+        return surface
+
+    def update(self, surface):
+        """Replace the texture content in place.
+
+        The texture is not reallocated, but overwritten with a sub-image
+        upload. Textures shared via a texture cache cannot be updated.
+
+        Parameters
+        ----------
+        surface : pygame.Surface or numpy.array object
+            surface with the new content (same size as the current one)
+
+        """
+
+        if self._cache_key is not None:
+            raise RuntimeError("Cannot update a shared texture!")
+        if isinstance(surface, pygame.Surface):
+            surface = _LaminaPanelSurface._pad_surface(surface)
+        texture_data = Visual._texture_data(surface)
+        if (texture_data.width, texture_data.height) != \
+                tuple(self._winsize):
+            raise ValueError("Texture size cannot be changed!")
+        ogl.glPixelStorei(ogl.GL_UNPACK_ALIGNMENT, texture_data.alignment)
+        ogl.glPixelStorei(ogl.GL_UNPACK_ROW_LENGTH, texture_data.row_length)
+        ogl.glEnable(ogl.GL_TEXTURE_2D)
+        ogl.glBindTexture(ogl.GL_TEXTURE_2D, self._txtr)
+        ogl.glTexSubImage2D(ogl.GL_TEXTURE_2D, 0, 0, 0, texture_data.width,
+                            texture_data.height, texture_data.pixel_format,
+                            ogl.GL_UNSIGNED_BYTE, texture_data.data)
+        ogl.glDisable(ogl.GL_TEXTURE_2D)
+        ogl.glPixelStorei(ogl.GL_UNPACK_ROW_LENGTH, 0)
+        self._flipped = texture_data.flipped
+
     def __del__(self):
         """Call glDeleteTextures when deconstruction the object."""
 
-        if getattr(self, '_txtr', None) is not None:
+        if getattr(self, '_cache_key', None) is not None:
+            self._texture_cache.release(self._cache_key)
+            self._cache_key = None
+            self._txtr = None
+        elif getattr(self, '_txtr', None) is not None:
+            _discard_upload_fence(self._txtr)
             try:
                 ogl.glDeleteTextures([self._txtr])
             except Exception:
                 pass
 
+    def wait_uploaded(self):
+        """Block until the texture has been transferred to the GPU."""
+
+        Visual._wait_for_upload(self._txtr)
+
+    def __deepcopy__(self, memo):
+        """Deep copy the object (sharing a cached texture)."""
+
+        rtn = self.__class__.__new__(self.__class__)
+        memo[id(self)] = rtn
+        for key, value in self.__dict__.items():
+            if key != "_texture_cache":
+                value = copy.deepcopy(value, memo)
+            setattr(rtn, key, value)
+        if self._cache_key is not None:
+            self._texture_cache.retain(self._cache_key)
+        return rtn
+
     def convertMousePos(self, pos):
         """Convert 2d pixel mouse pos to 2d gl units.
 
@@ -141,29 +235,205 @@ class _LaminaPanelSurface:
     def display(self):
         """Draw surface to a quad."""
 
+        _LaminaPanelSurface.display_batch([self])
+
+    @staticmethod
+    def display_batch(panels):
+        """Draw several surfaces to quads in one pass.
+
+        The OpenGL state is set up only once and textures are only bound
+        when they differ from the one of the previous surface. Surfaces are
+        drawn in the given order.
+
+        Parameters
+        ----------
+        panels : list of _LaminaPanelSurface
+            the surfaces to draw
+
+        """
+
         ogl.glEnable(ogl.GL_BLEND)
         ogl.glBlendFunc(ogl.GL_SRC_ALPHA, ogl.GL_ONE_MINUS_SRC_ALPHA)
         ogl.glEnable(ogl.GL_TEXTURE_2D)
-        ogl.glBindTexture(ogl.GL_TEXTURE_2D, self._txtr)
         ogl.glTexEnvf(ogl.GL_TEXTURE_ENV, ogl.GL_TEXTURE_ENV_MODE,
                       ogl.GL_REPLACE)
-        ogl.glTexParameterfv(ogl.GL_TEXTURE_2D, ogl.GL_TEXTURE_MIN_FILTER,
-                           ogl.GL_LINEAR)
-        ogl.glBegin(ogl.GL_QUADS)
-        ogl.glTexCoord2f(0.0, 1.0)
-        ogl.glVertex3f(*self.dims[0])
-        ogl.glTexCoord2f(1.0, 1.0)
-        ogl.glVertex3f(*self.dims[1])
-        ogl.glTexCoord2f(1.0, 0.0)
-        ogl.glVertex3f(*self.dims[2])
-        ogl.glTexCoord2f(0.0, 0.0)
-        ogl.glVertex3f(*self.dims[3])
-        ogl.glEnd()
+        bound = None
+        for panel in panels:
+            if panel._txtr != bound:
+                ogl.glBindTexture(ogl.GL_TEXTURE_2D, panel._txtr)
+                ogl.glTexParameterfv(ogl.GL_TEXTURE_2D,
+                                     ogl.GL_TEXTURE_MIN_FILTER,
+                                     ogl.GL_LINEAR)
+                bound = panel._txtr
+            # Texture rows are bottom-up when flipped, top-down otherwise
+            top, bottom = (1.0, 0.0) if panel._flipped else (0.0, 1.0)
+            ogl.glBegin(ogl.GL_QUADS)
+            ogl.glTexCoord2f(0.0, top)
+            ogl.glVertex3f(*panel.dims[0])
+            ogl.glTexCoord2f(1.0, top)
+            ogl.glVertex3f(*panel.dims[1])
+            ogl.glTexCoord2f(1.0, bottom)
+            ogl.glVertex3f(*panel.dims[2])
+            ogl.glTexCoord2f(0.0, bottom)
+            ogl.glVertex3f(*panel.dims[3])
+            ogl.glEnd()
         ogl.glDisable(ogl.GL_BLEND)
         ogl.glDisable(ogl.GL_TEXTURE_2D)
     # End of code based on Lamina module
 
 
+class _TextureCache:
+    """A content-addressed cache of OpenGL textures.
+
+    Textures are identified by a hash of their pixel data and size, such that
+    all surfaces with identical content share a single texture. Textures are
+    reference counted and will only be deleted when their last user has
+    released them. If ``stimuli.defaults.visual_texture_cache_budget`` is set,
+    textures that are not in use anymore are kept for later reuse, until the
+    budget is exceeded (least recently used textures will be deleted first).
+
+    """
+
+    def __init__(self):
+        """Create a texture cache."""
+
+        self._textures = OrderedDict()  # key: [texture, users, nbytes]
+        self._nbytes = 0
+        self._generation = 0
+
+    @property
+    def n_textures(self):
+        """Getter for the number of cached textures."""
+
+        return len(self._textures)
+
+    @property
+    def nbytes(self):
+        """Getter for the (estimated) memory of all cached textures."""
+
+        return self._nbytes
+
+    def acquire(self, texture_data):
+        """Get a texture for a surface and register a new user of it.
+
+        Parameters
+        ----------
+        texture_data : _TextureData
+            the texture data of the surface (see Visual._texture_data)
+
+        Returns
+        -------
+        key : tuple
+            the cache key to release the texture with
+        texture : int
+            the texture object
+
+        """
+
+        data = texture_data.data
+        if np is not None and isinstance(data, np.ndarray):
+            data = np.ascontiguousarray(data)
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        key = (texture_data.width, texture_data.height,
+               texture_data.pixel_format, texture_data.row_length,
+               texture_data.flipped, digest)
+        entry = self._textures.get(key)
+        if entry is None:
+            if texture_data.internal_format == ogl.GL_RGB:
+                nbytes = texture_data.width * texture_data.height * 3
+            else:
+                nbytes = texture_data.width * texture_data.height * 4
+            entry = [Visual._upload_texture(texture_data), 0, nbytes]
+            self._textures[key] = entry
+            self._nbytes += nbytes
+        entry[1] += 1
+        self._textures.move_to_end(key)
+        self._evict()
+        return (self._generation, key), entry[0]
+
+    def retain(self, cache_key):
+        """Register an additional user of a cached texture.
+
+        Parameters
+        ----------
+        cache_key : tuple
+            the cache key returned by acquire
+
+        """
+
+        generation, key = cache_key
+        if generation == self._generation and key in self._textures:
+            self._textures[key][1] += 1
+
+    def release(self, cache_key):
+        """Unregister a user of a cached texture.
+
+        Parameters
+        ----------
+        cache_key : tuple
+            the cache key returned by acquire
+
+        """
+
+        generation, key = cache_key
+        entry = self._textures.get(key)
+        if generation != self._generation or entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            entry[1] = 0
+            if defaults.visual_texture_cache_budget is None:
+                self._delete(key)
+            else:
+                self._evict()
+
+    def clear(self, delete_textures=True):
+        """Remove all textures from the cache.
+
+        Textures that are still in use will be deleted when their last user
+        releases them.
+
+        Parameters
+        ----------
+        delete_textures : bool, optional
+            delete unused textures (set to False if the OpenGL context does
+            not exist anymore; default = True)
+
+        """
+
+        if delete_textures:
+            for key in [k for k, v in self._textures.items() if v[1] == 0]:
+                self._delete(key)
+        self._textures = OrderedDict()
+        self._nbytes = 0
+        self._generation += 1
+
+    def _evict(self):
+        """Delete least recently used unused textures exceeding the budget."""
+
+        budget = defaults.visual_texture_cache_budget
+        if budget is None or self._nbytes <= budget:
+            return
+        for key in [k for k, v in self._textures.items() if v[1] == 0]:
+            self._delete(key)
+            if self._nbytes <= budget:
+                break
+
+    def _delete(self, key):
+        """Delete a texture and remove it from the cache."""
+
+        txtr, _users, nbytes = self._textures.pop(key)
+        self._nbytes -= nbytes
+        _discard_upload_fence(txtr)
+        try:
+            ogl.glDeleteTextures([txtr])
+        except Exception:
+            pass
+
+
+_texture_cache = _TextureCache()
+
+
 class Visual(Stimulus, ABC):
     """A class implementing a general visual stimulus.
 
@@ -180,36 +450,133 @@ class Visual(Stimulus, ABC):
     # (https://pypi.org/project/Lamina/) with some modifications to fit it
     # into expyriment (e.g. positioning)
     @staticmethod
-    def _load_texture(surf):
-        """Load surface into texture object.
+    def _texture_data(surf):
+        """Get the pixel data of a surface for creating a texture.
 
-        Returns a texture object.
+        The pixel buffer of 32 bit surfaces with alpha channel is used
+        directly (without copying); other surfaces are converted to RGBA.
+
+        Returns a _TextureData tuple.
 
         Parameters
         ----------
         surf : pygame.Surface or numpy.array object
-            surface to make texture from
+            surface to get the texture data from
 
         """
 
-        txtr = ogl.glGenTextures(1)
         if isinstance(surf, pygame.Surface):
-            textureData = pygame.image.tostring(surf, "RGBA", 1)
-            colours = ogl.GL_RGBA
             width, height = surf.get_size()
-            ogl.glPixelStorei(ogl.GL_UNPACK_ALIGNMENT, 4)
+            pixel_format = Visual._raw_pixel_format(surf)
+            if pixel_format is not None:
+                return _TextureData(
+                    np.frombuffer(surf.get_buffer(), dtype=np.uint8),
+                    ogl.GL_RGBA, pixel_format, width, height, 4,
+                    surf.get_pitch() // 4, False)
+            return _TextureData(pygame.image.tostring(surf, "RGBA", 1),
+                                ogl.GL_RGBA, ogl.GL_RGBA, width, height, 4,
+                                0, True)
         else:
-            textureData = surf
-            if textureData.shape[2] == 3:
+            if surf.shape[2] == 3:
                 colours = ogl.GL_RGB
-            elif textureData.shape[2] == 4:
+            elif surf.shape[2] == 4:
                 colours = ogl.GL_RGBA
-            width, height = len(surf[0]), len(surf)
-            ogl.glPixelStorei(ogl.GL_UNPACK_ALIGNMENT, 1)
+            return _TextureData(surf, colours, colours, len(surf[0]),
+                                len(surf), 1, 0, True)
+
+    @staticmethod
+    def _raw_pixel_format(surf):
+        """Get the OpenGL format of the pixel buffer of a surface.
+
+        Returns None if the pixel buffer cannot be used directly.
+
+        Parameters
+        ----------
+        surf : pygame.Surface
+            the surface
+
+        """
+
+        if np is None or surf.get_bytesize() != 4 or \
+                surf.get_pitch() % 4 != 0:
+            return None
+        shifts = []
+        for mask in surf.get_masks():
+            if mask not in (0xff, 0xff00, 0xff0000, 0xff000000):
+                return None
+            byte = (mask.bit_length() - 1) // 8
+            if sys.byteorder == "big":
+                byte = 3 - byte
+            shifts.append(byte)
+        if shifts == [0, 1, 2, 3]:
+            return ogl.GL_RGBA
+        elif shifts == [2, 1, 0, 3]:
+            return ogl.GL_BGRA
+        return None
+
+    @staticmethod
+    def _load_texture(surf):
+        """Load surface into texture object.
+
+        Returns a texture object.
+
+        Parameters
+        ----------
+        surf : pygame.Surface or numpy.array object
+            surface to make texture from
+
+        """
+
+        return Visual._upload_texture(Visual._texture_data(surf))
+
+    @staticmethod
+    def _upload_texture(texture_data):
+        """Upload texture data into a new texture object.
+
+        If ``stimuli.defaults.visual_async_texture_upload`` is True (and
+        supported), the data is staged through a pixel buffer object and the
+        transfer to the GPU happens asynchronously (see
+        Visual._wait_for_upload).
+
+        Returns a texture object.
+
+        Parameters
+        ----------
+        texture_data : _TextureData
+            the texture data (see Visual._texture_data)
+
+        """
+
+        txtr = ogl.glGenTextures(1)
+        ogl.glPixelStorei(ogl.GL_UNPACK_ALIGNMENT, texture_data.alignment)
+        ogl.glPixelStorei(ogl.GL_UNPACK_ROW_LENGTH, texture_data.row_length)
         ogl.glEnable(ogl.GL_TEXTURE_2D)
         ogl.glBindTexture(ogl.GL_TEXTURE_2D, txtr)
-        ogl.glTexImage2D(ogl.GL_TEXTURE_2D, 0, colours, width, height, 0,
-          colours, ogl.GL_UNSIGNED_BYTE, textureData)
+        pbo = None
+        if defaults.visual_async_texture_upload and \
+                Visual._async_upload_supported():
+            data = texture_data.data
+            if np is not None:
+                data = np.ascontiguousarray(data)
+            pbo = ogl.glGenBuffers(1)
+            ogl.glBindBuffer(ogl.GL_PIXEL_UNPACK_BUFFER, pbo)
+            ogl.glBufferData(ogl.GL_PIXEL_UNPACK_BUFFER,
+                             memoryview(data).nbytes, data,
+                             ogl.GL_STREAM_DRAW)
+            ogl.glTexImage2D(ogl.GL_TEXTURE_2D, 0,
+                             texture_data.internal_format, texture_data.width,
+                             texture_data.height, 0, texture_data.pixel_format,
+                             ogl.GL_UNSIGNED_BYTE, None)
+            ogl.glBindBuffer(ogl.GL_PIXEL_UNPACK_BUFFER, 0)
+            ogl.glDeleteBuffers(1, [pbo])  # released after transfer
+            _upload_fences[txtr] = ogl.glFenceSync(
+                ogl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        else:
+            ogl.glTexImage2D(ogl.GL_TEXTURE_2D, 0,
+                             texture_data.internal_format, texture_data.width,
+                             texture_data.height, 0, texture_data.pixel_format,
+                             ogl.GL_UNSIGNED_BYTE, texture_data.data)
+        ogl.glPixelStorei(ogl.GL_UNPACK_ROW_LENGTH, 0)
         ogl.glTexParameterf(ogl.GL_TEXTURE_2D,
                             ogl.GL_TEXTURE_MAG_FILTER,
                             ogl.GL_NEAREST)
@@ -218,6 +585,38 @@ class Visual(Stimulus, ABC):
                             ogl.GL_NEAREST)
         ogl.glDisable(ogl.GL_TEXTURE_2D)
         return txtr
+
+    @staticmethod
+    def _async_upload_supported():
+        """Check if pixel buffer objects and fences are supported."""
+
+        try:
+            return bool(ogl.glGenBuffers) and bool(ogl.glFenceSync) and \
+                bool(ogl.glClientWaitSync)
+        except Exception:
+            return False
+
+    @staticmethod
+    def _wait_for_upload(txtr=None):
+        """Block until texture uploads have been transferred to the GPU.
+
+        Parameters
+        ----------
+        txtr : int, optional
+            the texture to wait for (default = all pending textures)
+
+        """
+
+        if txtr is None:
+            textures = list(_upload_fences)
+        else:
+            textures = [txtr]
+        for txtr in textures:
+            fence = _upload_fences.pop(txtr, None)
+            if fence is not None:
+                ogl.glClientWaitSync(fence, ogl.GL_SYNC_FLUSH_COMMANDS_BIT,
+                                     ogl.GL_TIMEOUT_IGNORED)
+                ogl.glDeleteSync(fence)
     # End of code based on Lamina module
 
     def __init__(self, position=None, log_comment=None):
@@ -243,6 +642,8 @@ class Visual(Stimulus, ABC):
         self._ogl_screen = None
         self._is_compressed = False
         self._compression_filename = None
+        self._mask_cache = None
+        self._mutable = False
 
         self._was_compressed_before_preload = None
 
@@ -254,6 +655,34 @@ class Visual(Stimulus, ABC):
     _exception_message = "Cannot call {0} on preloaded " \
                                      "or compressed stimulus!"
 
+    @property
+    def mutable(self):
+        """Getter for mutable."""
+
+        return self._mutable
+
+    @mutable.setter
+    def mutable(self, value):
+        """Setter for mutable.
+
+        The properties of a mutable stimulus (e.g. text and style of text
+        stimuli) can be changed after its surface has been created (or after
+        it has been preloaded). The stimulus is then rendered again, and
+        surface and OpenGL texture are updated in place, if the size of the
+        surface does not change.
+
+        """
+
+        self._mutable = bool(value)
+
+    @property
+    def _texture_cache(self):
+        """Getter for the texture cache to use when preloading (or None)."""
+
+        if defaults.visual_texture_cache and not self._mutable:
+            return _texture_cache
+        return None
+
     def __del__(self):
         """ Clear surface and ogl_screen when the objects is deconstructed.
 
@@ -475,8 +904,66 @@ class Visual(Stimulus, ABC):
             return False
         else:
             self._surface = surface
+            self._mask_cache = None
             return True
 
+    def _get_mask(self):
+        """Get the collision mask of the surface.
+
+        The mask is cached as long as the surface does not change.
+
+        """
+
+        if self._surface is not None:
+            key = self._surface
+        elif self.is_compressed:
+            key = self._compression_filename
+        else:
+            key = None  # surface is created anew each time
+        if key is not None and self._mask_cache is not None and \
+                self._mask_cache[0] is key:
+            return self._mask_cache[1]
+        mask = pygame.mask.from_surface(self._get_surface())
+        if key is not None:
+            self._mask_cache = (key, mask)
+        return mask
+
+    def _rerender(self, in_place=True):
+        """Create the surface of a mutable stimulus again.
+
+        If the new surface has the size of the current one, it is drawn onto
+        the current surface and, in OpenGL mode, the texture of a preloaded
+        stimulus is updated in place. Otherwise (or if in_place is False) the
+        surface and the texture are created anew.
+
+        """
+
+        if not (self.has_surface or self.is_preloaded):
+            return  # surface will be created when needed
+        content = self._create_surface()
+        surface = self._surface
+        ogl_screen = self._ogl_screen if self.is_preloaded else None
+        if in_place and surface is not None and \
+                content.get_size() == surface.get_size() and \
+                (ogl_screen is None or ogl_screen._cache_key is None):
+            surface.fill((0, 0, 0, 0))
+            surface.blit(content, (0, 0))
+            self._mask_cache = None
+            if ogl_screen is not None:
+                ogl_screen.update(surface)
+        else:
+            preloaded = self.is_preloaded
+            logging = self._logging
+            self._logging = False
+            self.unload()
+            self._set_surface(content)
+            if preloaded:
+                self.preload(inhibit_ogl_compress=True)
+            self._logging = logging
+        if self._logging:
+            _internals.active_exp._event_file_log(
+                "Stimulus,updated,{0}".format(self.id), 2)
+
     def _get_surface(self):
         """Get the surface."""
 
@@ -511,7 +998,10 @@ class Visual(Stimulus, ABC):
             surface_backup = self._get_surface()
             surface_copy = self._get_surface().copy()
             self._surface = None
+        mask_cache = self._mask_cache
+        self._mask_cache = None
         rtn = Stimulus.copy(self)
+        self._mask_cache = mask_cache
         if has_surface:
             self._surface = surface_backup
             rtn._surface = surface_copy
@@ -523,7 +1013,8 @@ class Visual(Stimulus, ABC):
             if _internals.active_exp.screen.opengl:
                 self._ogl_screen = _LaminaPanelSurface(
                     self._get_surface(),
-                    position=self.position)
+                    position=self.position,
+                    texture_cache=self._texture_cache)
             rtn.preload()
         if is_compressed:
             rtn.compress()
@@ -652,8 +1143,8 @@ class Visual(Stimulus, ABC):
             if other_size[1] % 2 == 0:
                 other_pos[1] += 1
             offset = (-self_pos[0] + other_pos[0], -self_pos[1] + other_pos[1])
-            self_mask = pygame.mask.from_surface(self._get_surface())
-            other_mask = pygame.mask.from_surface(stimulus._get_surface())
+            self_mask = self._get_mask()
+            other_mask = stimulus._get_mask()
             overlap = self_mask.overlap_area(other_mask, offset)
             return overlap > 0 and overlap == self_mask.count()
 
@@ -757,8 +1248,8 @@ class Visual(Stimulus, ABC):
                     other_pos[1] += 1
 
             offset = (-self_pos[0] + other_pos[0], -self_pos[1] + other_pos[1])
-            self_mask = pygame.mask.from_surface(self._get_surface())
-            other_mask = pygame.mask.from_surface(stimulus._get_surface())
+            self_mask = self._get_mask()
+            other_mask = stimulus._get_mask()
             overlap = self_mask.overlap_area(other_mask, offset)
             if overlap > 0:
                 return True, overlap
@@ -767,35 +1258,41 @@ class Visual(Stimulus, ABC):
 
         elif mode == "surface":
             screen_size = _internals.active_exp.screen.surface.get_size()
-            if use_absolute_position:
-                sx, sy = geometry.coordinates_to_position(
-                    self.absolute_position, screen_size)
-                ox, oy = geometry.coordinates_to_position(
-                    stimulus.absolute_position, screen_size)
-            else:
-                sx, sy = geometry.coordinates_to_position(
-                    self.position, screen_size)
-                ox, oy = geometry.coordinates_to_position(
-                    stimulus.position, screen_size)
-            selfrect = pygame.Rect((0, 0), self.surface_size)
-            if self.surface_size[0] % 2 == 0:
-                sx += 1
-            if self.surface_size[1] % 2 == 0:
-                sy += 1
-            selfrect.center = (sx, sy)
-            stimrect = pygame.Rect((0, 0), stimulus.surface_size)
-            if stimulus.surface_size[0] % 2 == 0:
-                ox += 1
-            if stimulus.surface_size[1] % 2 == 0:
-                oy += 1
-            stimrect.right += 1
-            stimrect.bottom += 1
-            stimrect.center = (ox, oy)
+            selfrect = self._surface_rect(screen_size, use_absolute_position)
+            stimrect = stimulus._surface_rect(screen_size,
+                                              use_absolute_position,
+                                              inflate=True)
             if selfrect.colliderect(stimrect):
                 return True, None
             else:
                 return False, None
 
+    def _surface_rect(self, screen_size, use_absolute_position,
+                      inflate=False):
+        """Return the rectangle of the surface for surface mode overlap tests.
+
+        The rectangle of the other stimulus of a test is inflated by one
+        pixel (inflate=True).
+
+        """
+
+        if use_absolute_position:
+            x, y = geometry.coordinates_to_position(self.absolute_position,
+                                                    screen_size)
+        else:
+            x, y = geometry.coordinates_to_position(self.position,
+                                                    screen_size)
+        rect = pygame.Rect((0, 0), self.surface_size)
+        if self.surface_size[0] % 2 == 0:
+            x += 1
+        if self.surface_size[1] % 2 == 0:
+            y += 1
+        if inflate:
+            rect.right += 1
+            rect.bottom += 1
+        rect.center = (x, y)
+        return rect
+
     def overlapping_with_position(self, position, mode="visible",
                                   use_absolute_position=True):
         """Check if stimulus is overlapping with a certain position.
@@ -852,7 +1349,7 @@ class Visual(Stimulus, ABC):
 
             pos = geometry.position_to_coordinates(position, screen_size)
             offset = (int(pos[0] - self_pos[0]), int(pos[1] - self_pos[1]))
-            self_mask = pygame.mask.from_surface(self._get_surface())
+            self_mask = self._get_mask()
             overlap = False
             if 0 <= offset[0] < self_size[0] and 0 <= offset[1] < self_size[1]:
                 overlap = self_mask.get_at(offset)
@@ -879,6 +1376,170 @@ class Visual(Stimulus, ABC):
             p = geometry.coordinates_to_position(position, screen_size)
             return selfrect.collidepoint(p)
 
+    @staticmethod
+    def _collision_data(stimuli, mode, use_absolute_position):
+        """Get screen rectangles (and masks) of stimuli for overlap tests.
+
+        Returns a list of rectangles, a list of rectangles to test them
+        against (identical in visible mode, inflated in surface mode; see
+        `overlapping_with_stimulus`) and a list of mask getters.
+
+        """
+
+        screen_size = _internals.active_exp.screen.surface.get_size()
+        if mode == "surface":
+            rects = [stim._surface_rect(screen_size, use_absolute_position)
+                     for stim in stimuli]
+            other_rects = [stim._surface_rect(screen_size,
+                                              use_absolute_position,
+                                              inflate=True)
+                           for stim in stimuli]
+            return rects, other_rects, None
+
+        rects = []
+        for stim in stimuli:
+            size = stim.surface_size
+            if use_absolute_position:
+                pos = stim.absolute_position
+            else:
+                pos = stim.position
+            x, y = geometry.position_to_coordinates(pos, screen_size)
+            x -= size[0] // 2
+            y -= size[1] // 2
+            if size[0] % 2 == 0:
+                x += 1
+            if size[1] % 2 == 0:
+                y += 1
+            rects.append(pygame.Rect((x, y), size))
+        masks = [stim._get_mask for stim in stimuli]
+        return rects, rects, masks
+
+    @staticmethod
+    def _masks_overlap(rects, masks, a, b):
+        """Check if the masks of two stimuli with colliding rects overlap."""
+
+        if masks is None:
+            return True
+        for idx in (a, b):
+            if callable(masks[idx]):  # get masks only when needed
+                masks[idx] = masks[idx]()
+        offset = (rects[b].x - rects[a].x, rects[b].y - rects[a].y)
+        return masks[a].overlap(masks[b], offset) is not None
+
+    def overlapping_with_stimuli(self, stimuli, mode="visible",
+                                 use_absolute_position=True):
+        """Check if stimulus is overlapping with any of several stimuli.
+
+        Bounding rectangles are tested first, such that pixel based tests
+        are only done for stimuli that are close to each other.
+
+        Parameters
+        ----------
+        stimuli : list of expyriment stimuli
+            the other stimuli
+        mode : mode (str), optional
+            "visible": based on non-transparent pixels or
+            "surface": based on pixels in pygame surface
+            (default = visible")
+        use_absolute_position : bool, optional
+            use absolute_position of stimuli (default) instead of position
+
+        Returns
+        -------
+        overlapping : list of bool
+            for each of the other stimuli, whether it is overlapping
+
+        See Also
+        --------
+        get_overlap_matrix, find_overlapping_pair
+
+        """
+
+        stimuli = list(stimuli)
+        rects, other_rects, masks = Visual._collision_data(
+            [self] + stimuli, mode, use_absolute_position)
+        rtn = [False] * len(stimuli)
+        for idx in rects[0].collidelistall(other_rects[1:]):
+            rtn[idx] = Visual._masks_overlap(rects, masks, 0, idx + 1)
+        return rtn
+
+    @staticmethod
+    def get_overlap_matrix(stimuli, mode="visible",
+                           use_absolute_position=True):
+        """Check for all pairs of several stimuli if they are overlapping.
+
+        Bounding rectangles are tested first, such that pixel based tests
+        are only done for stimuli that are close to each other.
+
+        Parameters
+        ----------
+        stimuli : list of expyriment stimuli
+            the stimuli
+        mode : mode (str), optional
+            "visible": based on non-transparent pixels or
+            "surface": based on pixels in pygame surface
+            (default = visible")
+        use_absolute_position : bool, optional
+            use absolute_position of stimuli (default) instead of position
+
+        Returns
+        -------
+        overlap_matrix : numpy.ndarray
+            symmetric boolean matrix, where element (i, j) denotes whether
+            stimulus i is overlapping with stimulus j (diagonal is False);
+            for i < j, it is the result of
+            ``stimuli[i].overlapping_with_stimulus(stimuli[j])``
+
+        """
+
+        stimuli = list(stimuli)
+        rects, other_rects, masks = Visual._collision_data(
+            stimuli, mode, use_absolute_position)
+        rtn = np.zeros((len(stimuli), len(stimuli)), dtype=bool)
+        for a in range(len(stimuli)):
+            for idx in rects[a].collidelistall(other_rects[a + 1:]):
+                b = a + 1 + idx
+                if Visual._masks_overlap(rects, masks, a, b):
+                    rtn[a, b] = rtn[b, a] = True
+        return rtn
+
+    @staticmethod
+    def find_overlapping_pair(stimuli, mode="visible",
+                              use_absolute_position=True):
+        """Find the first pair of overlapping stimuli.
+
+        Bounding rectangles are tested first, such that pixel based tests
+        are only done for stimuli that are close to each other.
+
+        Parameters
+        ----------
+        stimuli : list of expyriment stimuli
+            the stimuli
+        mode : mode (str), optional
+            "visible": based on non-transparent pixels or
+            "surface": based on pixels in pygame surface
+            (default = visible")
+        use_absolute_position : bool, optional
+            use absolute_position of stimuli (default) instead of position
+
+        Returns
+        -------
+        pair : (int, int) or None
+            the indices of the first overlapping pair of stimuli or None, if
+            no stimuli are overlapping
+
+        """
+
+        stimuli = list(stimuli)
+        rects, other_rects, masks = Visual._collision_data(
+            stimuli, mode, use_absolute_position)
+        for a in range(len(stimuli)):
+            for idx in rects[a].collidelistall(other_rects[a + 1:]):
+                b = a + 1 + idx
+                if Visual._masks_overlap(rects, masks, a, b):
+                    return a, b
+        return None
+
     def plot(self, stimulus):
         """Plot the stimulus on the surface of another stimulus.
 
@@ -982,6 +1643,7 @@ class Visual(Stimulus, ABC):
             pygame.image.save(self._get_surface(), self._compression_filename)
             self._is_compressed = True
             self._surface = None
+            self._mask_cache = None
 
             if self._logging:
                 _internals.active_exp._event_file_log(
@@ -1057,8 +1719,9 @@ class Visual(Stimulus, ABC):
             if _internals.active_exp.screen.opengl:
                 self._ogl_screen = _LaminaPanelSurface(
                     self._get_surface(),
-                    position=self.position)
-                if not inhibit_ogl_compress:
+                    position=self.position,
+                    texture_cache=self._texture_cache)
+                if not inhibit_ogl_compress and not self._mutable:
                     self.compress()
             else:
                 self.decompress()
@@ -1129,6 +1792,27 @@ class Visual(Stimulus, ABC):
 
         return self._is_preloaded
 
+    def wait_uploaded(self):
+        """Wait until the stimulus is completely transferred to the GPU.
+
+        In OpenGL mode, preloading a stimulus may return before its texture
+        has been transferred to the GPU (see
+        ``stimuli.defaults.visual_async_texture_upload``). Call this method
+        before timing critical presentations to ensure that the transfer is
+        completed.
+
+        Returns
+        -------
+        time : int
+            the time it took to execute this method
+
+        """
+
+        start = get_time()
+        if self._ogl_screen is not None:
+            self._ogl_screen.wait_uploaded()
+        return int((get_time() - start) * 1000)
+
     def present(self, clear=True, update=True, log_event_tag=None):
         """Present the stimulus on the screen.
 
@@ -1161,6 +1845,8 @@ class Visual(Stimulus, ABC):
             raise RuntimeError("Cannot not find a screen!")
 
         start = get_time()
+        if _internals.active_exp.prefetcher is not None:
+            _internals.active_exp.prefetcher.stimulus_presented(self)
         preloading_required = not(self.is_preloaded)
 
         if clear:
@@ -1174,15 +1860,8 @@ class Visual(Stimulus, ABC):
             self._ogl_screen.display()
         else:
             screen = _internals.active_exp.screen.surface
-            rect = pygame.Rect((0, 0), self.surface_size)
-            screen_size = screen.get_size()
-            x, y = geometry.position_to_coordinates(self.position, screen_size)
-            if self.surface_size[0] % 2 == 0:
-                x += 1
-            if self.surface_size[1] % 2 == 0:
-                y += 1
-            rect.center = (x, y)
-            screen.blit(self._get_surface(), rect)
+            screen.blit(self._get_surface(),
+                        self._screen_rect(screen.get_size()))
 
         if self._logging:
             _internals.active_exp._event_file_log("Stimulus,drawn,{0}"\
@@ -1199,6 +1878,25 @@ class Visual(Stimulus, ABC):
 
         return int((get_time() - start) * 1000)
 
+    def _screen_rect(self, screen_size):
+        """Return the rectangle the stimulus covers on the screen surface.
+
+        Parameters
+        ----------
+        screen_size : (int, int)
+            the size of the screen surface
+
+        """
+
+        rect = pygame.Rect((0, 0), self.surface_size)
+        x, y = geometry.position_to_coordinates(self.position, screen_size)
+        if self.surface_size[0] % 2 == 0:
+            x += 1
+        if self.surface_size[1] % 2 == 0:
+            y += 1
+        rect.center = (x, y)
+        return rect
+
     def save(self, filename):
         """Save the stimulus as image.
 
@@ -1442,7 +2140,79 @@ class Visual(Stimulus, ABC):
                 "Stimulus,blurred,{0}, level={1}".format(self.id, level), 2)
         return int((get_time() - start) * 1000)
 
-    def scramble(self, grain_size):
+    @staticmethod
+    def _surface_arrays(surface):
+        """Return copies of the RGB and the alpha array of a surface."""
+
+        if not surface.get_flags() & pygame.SRCALPHA or \
+                surface.get_bytesize() != 4:
+            surface = surface.convert_alpha()
+        return (pygame.surfarray.array3d(surface),
+                pygame.surfarray.array_alpha(surface))
+
+    @staticmethod
+    def _surface_from_arrays(rgb, alpha):
+        """Create a surface from an RGB and an alpha array."""
+
+        surface = pygame.surface.Surface(
+            rgb.shape[0:2], pygame.SRCALPHA).convert_alpha()
+        pygame.surfarray.pixels3d(surface)[...] = rgb
+        pygame.surfarray.pixels_alpha(surface)[...] = alpha
+        return surface
+
+    @staticmethod
+    def _scramble_arrays(rgb, alpha, grain_size, rng):
+        """Shuffle the grains of an RGB and an alpha array.
+
+        Pixels on the edge that do not fill a complete grain will be
+        transparent.
+
+        """
+
+        gx, gy = grain_size
+        nx, ny = rgb.shape[0] // gx, rgb.shape[1] // gy
+        order = rng.permutation(nx * ny)
+        new_rgb = np.zeros_like(rgb)
+        new_alpha = np.zeros_like(alpha)
+        for src, dest in ((rgb, new_rgb), (alpha[..., np.newaxis],
+                                           new_alpha[..., np.newaxis])):
+            c = src.shape[2]
+            tiles = src[:nx * gx, :ny * gy].reshape(nx, gx, ny, gy, c) \
+                .transpose(0, 2, 1, 3, 4).reshape(nx * ny, gx, gy, c)
+            dest[:nx * gx, :ny * gy] = tiles[order].reshape(
+                nx, ny, gx, gy, c).transpose(0, 2, 1, 3, 4).reshape(
+                    nx * gx, ny * gy, c)
+        return new_rgb, new_alpha
+
+    @staticmethod
+    def _noise_mask(size, grain_size, percentage, rng):
+        """Return a boolean array (x, y) of randomly covered grains.
+
+        The grains are placed as by earlier versions of `add_noise`: the
+        grid is aligned to the right edge and, depending on the parity of
+        grain size and height, shifted vertically by one pixel. Grains that
+        are only partially (or not at all) on the surface are included in
+        the percentage.
+
+        """
+
+        width, height = size
+        nx = int(width // grain_size) + 1
+        ny = int(height // grain_size) + 1
+        cells = np.zeros(nx * ny, dtype=bool)
+        cells[rng.permutation(nx * ny)[:int(nx * ny * percentage / 100.0)]] \
+            = True
+        cells = cells.reshape(ny, nx)
+        # grain of each pixel column and row
+        col = (width - 1 - np.arange(width)) // grain_size
+        offset = int(grain_size % 2 == 0) - int(height % 2 == 0)
+        row = (np.arange(height) - offset) // grain_size
+        valid = row >= 0
+        mask = np.zeros((width, height), dtype=bool)
+        mask[:, valid] = cells[row[valid]][:, col].T
+        return mask
+
+    def scramble(self, grain_size, rng=None):
         """Scramble the stimulus.
 
         Attention: If the surface size is not a multiple of the grain size,
@@ -1452,6 +2222,8 @@ class Visual(Stimulus, ABC):
         ----------
         grain_size : int or (int, int)
             size of a grain (use tuple of integers for different width & height)
+        rng : numpy.random.Generator or int, optional
+            random number generator (or seed) for reproducible scrambling
 
         Returns
         -------
@@ -1463,30 +2235,24 @@ class Visual(Stimulus, ABC):
         Depending on the size of the stimulus, this method may take some time
         to compute!
 
+        See Also
+        --------
+        scramble_variants
+
         """
 
         start = get_time()
         if isinstance(grain_size, int):
             grain_size = [grain_size, grain_size]
-        # Make Rect list
         if not self._set_surface(self._get_surface()):
             raise RuntimeError(Visual._exception_message.format(
                 "scramble()"))
-        s = self.surface_size
-        source = []
-        for r in range(s[1] // int(grain_size[1])):
-            for c in range(s[0] // int(grain_size[0])):
-                xy = (c * int(grain_size[0]), r * int(grain_size[1]))
-                source.append(pygame.Rect(xy, grain_size))
-        # Make copy and shuffle
-        dest = copy.deepcopy(source)
-        random.shuffle(dest)
-        # Create a new surface
-        tmp_surface = pygame.surface.Surface(
-            s, pygame.SRCALPHA).convert_alpha()
-        for n, s in enumerate(source):
-            tmp_surface.blit(self._get_surface(), dest[n], s)
-        self._set_surface(tmp_surface)
+        self.unload(keep_surface=True)
+        rgb, alpha = Visual._surface_arrays(self._get_surface())
+        self._set_surface(Visual._surface_from_arrays(
+            *Visual._scramble_arrays(rgb, alpha,
+                                     [int(x) for x in grain_size],
+                                     np.random.default_rng(rng))))
 
         if self._logging:
             _internals.active_exp._event_file_log(
@@ -1494,10 +2260,48 @@ class Visual(Stimulus, ABC):
                                      self.id, grain_size), 2)
         return int((get_time() - start) * 1000)
 
-    def add_noise(self, grain_size, percentage, colour):
-        """Add visual noise on top of the stimulus.
+    def scramble_variants(self, n, grain_size, rng=None):
+        """Create several scrambled versions of the stimulus.
 
-        This function might take very long for large stimuli.
+        The stimulus itself will not be changed.
+
+        Parameters
+        ----------
+        n : int
+            number of scrambled versions to create
+        grain_size : int or (int, int)
+            size of a grain (use tuple of integers for different width & height)
+        rng : numpy.random.Generator or int, optional
+            random number generator (or seed) for reproducible scrambling
+
+        Returns
+        -------
+        variants : list of expyriment.stimuli.Canvas
+            the scrambled versions (at the position of the stimulus)
+
+        See Also
+        --------
+        scramble
+
+        """
+
+        from . import _canvas
+        if isinstance(grain_size, int):
+            grain_size = [grain_size, grain_size]
+        grain_size = [int(x) for x in grain_size]
+        rng = np.random.default_rng(rng)
+        rgb, alpha = Visual._surface_arrays(self._get_surface())
+        variants = []
+        for _ in range(n):
+            canvas = _canvas.Canvas(self.surface_size,
+                                    position=list(self.position))
+            canvas._set_surface(Visual._surface_from_arrays(
+                *Visual._scramble_arrays(rgb, alpha, grain_size, rng)))
+            variants.append(canvas)
+        return variants
+
+    def add_noise(self, grain_size, percentage, colour, rng=None):
+        """Add visual noise on top of the stimulus.
 
         Parameters
         ----------
@@ -1507,6 +2311,8 @@ class Visual(Stimulus, ABC):
             percentage of covered area
         colour : (int, int, int)
             colour (RGB) of the noise
+        rng : numpy.random.Generator or int, optional
+            random number generator (or seed) for reproducible noise
 
         Returns
         -------
@@ -1518,29 +2324,166 @@ class Visual(Stimulus, ABC):
         Depending on the size of the stimulus, this method may take some time
         to compute!
 
+        See Also
+        --------
+        noise_variants
+
         """
-        from . import _rectangle
+
         start = get_time()
         if not self._set_surface(self._get_surface()):
             raise RuntimeError(Visual._exception_message.format(
                 "add_noise()"))
         self.unload(keep_surface=True)
-        number_of_pixel_x = int(self.surface_size[0] // grain_size) + 1
-        number_of_pixel_y = int(self.surface_size[1] // grain_size) + 1
-        seq = list(range(number_of_pixel_x * number_of_pixel_y))
-        random.seed()
-        random.shuffle(seq)
-
-        for idx in seq[:int(len(seq) * (percentage) / 100.0)]:
-            x = (idx % number_of_pixel_x) * grain_size
-            x = int(self.surface_size[0] // 2 - grain_size // 2 - x)
-            y = (idx // number_of_pixel_x) * grain_size
-            y = int(self.surface_size[1] // 2 - grain_size // 2 - y)
-            dot = _rectangle.Rectangle(size=(grain_size, grain_size),
-                            position=(x, y), colour=colour)
-            dot.plot(self)
+        rgb, alpha = Visual._surface_arrays(self._get_surface())
+        mask = Visual._noise_mask(self.surface_size, grain_size, percentage,
+                                  np.random.default_rng(rng))
+        rgb[mask] = colour[:3]
+        alpha[mask] = 255
+        self._set_surface(Visual._surface_from_arrays(rgb, alpha))
         if self._logging:
             _internals.active_exp._event_file_log(
                     "Stimulus,noise added,{0}, grain_size={1}, percentage={2}"\
                         .format(self.id, grain_size, percentage))
         return int((get_time() - start) * 1000)
+
+    def noise_variants(self, n, grain_size, percentage, colour, rng=None):
+        """Create several versions of the stimulus with visual noise on top.
+
+        The stimulus itself will not be changed.
+
+        Parameters
+        ----------
+        n : int
+            number of versions to create
+        grain_size : int
+            size of the grains for the noise
+        percentage : int
+            percentage of covered area
+        colour : (int, int, int)
+            colour (RGB) of the noise
+        rng : numpy.random.Generator or int, optional
+            random number generator (or seed) for reproducible noise
+
+        Returns
+        -------
+        variants : list of expyriment.stimuli.Canvas
+            the versions with noise (at the position of the stimulus)
+
+        See Also
+        --------
+        add_noise
+
+        """
+
+        from . import _canvas
+        rng = np.random.default_rng(rng)
+        rgb, alpha = Visual._surface_arrays(self._get_surface())
+        variants = []
+        for _ in range(n):
+            mask = Visual._noise_mask(self.surface_size, grain_size,
+                                      percentage, rng)
+            new_rgb, new_alpha = rgb.copy(), alpha.copy()
+            new_rgb[mask] = colour[:3]
+            new_alpha[mask] = 255
+            canvas = _canvas.Canvas(self.surface_size,
+                                    position=list(self.position))
+            canvas._set_surface(Visual._surface_from_arrays(new_rgb,
+                                                            new_alpha))
+            variants.append(canvas)
+        return variants
+
+
+def _init_render_worker():
+    """Initialise a worker process of _prepare_surfaces.
+
+    A dummy display is opened, since surfaces can only be converted to the
+    display format if the display is initialised.
+
+    """
+
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    pygame.font.init()
+
+
+def _render_pickled_stimulus(data):
+    """Create the surface of a pickled visual stimulus.
+
+    This function is executed in the worker processes of
+    _prepare_surfaces. It returns the raw RGBA pixels of the surface (such
+    that per-pixel alpha and colorkey transparency are both kept).
+
+    """
+
+    stim = pickle.loads(data)
+    surface = stim._get_surface()
+    return (pygame.image.tostring(surface, "RGBA"), surface.get_size())
+
+
+def _prepare_surfaces(stimuli, n_processes):
+    """Create the surfaces of visual stimuli in a pool of worker processes.
+
+    The stimuli are pickled and sent to the workers. The workers send the
+    raw pixels of the created surfaces back, and these are attached to the
+    stimuli. Stimuli that are preloaded, that already have a surface or
+    that can not be pickled are skipped.
+
+    The workers are started with the spawn method on all platforms, since
+    forking would duplicate the OpenGL context and the open files of the
+    experiment. If the pool fails, the remaining stimuli are skipped (and
+    their surfaces will thus be created in the main process).
+
+    Parameters
+    ----------
+    stimuli : list of expyriment stimuli
+        the stimuli to prepare (non-visual stimuli are ignored)
+    n_processes : int
+        the number of worker processes
+
+    Returns
+    -------
+    n_prepared : int
+        the number of stimuli for which a surface has been created
+
+    """
+
+    todo = []
+    jobs = []
+    seen = set()
+    for stim in stimuli:
+        if not isinstance(stim, Visual) or id(stim) in seen or \
+                stim.is_preloaded or stim.has_surface:
+            continue
+        seen.add(id(stim))
+        try:
+            jobs.append(pickle.dumps(stim, pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            continue
+        todo.append(stim)
+
+    n_processes = min(n_processes, len(todo))
+    if n_processes < 2:
+        return 0
+    chunksize = max(1, len(todo) // (n_processes * 4))
+    n_prepared = 0
+    try:
+        with ProcessPoolExecutor(
+                max_workers=n_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_render_worker) as pool:
+            results = pool.map(_render_pickled_stimulus, jobs,
+                               chunksize=chunksize)
+            for stim, (data, size) in zip(todo, results):
+                surface = pygame.image.fromstring(data, size, "RGBA")
+                stim._set_surface(surface.convert_alpha())
+                n_prepared += 1
+    except Exception as err:
+        # e.g. BrokenProcessPool; errors of the stimuli themselves will be
+        # raised again when they are preloaded in the main process
+        _internals.active_exp._event_file_warn(
+            "Visual,warning,surfaces not created in worker processes " +
+            "({0})".format(type(err).__name__))
+    return n_prepared
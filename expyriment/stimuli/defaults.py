@@ -16,11 +16,20 @@ import atexit as _atexit
 
 # Visual
 visual_position = (0, 0)
+visual_texture_cache = True  # share OpenGL textures of identical surfaces
+visual_texture_cache_budget = None  # in bytes; 'None' is no caching of
+#                                     unused textures
+visual_async_texture_upload = True  # stage OpenGL textures via pixel buffers
 
 # Canvas
 canvas_colour = None  # 'None' is transparent
 canvas_position = (0, 0)
 
+# Text
+text_font_cache_size = 32  # maximal number of loaded fonts
+text_render_cache_budget = 32 * 1024 ** 2  # max. bytes of rendered text to
+#                                            keep (None = unlimited)
+
 # TextLine
 textline_text_font = None  # 'None' is experiment_text_font
 textline_text_size = None  # 'None' is experiment_text_size
@@ -99,16 +108,24 @@ rectangle_corner_anti_aliasing = 0
 # Picture
 picture_position = (0, 0)
 
+# Audio
+audio_streaming = False
+
 # Video
 video_resizing = (None, None)
 video_audio_backend = "pygame"
 video_position = [0, 0]
+video_read_ahead = 4  # frames decoded ahead in background; 0 is off
+video_frame_cache = False  # True is tempdir; str is a persistent folder
+video_texture_buffers = 2  # OpenGL textures to stream frames into (1 or 2)
 
 # Tone
 tone_frequency = 440
 tone_samplerate = 44100
 tone_bitdepth = 16
 tone_amplitude = 0.5
+tone_ramp = 0  # duration of on and off ramps in ms
+tone_cache_size = 64  # number of synthesised tones kept in memory
 
 # Create tmp for compressed stimuli folder
 try: